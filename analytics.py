@@ -0,0 +1,180 @@
+"""
+派生指標の分析レイヤー（サプライズ＝実績−予測など）
+"""
+
+import numpy as np
+import pandas as pd
+
+# サプライズ系の値タイプ（value_typeとして選択可能な派生列）
+SURPRISE_VALUE_TYPES = ['surprise', 'surprise_pct', 'surprise_z']
+
+# ローリングZスコアの窓幅（発表回数）と最小必要数
+SURPRISE_ZSCORE_WINDOW = 12
+SURPRISE_ZSCORE_MIN_PERIODS = 3
+
+
+def add_surprise_columns(df, window=SURPRISE_ZSCORE_WINDOW, min_periods=SURPRISE_ZSCORE_MIN_PERIODS):
+    """サプライズ・サプライズ率・ローリングZスコアを (currency, data_tag) ごとに一括計算
+
+    dfは日付昇順であることを前提とする（グループ内の並びがそのまま時系列順になる）。
+    """
+    actual = pd.to_numeric(df['actual'], errors='coerce').to_numpy(dtype=float)
+    forecast = pd.to_numeric(df['forecast'], errors='coerce').to_numpy(dtype=float)
+
+    surprise = actual - forecast
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 予測値が0の場合は率を定義できないためNaN
+        surprise_pct = np.where(forecast != 0, surprise / np.abs(forecast) * 100, np.nan)
+
+    surprise_series = pd.Series(surprise, index=df.index)
+    rolling = surprise_series.groupby([df['currency'], df['data_tag']], sort=False, observed=True).rolling(
+        window, min_periods=min_periods
+    )
+    # グループキーのレベルを落として元の行に揃える（通貨欠損行はNaN）
+    rolling_mean = rolling.mean().droplevel([0, 1]).reindex(df.index).to_numpy()
+    rolling_std = rolling.std().droplevel([0, 1]).reindex(df.index).to_numpy()
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        surprise_z = np.where(rolling_std > 0, (surprise - rolling_mean) / rolling_std, np.nan)
+
+    df['surprise'] = surprise
+    df['surprise_pct'] = surprise_pct
+    df['surprise_z'] = surprise_z
+    return df
+
+
+# 派生系列（移動平均・差分・変化率・年率換算）の定義
+# periods は発表回数単位。same_scale が False のものはチャートの右軸に表示する
+SERIES_TRANSFORMS = {
+    'rolling_mean_3': {'label': '3期移動平均', 'kind': 'rolling_mean', 'periods': 3, 'same_scale': True},
+    'rolling_mean_12': {'label': '12期移動平均', 'kind': 'rolling_mean', 'periods': 12, 'same_scale': True},
+    'diff_1': {'label': '前回差', 'kind': 'diff', 'periods': 1, 'same_scale': False},
+    'diff_3': {'label': '3期変化', 'kind': 'diff', 'periods': 3, 'same_scale': False},
+    'pct_change_1': {'label': '前回比 (%)', 'kind': 'pct_change', 'periods': 1, 'same_scale': False},
+    'pct_change_12': {'label': '12期変化率 (%)', 'kind': 'pct_change', 'periods': 12, 'same_scale': False},
+    'annualized_1': {'label': '前回比年率 (%)', 'kind': 'annualized', 'periods': 1, 'same_scale': False},
+}
+
+
+def compute_series_transforms(df, value_type, transforms=None):
+    """全ての (currency, data_tag) 系列に派生系列を一括計算（dfと同じインデックスのDataFrameを返す）
+
+    dfは日付昇順であることを前提とする。値が欠損している行（未発表など）は系列から除いて計算する。
+    """
+    transforms = list(SERIES_TRANSFORMS) if transforms is None else transforms
+    result = pd.DataFrame(index=df.index, columns=transforms, dtype=float)
+    if df.empty or value_type not in df.columns:
+        return result
+
+    values = pd.to_numeric(df[value_type], errors='coerce')
+    mask = values.notna().to_numpy()
+    values = values[mask]
+    keys = [df['currency'][mask], df['data_tag'][mask]]
+    grouped = values.groupby(keys, sort=False, observed=True)
+
+    # シフト済み系列は変化率系で共有する
+    shifted = {}
+
+    def shifted_values(periods):
+        if periods not in shifted:
+            shifted[periods] = grouped.shift(periods)
+        return shifted[periods]
+
+    periods_per_year = None
+
+    for name in transforms:
+        spec = SERIES_TRANSFORMS[name]
+        periods = spec['periods']
+
+        if spec['kind'] == 'rolling_mean':
+            column = grouped.rolling(periods, min_periods=1).mean().droplevel([0, 1])
+        elif spec['kind'] == 'diff':
+            column = values - shifted_values(periods)
+        elif spec['kind'] == 'pct_change':
+            previous = shifted_values(periods)
+            column = (values / previous.where(previous != 0) - 1) * 100
+        elif spec['kind'] == 'annualized':
+            if periods_per_year is None:
+                periods_per_year = _periods_per_year(df['date'][mask], keys)
+            previous = shifted_values(periods)
+            ratio = values / previous.where(previous != 0)
+            # 比率が負の場合は年率換算できないためNaN
+            column = (ratio.where(ratio > 0) ** (periods_per_year / periods) - 1) * 100
+        else:
+            raise ValueError(f"未対応の派生系列です: {name}")
+
+        result[name] = column.reindex(df.index)
+
+    return result
+
+
+def _periods_per_year(dates, keys):
+    """系列ごとの年間発表回数（発表間隔の中央値から推定）"""
+    gaps = dates.groupby(keys, sort=False, observed=True).diff().dt.days
+    median_gap = gaps.groupby(keys, sort=False, observed=True).transform('median')
+    return 365.25 / median_gap.where(median_gap > 0)
+
+
+# 相関分析の最小重複月数と最大ラグ（月）
+CORRELATION_MIN_PERIODS = 12
+CORRELATION_MAX_LAG = 12
+
+
+def nan_correlation_matrix(x, y, min_periods=CORRELATION_MIN_PERIODS):
+    """行列 x (A × 月) と y (B × 月) の行同士のピアソン相関 (A × B) を欠損を考慮して一括計算
+
+    各ペアで両方に値がある月のみを使う（pandasのcorrと同じペアワイズ除外）。
+    重複月数がmin_periods未満、または分散が0のペアはNaN。
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    mx = ~np.isnan(x)
+    my = ~np.isnan(y)
+
+    # 桁落ちを避けるため、行ごとの平均で中心化してから積和を取る
+    with np.errstate(invalid='ignore'):
+        x0 = np.where(mx, x - np.nanmean(np.where(mx, x, np.nan), axis=1, keepdims=True), 0.0) if x.size else x
+        y0 = np.where(my, y - np.nanmean(np.where(my, y, np.nan), axis=1, keepdims=True), 0.0) if y.size else y
+    fx = mx.astype(float)
+    fy = my.astype(float)
+
+    n = fx @ fy.T
+    sx = x0 @ fy.T
+    sy = fx @ y0.T
+    sxx = (x0 * x0) @ fy.T
+    syy = fx @ (y0 * y0).T
+    sxy = x0 @ y0.T
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        corr = cov / np.sqrt(var_x * var_y)
+
+    corr[(n < min_periods) | ~(var_x > 1e-12) | ~(var_y > 1e-12)] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+
+def shift_for_lag(x, y, lag):
+    """ラグに合わせて月軸を切り詰める（lag>0 なら x が y に lag か月先行）"""
+    if lag > 0:
+        return x[:, :-lag], y[:, lag:]
+    if lag < 0:
+        return x[:, -lag:], y[:, :lag]
+    return x, y
+
+
+def lagged_correlation_matrix(x, y, lag=0, min_periods=CORRELATION_MIN_PERIODS):
+    """ラグ付き相関行列（x の月 t と y の月 t+lag の相関）"""
+    months = np.asarray(x).shape[1]
+    if abs(lag) >= months:
+        return np.full((np.asarray(x).shape[0], np.asarray(y).shape[0]), np.nan)
+    x_shifted, y_shifted = shift_for_lag(np.asarray(x, dtype=float), np.asarray(y, dtype=float), lag)
+    return nan_correlation_matrix(x_shifted, y_shifted, min_periods)
+
+
+def lag_correlation_profile(x, y, lags, min_periods=CORRELATION_MIN_PERIODS):
+    """2系列（1次元配列）のラグごとの相関を計算"""
+    x = np.asarray(x, dtype=float).reshape(1, -1)
+    y = np.asarray(y, dtype=float).reshape(1, -1)
+    return np.array([lagged_correlation_matrix(x, y, lag, min_periods)[0, 0] for lag in lags])
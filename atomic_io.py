@@ -0,0 +1,50 @@
+"""
+アトミックなファイル書き込み（一時ファイルに書いてからリネームで置き換え）
+
+読み込み側は常に「書き込み前」か「書き込み後」の完全なファイルだけを参照する。
+"""
+
+import os
+import threading
+
+
+def _temp_path(path):
+    """同じディレクトリ内の一時ファイルパス（ドット始まりで一覧・集計の対象外にする）"""
+    directory, filename = os.path.split(path)
+    return os.path.join(directory, f".{filename}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+def atomic_write_bytes(path, data):
+    """バイト列をアトミックに書き込み"""
+    tmp_path = _temp_path(path)
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        _remove_quietly(tmp_path)
+        raise
+
+
+def atomic_write_csv(df, path, **kwargs):
+    """DataFrameをCSVとしてアトミックに書き込み"""
+    tmp_path = _temp_path(path)
+    try:
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            df.to_csv(f, **kwargs)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        _remove_quietly(tmp_path)
+        raise
+
+
+def _remove_quietly(path):
+    """ファイルが存在すれば削除（エラーは無視）"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
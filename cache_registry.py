@@ -0,0 +1,334 @@
+"""
+キャッシュの統計と破棄（全てのキャッシュ層のヒット・ミス・サイズ・件数・追い出し・再計算時間を一元管理）
+
+st.cache_data / st.cache_resource の代わりに cache_data / cache_resource で関数を修飾すると、
+Streamlit のキャッシュはそのまま使いつつ、呼び出しごとにヒット・ミスと再計算時間を記録する。
+保持中のエントリはStreamlitと同じ規則（max_entries 件を超えたら最も使われていないものから、
+ttl 秒を過ぎたものは期限切れとして）で追跡し、追い出しの件数とおおよそのバイト数を求める。
+
+HTTPのディスクキャッシュ・月次パネルのディスクキャッシュのような独自のキャッシュは、
+統計を返す関数と破棄する関数を register_source で登録する。
+
+破棄は名前・層・引数の条件で対象を絞って行う（例: 以前のデータバージョンのエントリのみ）。
+"""
+
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+
+def estimate_bytes(value, max_depth=8):
+    """値のおおよそのメモリ使用量（DataFrame・配列は中身のバイト数、その他は属性・要素を辿って合計）"""
+    total = 0
+    seen = set()
+    stack = [(value, 0)]
+    while stack:
+        item, depth = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        if isinstance(item, pd.DataFrame):
+            total += int(item.memory_usage(index=True, deep=False).sum())
+        elif isinstance(item, (pd.Series, pd.Index)):
+            total += int(item.memory_usage(deep=False))
+        elif isinstance(item, np.ndarray):
+            total += item.nbytes
+        elif isinstance(item, (str, bytes, bytearray)):
+            total += sys.getsizeof(item)
+        elif depth >= max_depth:
+            total += sys.getsizeof(item)
+        elif isinstance(item, dict):
+            total += sys.getsizeof(item)
+            stack.extend((child, depth + 1) for pair in item.items() for child in pair)
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            total += sys.getsizeof(item)
+            stack.extend((child, depth + 1) for child in item)
+        elif hasattr(item, '__dict__'):
+            total += sys.getsizeof(item)
+            stack.append((vars(item), depth + 1))
+        else:
+            total += sys.getsizeof(item)
+    return total
+
+
+def directory_usage(path):
+    """ディレクトリ直下の項目数と、配下のファイルの合計バイト数"""
+    if not os.path.isdir(path):
+        return 0, 0
+    entries = [name for name in os.listdir(path) if not name.startswith('.')]
+    size = 0
+    for root, _, files in os.walk(path):
+        for filename in files:
+            try:
+                size += os.path.getsize(os.path.join(root, filename))
+            except OSError:
+                pass
+    return len(entries), size
+
+
+class CacheStats:
+    """1つのキャッシュの統計と保持中のエントリ（Streamlitのキャッシュと同じ規則で追跡）"""
+
+    def __init__(self, name, layer, max_entries=None, ttl=None):
+        self.name = name
+        self.layer = layer
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.recompute_seconds = 0.0
+        self.entries = OrderedDict()  # キー → (引数, 呼び出し時の引数, バイト数, 保存時刻)
+        self.clear_function = None
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        """期限切れのエントリを追い出しとして数える（ロック内で呼ぶ）"""
+        if self.ttl is None:
+            return
+        expired = [key for key, entry in self.entries.items() if now - entry[3] > self.ttl]
+        for key in expired:
+            del self.entries[key]
+            self.evictions += 1
+
+    def hit(self, key):
+        with self._lock:
+            self.hits += 1
+            if key in self.entries:
+                self.entries.move_to_end(key)
+
+    def miss(self, key, arguments, call, value, seconds):
+        now = time.time()
+        size = estimate_bytes(value)
+        with self._lock:
+            self.misses += 1
+            self.recompute_seconds += seconds
+            self._expire(now)
+            if key in self.entries:
+                # 追跡中のキーの再計算は、Streamlit側で追い出された分
+                del self.entries[key]
+                self.evictions += 1
+            self.entries[key] = (arguments, call, size, now)
+            while self.max_entries is not None and len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, where=None):
+        """条件に合うエントリを破棄（条件なしなら全て）して件数を返す"""
+        with self._lock:
+            if where is None:
+                targets = list(self.entries)
+            else:
+                targets = [key for key, entry in self.entries.items() if where(entry[0])]
+            calls = [self.entries.pop(key)[1] for key in targets]
+            self.invalidations += len(targets)
+        if self.clear_function is not None:
+            if where is None:
+                self.clear_function()
+            else:
+                for args, kwargs in calls:
+                    self.clear_function(*args, **kwargs)
+        return len(targets)
+
+    def snapshot(self):
+        with self._lock:
+            self._expire(time.time())
+            calls = self.hits + self.misses
+            return {
+                'name': self.name,
+                'layer': self.layer,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / calls if calls else None,
+                'entries': len(self.entries),
+                'bytes': sum(entry[2] for entry in self.entries.values()),
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'recompute_seconds': self.recompute_seconds,
+            }
+
+
+class CacheSource:
+    """独自のキャッシュ（統計を返す関数と破棄する関数で登録）"""
+
+    def __init__(self, name, layer, stats, clear=None):
+        self.name = name
+        self.layer = layer
+        self.stats = stats
+        self.clear = clear
+        self.invalidations = 0
+
+    def invalidate(self, where=None):
+        if where is not None or self.clear is None:
+            return 0
+        entries = self.snapshot()['entries'] or 0
+        self.clear()
+        self.invalidations += entries
+        return entries
+
+    def snapshot(self):
+        values = dict(self.stats())
+        hits, misses = values.get('hits'), values.get('misses')
+        calls = (hits or 0) + (misses or 0)
+        return {
+            'name': self.name,
+            'layer': self.layer,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / calls if hits is not None and calls else None,
+            'entries': values.get('entries'),
+            'bytes': values.get('bytes'),
+            'evictions': values.get('evictions'),
+            'invalidations': self.invalidations,
+            'recompute_seconds': values.get('recompute_seconds'),
+        }
+
+
+class CacheRegistry:
+    """プロセス内の全てのキャッシュの登録先"""
+
+    def __init__(self):
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, layer, max_entries=None, ttl=None):
+        """Streamlitのキャッシュを登録（スクリプトの再実行で同じ名前が登録された場合は既存の統計を返す）"""
+        with self._lock:
+            cache = self._caches.get(name)
+            if not isinstance(cache, CacheStats):
+                cache = CacheStats(name, layer, max_entries, ttl)
+                self._caches[name] = cache
+            return cache
+
+    def register_source(self, name, layer, stats, clear=None):
+        """独自のキャッシュを登録（stats は hits・misses・entries・bytes などのdictを返す関数、再登録時は関数のみ更新）"""
+        with self._lock:
+            cache = self._caches.get(name)
+            if isinstance(cache, CacheSource):
+                cache.stats, cache.clear = stats, clear
+            else:
+                self._caches[name] = CacheSource(name, layer, stats, clear)
+
+    def names(self):
+        with self._lock:
+            return list(self._caches)
+
+    def invalidate(self, name=None, layer=None, where=None):
+        """名前・層・引数の条件（引数名 → 値のdictを受け取る関数）で絞ってエントリを破棄し、件数を返す
+
+        where を指定した場合、引数ごとのエントリを持たない独自のキャッシュは対象外。
+        """
+        with self._lock:
+            caches = [
+                cache for cache in self._caches.values()
+                if (name is None or cache.name == name) and (layer is None or cache.layer == layer)
+            ]
+        return sum(cache.invalidate(where) for cache in caches)
+
+    def metrics(self):
+        """全てのキャッシュの統計（登録順）"""
+        with self._lock:
+            caches = list(self._caches.values())
+        return [cache.snapshot() for cache in caches]
+
+    def prometheus(self, prefix="economic_cache"):
+        """統計を Prometheus のテキスト形式で出力"""
+        series = [
+            ('hits_total', 'hits', 'counter'),
+            ('misses_total', 'misses', 'counter'),
+            ('evictions_total', 'evictions', 'counter'),
+            ('invalidations_total', 'invalidations', 'counter'),
+            ('recompute_seconds_total', 'recompute_seconds', 'counter'),
+            ('entries', 'entries', 'gauge'),
+            ('bytes', 'bytes', 'gauge'),
+        ]
+        rows = self.metrics()
+        lines = []
+        for suffix, field, kind in series:
+            metric = f"{prefix}_{suffix}"
+            lines.append(f"# TYPE {metric} {kind}")
+            for row in rows:
+                if row[field] is not None:
+                    lines.append(f'{metric}{{cache="{row["name"]}",layer="{row["layer"]}"}} {row[field]}')
+        return "\n".join(lines) + "\n"
+
+
+CACHE_REGISTRY = CacheRegistry()
+
+
+def _entry_key(signature, args, kwargs):
+    """Streamlitと同じく「_」で始まる引数を除いたキーと、引数名 → 値のdict"""
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    arguments = {name: value for name, value in bound.arguments.items() if not name.startswith('_')}
+    key = []
+    for name, value in arguments.items():
+        try:
+            hash(value)
+            key.append((name, value))
+        except TypeError:
+            key.append((name, repr(value)))
+    return tuple(key), arguments
+
+
+def _placeholder_call(signature, args, kwargs):
+    """エントリの破棄に使う呼び出し時の引数（「_」で始まる引数はキーに含まれないため値を保持しない）"""
+    names = list(signature.parameters)
+    args = tuple(None if index < len(names) and names[index].startswith('_') else value
+                 for index, value in enumerate(args))
+    kwargs = {name: None if name.startswith('_') else value for name, value in kwargs.items()}
+    return args, kwargs
+
+
+def _tracked(streamlit_decorator, layer, name, options):
+    def decorate(func):
+        cache_name = name or func.__name__
+        stats = CACHE_REGISTRY.register(cache_name, layer, options.get('max_entries'), options.get('ttl'))
+        signature = inspect.signature(func)
+        computed = threading.local()
+
+        @functools.wraps(func)
+        def compute(*args, **kwargs):
+            started = time.perf_counter()
+            value = func(*args, **kwargs)
+            computed.seconds = time.perf_counter() - started
+            computed.value = value
+            return value
+
+        cached = streamlit_decorator(**options)(compute)
+        stats.clear_function = cached.clear
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            computed.seconds = None
+            value = cached(*args, **kwargs)
+            key, arguments = _entry_key(signature, args, kwargs)
+            if computed.seconds is None:
+                stats.hit(key)
+            else:
+                stats.miss(key, arguments, _placeholder_call(signature, args, kwargs), value, computed.seconds)
+                computed.value = None
+            return value
+
+        wrapper.clear = lambda where=None: stats.invalidate(where)
+        return wrapper
+    return decorate
+
+
+def cache_data(layer, name=None, **options):
+    """統計付きの st.cache_data（options はそのまま st.cache_data に渡す）"""
+    return _tracked(st.cache_data, layer, name, options)
+
+
+def cache_resource(layer, name=None, **options):
+    """統計付きの st.cache_resource（options はそのまま st.cache_resource に渡す）"""
+    return _tracked(st.cache_resource, layer, name, options)
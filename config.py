@@ -2,9 +2,76 @@
 設定ファイル
 """
 
+import os
+
 # データファイルのパス
 DATA_FILE_PATH = "./data/economic_data.csv"
 
+# データのスナップショット（更新ごとに不変の版として公開し、セッションは実行中の版を固定して参照）の置き場
+# 現在の版と新しい版 SNAPSHOT_KEEP 個は常に残し、それより古い版はピン留めがなければ後続の版の公開から
+# SNAPSHOT_GRACE 秒後、ピン留めがあっても SNAPSHOT_MAX_AGE 秒後に削除する
+SNAPSHOT_DIR = "./data/snapshots"
+SNAPSHOT_KEEP = int(os.environ.get("ECONOMIC_SNAPSHOT_KEEP", "2"))
+SNAPSHOT_GRACE = 10 * 60  # 10分
+SNAPSHOT_MAX_AGE = 24 * 60 * 60  # 24時間
+
+# データの保存方式（csv: 月ごとのファイルを統合したCSV / sqlite: SQLiteデータベース）
+# sqlite では取得結果を自然キーで upsert し、テーブル表示の絞り込みをクエリとして実行する
+STORAGE_ENGINE = os.environ.get("ECONOMIC_STORAGE_ENGINE", "csv")
+SQLITE_DB_PATH = "./data/economic_data.sqlite"
+
+# 読み込み時のプロセス数（1: 統合CSVを1プロセスで読み込み / 2以上: 月ごとのファイルをプロセスプールで並列に前処理）
+LOAD_WORKERS = int(os.environ.get("ECONOMIC_LOAD_WORKERS", "1"))
+
+# 発表値の改定履歴（実績・予測・前回値の変化を取得時刻付きで追記するログ）のパス
+REVISION_LOG_PATH = "./data/revision_log.bin"
+
+# データ更新のロックファイル置き場（プロセス間で月ごとの取得を排他）
+REFRESH_LOCK_DIR = "./data/.locks"
+
+# イベント名レジストリ（イベント名⇔整数IDの対応表）のパス
+EVENT_REGISTRY_PATH = "./data/event_registry.csv"
+
+# HTTP取得設定（セッションプール・ディスクキャッシュ）
+HTTP_CACHE_DIR = "./cache/http"
+HTTP_CACHE_TTL = 60 * 60  # 1時間
+HTTP_POOL_MAXSIZE = 10
+
+# 月次パネル（通貨 × 指標 × 月の配列）のディスクキャッシュ置き場
+PANEL_CACHE_DIR = "./cache/panel"
+
+# ノード間の共有キャッシュ（redis://ホスト:ポート/DB番号 または共有マウント上のディレクトリ、未設定なら無効）
+# データバージョンごとのスナップショット・前処理済みデータ・系列インデックス・図を SHARED_CACHE_TTL 秒保持する
+SHARED_CACHE_URL = os.environ.get("ECONOMIC_SHARED_CACHE")
+SHARED_CACHE_NAMESPACE = os.environ.get("ECONOMIC_SHARED_CACHE_NAMESPACE", "economic")
+SHARED_CACHE_TTL = 24 * 60 * 60  # 24時間
+SHARED_SYNC_INTERVAL = 30  # 他のノードが公開した版の確認間隔（秒）
+
+# データ更新のリーダー選出（有効時はリースを保持するノードのみが取得し、他のノードは共有キャッシュの版を取り込む）
+# リースは月ごとの取得のたびに延長し、REFRESH_LEADER_TTL 秒延長されなければ他のノードが引き継ぐ
+REFRESH_LEADER_ELECTION = os.environ.get("ECONOMIC_REFRESH_LEADER_ELECTION", "0") == "1"
+REFRESH_LEADER_TTL = 15 * 60  # 15分
+
+# ダッシュボードからエクスポートできる最大行数（Streamlit はダウンロードをメモリ上に保持するため。
+# それを超える選択範囲はコマンドライン（python data_export.py）でファイルへストリーミング出力する）
+EXPORT_MAX_ROWS = int(os.environ.get("ECONOMIC_EXPORT_MAX_ROWS", "200000"))
+
+# キャッシュ統計の出力先（Prometheus のテキスト形式、実行ごとに置き換え。未設定なら出力しない）
+CACHE_METRICS_PATH = os.environ.get("ECONOMIC_CACHE_METRICS_PATH")
+
+# フォールバックAPIの設定
+FALLBACK_CALENDAR_URL = "https://nfs.faireconomy.media/ff_calendar_thisweek.json"
+FALLBACK_CACHE_TTL = 30 * 60  # 30分
+
+# データ取得元の設定（live: ライブ取得 / record: 取得結果をフィクスチャに保存 / replay: フィクスチャを再生）
+# 環境変数で切り替え可能（CIやベンチマークではネットワークなしで replay を使う）
+DATA_SOURCE_MODE = os.environ.get("ECONOMIC_DATA_SOURCE", "live")
+FIXTURE_DIR = os.environ.get("ECONOMIC_FIXTURE_DIR", "./fixtures")
+REPLAY_LATENCY = float(os.environ.get("ECONOMIC_REPLAY_LATENCY", "0"))  # 秒
+REPLAY_JITTER = float(os.environ.get("ECONOMIC_REPLAY_JITTER", "0"))  # 秒
+REPLAY_FAILURE_RATE = float(os.environ.get("ECONOMIC_REPLAY_FAILURE_RATE", "0"))  # 0〜1
+REPLAY_SEED = int(os.environ["ECONOMIC_REPLAY_SEED"]) if os.environ.get("ECONOMIC_REPLAY_SEED") else None
+
 # サーバー設定
 HOST = '127.0.0.1'
 PORT = 8888
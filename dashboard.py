@@ -4,15 +4,52 @@
 """
 
 import streamlit as st
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import pandas as pd
+import numpy as np
 import plotly.graph_objs as go
-import plotly.express as px
+from contextlib import nullcontext
 from datetime import datetime, timedelta
+import hashlib
+import importlib.util
+import io
+import json
 import time
 import os
-import requests
-import json
-import investpy
+import shutil
+import tempfile
+import sqlite3
+
+from analytics import (
+    CORRELATION_MAX_LAG, CORRELATION_MIN_PERIODS, SERIES_TRANSFORMS, add_surprise_columns,
+    compute_series_transforms, lag_correlation_profile, lagged_correlation_matrix
+)
+from atomic_io import atomic_write_bytes, atomic_write_csv
+from cache_registry import CACHE_REGISTRY, cache_data, cache_resource, directory_usage
+from config import (
+    CACHE_METRICS_PATH, DATA_SOURCE_MODE, EXPORT_MAX_ROWS, FALLBACK_CACHE_TTL, FALLBACK_CALENDAR_URL, FIXTURE_DIR, PANEL_CACHE_DIR, REFRESH_LOCK_DIR,
+    LOAD_WORKERS, REFRESH_LEADER_ELECTION, REFRESH_LEADER_TTL, REPLAY_FAILURE_RATE, REPLAY_JITTER, REPLAY_LATENCY,
+    REPLAY_SEED, REVISION_LOG_PATH, SHARED_CACHE_TTL, SHARED_CACHE_URL, SHARED_SYNC_INTERVAL, SNAPSHOT_DIR,
+    SQLITE_DB_PATH, STORAGE_ENGINE
+)
+from data_export import EXPORT_FORMATS, EXPORT_VALUE_TYPES, export_file_name, export_selection, selection_positions
+from data_loader import (
+    create_loader_pool, localize_event_ids, partition_files, process_economic_data, read_economic_data, read_partitioned_data
+)
+from delta_ingest import DatasetDeltaStore, apply_deltas, compute_partition_delta
+from event_registry import get_event_registry
+from fast_figure import figure_json
+from indicator_search import IndicatorSearchIndex
+from monthly_panel import load_or_build_panel, remove_stale_panels
+from paged_table import DEFAULT_PAGE_SIZE, PAGE_SIZE_OPTIONS, FrameRows, page_count, table_page
+from refresh_coordinator import RefreshCoordinator
+from revision_log import REVISION_SERIES, RevisionLog, partition_fetch_times, revision_series
+from series_index import SeriesIndex
+from shared_cache import LeaderLease, SharedCacheError, open_shared_cache
+from snapshot_store import SnapshotStore, link_or_copy
+from sqlite_store import ReleaseStore
+from trace_factory import CURRENCY_COLORS, chart_figure, grid_yaxis, series_traces
 
 # ページ設定
 st.set_page_config(
@@ -62,14 +99,48 @@ st.markdown("""
 st.markdown(f'<div class="status-indicator">🟢 Live • {time.strftime("%H:%M:%S")}</div>', unsafe_allow_html=True)
 
 
+@st.cache_resource(show_spinner=False)
+def get_http_client():
+    """プロセス内で共有するHTTPクライアント（セッションプール・ディスクキャッシュ）"""
+    # requests はデータ取得時のみ必要なため、起動時には読み込まない
+    from http_cache import CachedHttpClient
+    client = CachedHttpClient()
+    CACHE_REGISTRY.register_source('http', 'http', lambda: http_cache_stats(client), client.clear)
+    return client
+
+def http_cache_stats(client):
+    """HTTPのディスクキャッシュの統計（再検証・集約で取得を省いた分もヒットとして数える）"""
+    files, size = directory_usage(client.cache_dir)
+    stats = client.stats
+    return {
+        'hits': stats['cache_hits'] + stats['revalidated'] + stats['coalesced'],
+        'misses': stats['network'],
+        'entries': files // 2,  # レスポンスごとにメタデータと本文の2ファイル
+        'bytes': size
+    }
+
+@st.cache_resource(show_spinner=False)
+def get_data_source():
+    """経済カレンダー・フォールバックAPIの取得元（設定によりライブ・記録・再生を切り替え）"""
+    from data_sources import create_data_source
+    return create_data_source(
+        DATA_SOURCE_MODE,
+        get_http_client(),
+        FIXTURE_DIR,
+        latency=REPLAY_LATENCY,
+        jitter=REPLAY_JITTER,
+        failure_rate=REPLAY_FAILURE_RATE,
+        seed=REPLAY_SEED
+    )
+
 def fetch_fallback_data():
     """フォールバック用の簡単なデータ取得"""
     try:
-        # 最小限のAPIからデータ取得を試行
-        url = "https://nfs.faireconomy.media/ff_calendar_thisweek.json"
+        # 最小限のAPIからデータ取得を試行（キャッシュ・再検証・重複集約付き）
+        url = FALLBACK_CALENDAR_URL
         headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
         
-        response = requests.get(url, headers=headers, timeout=10)
+        response = get_data_source().get(url, headers=headers, ttl=FALLBACK_CACHE_TTL, timeout=10)
         if response.status_code == 200:
             data = response.json()
             if isinstance(data, list) and len(data) > 0:
@@ -81,12 +152,27 @@ def fetch_fallback_data():
     
     return None
 
+@st.cache_resource(show_spinner=False)
+def get_refresh_coordinator():
+    """プロセス内で共有する更新コーディネーター（取得中の月の重複排除とファイルロック）"""
+    return RefreshCoordinator(REFRESH_LOCK_DIR)
+
+def is_partition_stale(monthly_file):
+    """月ごとのファイルが存在しないか、6時間以上古い場合はTrue"""
+    if not os.path.exists(monthly_file):
+        return True
+    file_time = datetime.fromtimestamp(os.path.getmtime(monthly_file))
+    return datetime.now() - file_time > timedelta(hours=6)
+
 def update_data_file():
     """月ごとのデータファイルを更新"""
     try:
         # ディレクトリ作成
         os.makedirs("./data", exist_ok=True)
         
+        # 他のノードが共有キャッシュに公開した新しい版があれば取り込む（取り込んだ月は古くない扱いになる）
+        sync_shared_snapshot()
+        
         # 過去5年分のデータを取得
         today = datetime.now()
         months_to_fetch = []
@@ -94,58 +180,101 @@ def update_data_file():
         # 過去5年分 + 将来1ヶ月分のデータを取得（61ヶ月）
         for i in range(-1, 60):  # -1で1ヶ月先も含む
             target_date = today - timedelta(days=30*i)
-            months_to_fetch.append(target_date)
+            if is_partition_stale(f"./data/economic_data_{target_date.strftime('%Y-%m')}.csv"):
+                months_to_fetch.append(target_date)
+        
+        # リーダー選出の有効時、取得はリースを保持するノードのみ（他のノードはリーダーが公開した版を取り込む）
+        leader = get_refresh_leader()
+        if months_to_fetch and leader is not None and not leader.acquire():
+            months_to_fetch = []
+            if latest_data_version() is None:
+                st.info("⏳ 他のノードがデータを取得中です。しばらくしてから再読み込みしてください")
         
         total_new_data = 0
+        # 更新した月ごとのデータ（SQLite保存時に反映する分）
+        updated_partitions = {}
+        # 更新した月ごとの差分（読み込み済みデータへの反映用）
+        deltas = []
+        # 追加・変更された行（改定履歴ログへの記録用）
+        revision_rows = []
+        base_version, base_index = get_dataset_store().base()
         
-        for target_date in months_to_fetch:
-            year_month = target_date.strftime('%Y-%m')
-            monthly_file = f"./data/economic_data_{year_month}.csv"
-            
-            # 月ごとのファイルが存在しないか、古い場合は更新
-            update_needed = False
-            
-            if os.path.exists(monthly_file):
-                file_time = datetime.fromtimestamp(os.path.getmtime(monthly_file))
-                # 6時間以上古い場合は更新
-                if datetime.now() - file_time > timedelta(hours=6):
-                    update_needed = True
-                    # データ更新メッセージを削除
-            else:
-                update_needed = True
-                # 新規データ取得メッセージを削除
-            
-            if update_needed:
-                with st.spinner(f"🔄 {year_month} の経済データを取得中..."):
-                    # 月の開始日と終了日を計算
-                    first_day = target_date.replace(day=1)
-                    if target_date.month == 12:
-                        last_day = target_date.replace(year=target_date.year+1, month=1, day=1) - timedelta(days=1)
-                    else:
-                        last_day = target_date.replace(month=target_date.month+1, day=1) - timedelta(days=1)
-                    
-                    from_date = first_day.strftime('%d/%m/%Y')
-                    # 将来の日付も含めて取得（investpyで将来カレンダー取得可能）
-                    to_date = last_day.strftime('%d/%m/%Y')
-                    
-                    # 月ごとのデータを取得
-                    monthly_data = fetch_monthly_economic_data(from_date, to_date, year_month)
+        # 更新サイクル中は同じURLへのHTTPリクエストを1回に集約（古い月がなければ取得元を読み込まない）
+        coordinator = get_refresh_coordinator()
+        with get_http_client().refresh_cycle() if months_to_fetch else nullcontext():
+            for target_date in months_to_fetch:
+                year_month = target_date.strftime('%Y-%m')
+                monthly_file = f"./data/economic_data_{year_month}.csv"
+                
+                # 月ごとのファイルが存在しないか、古い場合は更新
+                if not is_partition_stale(monthly_file):
+                    continue
+                
+                # リースを延長（延長できずに他のノードに引き継がれていれば取得を中止）
+                if leader is not None and not leader.acquire():
+                    break
+                
+                # 同じ月の取得は（スレッド間・プロセス間で）1回に集約
+                with coordinator.claim(year_month) as claimed:
+                    # ロック待ちの間に他のセッション・プロセスが更新を終えていればスキップ
+                    if not claimed or not is_partition_stale(monthly_file):
+                        continue
                     
-                    if monthly_data is not None and not monthly_data.empty:
-                        # 月ごとのファイルに保存
-                        monthly_data.to_csv(monthly_file, index=False)
-                        total_new_data += len(monthly_data)
-                        # 成功メッセージは削除（最後にまとめて表示）
-                    else:
-                        st.warning(f"⚠️ {year_month}: データ取得に失敗")
+                    with st.spinner(f"🔄 {year_month} の経済データを取得中..."):
+                        # 月の開始日と終了日を計算
+                        first_day = target_date.replace(day=1)
+                        if target_date.month == 12:
+                            last_day = target_date.replace(year=target_date.year+1, month=1, day=1) - timedelta(days=1)
+                        else:
+                            last_day = target_date.replace(month=target_date.month+1, day=1) - timedelta(days=1)
+                        
+                        from_date = first_day.strftime('%d/%m/%Y')
+                        # 将来の日付も含めて取得（investpyで将来カレンダー取得可能）
+                        to_date = last_day.strftime('%d/%m/%Y')
+                        
+                        # 月ごとのデータを取得
+                        monthly_data = fetch_monthly_economic_data(from_date, to_date, year_month)
+                        
+                        if monthly_data is not None and not monthly_data.empty:
+                            old_partition = pd.read_csv(monthly_file) if os.path.exists(monthly_file) else None
+                            # 月ごとのファイルに保存（一時ファイルに書いてから置き換え）
+                            atomic_write_csv(monthly_data, monthly_file, index=False)
+                            total_new_data += len(monthly_data)
+                            if STORAGE_ENGINE == 'sqlite':
+                                updated_partitions[year_month] = monthly_file
+                            try:
+                                # 統合ファイルと同じ読み込み方で比較するため、保存したファイルを読み直す
+                                delta = compute_partition_delta(old_partition, pd.read_csv(monthly_file))
+                                revision_rows.append(delta.added_rows)
+                                if deltas is not None:
+                                    deltas.append(delta)
+                            except Exception:
+                                # 差分を計算できない場合は全件再読み込みに任せる
+                                deltas = None
+                            # 成功メッセージは削除（最後にまとめて表示）
+                        else:
+                            st.warning(f"⚠️ {year_month}: データ取得に失敗")
         
-        # 統合ファイルを作成
-        create_combined_data_file()
+        # 値が変わった行を改定履歴ログに記録（月ごとのファイルの上書きで失われる前の値を残す）
+        if revision_rows:
+            record_revisions(revision_rows)
+        
+        # 統合ファイルを作成（月ごとのファイルが更新された場合のみ）
+        # 統合ファイルごとに新しいスナップショットの版になるため、毎回は書き換えない
+        version_before = latest_data_version()
+        if STORAGE_ENGINE == 'sqlite':
+            if updated_partitions:
+                store_partitions(updated_partitions)
+        elif total_new_data > 0 or version_before is None:
+            create_combined_data_file()
         
         if total_new_data > 0:
             st.success(f"🎉 合計 {total_new_data}件の新しいデータを取得しました")
-            # キャッシュをクリア
-            load_data.clear()
+            # 読み込み済みデータが更新前の統合ファイルと一致する場合のみ、差分を適用して新バージョンとして登録
+            # （一致しない場合や差分を計算できない場合は、新しいデータバージョンで全件読み込みになる）
+            new_version = latest_data_version()
+            if deltas and base_index is not None and base_version == version_before and new_version != version_before:
+                apply_data_deltas(base_index, deltas, new_version)
         else:
             # 「最新です」メッセージは非表示に
             pass
@@ -154,14 +283,22 @@ def update_data_file():
         st.error(f"データ更新エラー: {e}")
         # エラー時の情報は削除
 
+def record_revisions(rows, fetched_at=None):
+    """取得した行のうち値が変わったものを改定履歴ログに追記（fetched_at は rows ごとの取得時刻、省略時は現在時刻）"""
+    try:
+        if fetched_at is not None:
+            fetched_at = np.repeat(np.asarray(fetched_at, dtype=np.int64), [len(frame) for frame in rows])
+        get_revision_log().record(pd.concat(rows, ignore_index=True), fetched_at=fetched_at)
+    except Exception as e:
+        st.warning(f"⚠️ 改定履歴の記録に失敗しました: {e}")
+
 def fetch_monthly_economic_data(from_date, to_date, year_month):
     """指定期間の経済データを取得（investpyを使用）"""
     try:
         # 取得期間の表示を削除
         
         # investpyで経済カレンダーデータを取得
-        economic_data = investpy.economic_calendar(
-            time_zone=None,
+        economic_data = get_data_source().economic_calendar(
             countries=['united states', 'euro zone', 'united kingdom', 'japan', 'australia'],
             from_date=from_date,
             to_date=to_date
@@ -214,223 +351,376 @@ def fetch_monthly_economic_data(from_date, to_date, year_month):
 def create_combined_data_file():
     """月ごとのファイルを統合して単一のCSVファイルを作成"""
     try:
-        data_files = []
         data_dir = "./data"
+        combined_file = "./data/economic_data.csv"
         
-        # 月ごとのファイルを検索
-        for filename in os.listdir(data_dir):
-            if filename.startswith("economic_data_") and filename.endswith(".csv"):
-                data_files.append(os.path.join(data_dir, filename))
-        
-        if data_files:
-            combined_data = []
-            total_files = len(data_files)
-            
-            # ファイルを静かに読み込み
-            for file_path in sorted(data_files):
-                try:
-                    monthly_data = pd.read_csv(file_path)
-                    combined_data.append(monthly_data)
-                except Exception as e:
-                    st.warning(f"⚠️ ファイル読み込みエラー: {file_path} - {e}")
+        # 一覧・読み込み・公開をまとめてロック内で行う（後から公開した版が常に新しい内容になる）
+        with get_refresh_coordinator().lock("combined"):
+            # 月ごとのファイルを検索
+            data_files = sorted(
+                os.path.join(data_dir, filename) for filename in os.listdir(data_dir)
+                if filename.startswith("economic_data_") and filename.endswith(".csv")
+            )
+            if not data_files:
+                # ファイル未発見メッセージは削除
+                return
             
-            if combined_data:
-                # 全データを結合
-                all_data = pd.concat(combined_data, ignore_index=True)
-                
-                # 重複を除去
-                all_data = all_data.drop_duplicates()
-                
-                # 統合ファイルに保存
-                combined_file = "./data/economic_data.csv"
-                all_data.to_csv(combined_file, index=False)
-                
-                st.success(f"📊 データ統合完了: {total_files}ファイルから{len(all_data)}件のデータを統合")
+            def write_combined(path, partitions):
+                # 版にハードリンクした月ごとのファイルから統合（統合CSVと版の月ごとのファイルの内容が一致）
+                combined_data = []
+                for file_path in partitions:
+                    try:
+                        combined_data.append(pd.read_csv(file_path))
+                    except Exception as e:
+                        st.warning(f"⚠️ ファイル読み込みエラー: {os.path.basename(file_path)} - {e}")
+                if not combined_data:
+                    raise FileNotFoundError("統合可能なデータファイルが見つかりません")
                 
-            else:
-                st.warning("📁 統合可能なデータファイルが見つかりません")
-        else:
-            # ファイル未発見メッセージは削除
-            pass
+                # 全データを結合して重複を除去
+                all_data = pd.concat(combined_data, ignore_index=True).drop_duplicates()
+                atomic_write_csv(all_data, path, index=False)
+                total_rows.append(len(all_data))
+            
+            # 統合ファイルを新しいスナップショットとして公開（読み込み中のセッションは固定した版を読み続ける）
+            total_rows = []
+            store = get_snapshot_store()
+            version = store.publish(write_combined, partitions=data_files)
+            # コマンドラインツール・SQLiteへの初回取り込みで使う従来の統合ファイルも同じ内容に置き換え
+            store.mirror(version, combined_file)
+        collect_snapshots()
+        share_snapshot(version)
+        
+        st.success(f"📊 データ統合完了: {len(data_files)}ファイルから{total_rows[0]}件のデータを統合")
+    except FileNotFoundError as e:
+        st.warning(f"📁 {e}")
     except Exception as e:
         st.error(f"ファイル統合エラー: {e}")
 
-@st.cache_data(ttl=1800, show_spinner=False)  # 30分キャッシュ
-def load_data():
-    """データの読み込みとキャッシュ（全データ）"""
+@st.cache_resource(show_spinner=False)
+def get_snapshot_store():
+    """データのスナップショット（初回は従来の統合ファイルがあれば最初の版として公開）"""
+    store = SnapshotStore(SNAPSHOT_DIR)
+    if STORAGE_ENGINE != 'sqlite' and store.current() is None and os.path.exists("./data/economic_data.csv"):
+        with get_refresh_coordinator().lock("combined"):
+            if store.current() is None:
+                store.publish(
+                    lambda path, _partitions: link_or_copy("./data/economic_data.csv", path),
+                    partitions=partition_files("./data")
+                )
+    return store
+
+def _session_active(session_id):
+    """セッションが接続中か（ランタイム外で確認できない場合は接続中とみなす）"""
+    try:
+        return runtime.get_instance().is_active_session(session_id)
+    except Exception:
+        return True
+
+def collect_snapshots():
+    """終了したセッションのピン留めを解除し、不要になったスナップショットとその版のパネルを削除"""
+    try:
+        store = get_snapshot_store()
+        store.collect(is_active=_session_active)
+        # 残っている版のパネルは、その版を参照中のセッションが使うため残す
+        remove_stale_panels(PANEL_CACHE_DIR, store.versions())
+    except OSError as e:
+        st.warning(f"⚠️ 古いスナップショットの削除に失敗しました: {e}")
+
+def pin_data_version():
+    """最新のスナップショットをこのセッションに固定（次の実行まで、フラグメントの再実行も同じ版を参照）"""
+    if STORAGE_ENGINE == 'sqlite':
+        return
+    store = get_snapshot_store()
+    version = store.current()
+    previous = st.session_state.get('data_version')
+    st.session_state['data_version'] = version
+    ctx = get_script_run_ctx()
+    if ctx is not None:
+        store.pin(ctx.session_id, version)
+    if previous is not None and previous != version:
+        collect_snapshots()
+
+@st.cache_resource(show_spinner=False)
+def get_shared_cache():
+    """ノード間の共有キャッシュ（未設定、またはSQLite保存時はNone）
+
+    共有するデータはスナップショットの版のIDをキーにするため、CSV保存時のみ使う。
+    """
+    if not SHARED_CACHE_URL or STORAGE_ENGINE == 'sqlite':
+        return None
+    cache = open_shared_cache(SHARED_CACHE_URL)
+    CACHE_REGISTRY.register_source('shared', 'shared', lambda: dict(cache.stats))
+    return cache
+
+@st.cache_resource(show_spinner=False)
+def get_refresh_leader():
+    """データ更新のリーダー選出（無効時はNone）"""
+    cache = get_shared_cache()
+    if cache is None or not REFRESH_LEADER_ELECTION:
+        return None
+    return LeaderLease(cache, "refresh", REFRESH_LEADER_TTL)
+
+def read_shared(*parts):
+    """他のノードが共有キャッシュに保存した処理結果（無効・未保存・接続失敗ならNone）"""
+    cache = get_shared_cache()
+    if cache is None or None in parts:
+        return None
+    try:
+        return cache.get_object(cache.key(*parts))
+    except SharedCacheError:
+        # 失敗は共有キャッシュの統計に記録し、このノードで作成する
+        return None
+
+def write_shared(value, *parts):
+    """処理結果を共有キャッシュに保存（失敗しても表示には影響しないため無視）"""
+    cache = get_shared_cache()
+    if cache is None or None in parts:
+        return
+    try:
+        cache.set_object(cache.key(*parts), value, ttl=SHARED_CACHE_TTL)
+    except SharedCacheError:
+        pass
+
+@cache_data('shared', ttl=SHARED_SYNC_INTERVAL, show_spinner=False)
+def shared_data_version():
+    """共有キャッシュに公開された最新の版（SHARED_SYNC_INTERVAL 秒ごとに確認）"""
+    cache = get_shared_cache()
+    return cache.get_object(cache.key('current')) if cache is not None else None
+
+def share_snapshot(version):
+    """このノードで公開した版を共有キャッシュに公開（他のノードは次の確認で取り込む）"""
+    cache = get_shared_cache()
+    if cache is None or version is None:
+        return
+    try:
+        cache.set(cache.key('snapshot', version), get_snapshot_store().pack(version), ttl=SHARED_CACHE_TTL)
+        cache.set_object(cache.key('current'), version)
+    except (SharedCacheError, OSError) as e:
+        st.warning(f"⚠️ 共有キャッシュへのデータの公開に失敗しました: {e}")
+        return
+    shared_data_version.clear()
+    try:
+        cache.purge()
+    except OSError:
+        pass
+
+def sync_shared_snapshot():
+    """共有キャッシュとこのノードの最新の版を揃える（他のノードの版が新しければ取り込み、このノードの版が新しければ公開）"""
+    cache = get_shared_cache()
+    if cache is None:
+        return
+    try:
+        store = get_snapshot_store()
+        shared_version = shared_data_version()
+        local_version = store.current()
+        if shared_version is not None and (local_version is None or shared_version > local_version):
+            data = cache.get(cache.key('snapshot', shared_version))
+            if data is None:
+                return
+            # 取り込む月ごとの差分（置き換えで失われる前の値と比べ、改定履歴ログに記録する分）
+            revision_rows = []
+            fetch_times = []
+
+            def record_partition(path, content, mtime):
+                old_content = None
+                if os.path.exists(path):
+                    with open(path, 'rb') as f:
+                        old_content = f.read()
+                if old_content == content:
+                    return
+                try:
+                    old_partition = pd.read_csv(io.BytesIO(old_content)) if old_content else None
+                    delta = compute_partition_delta(old_partition, pd.read_csv(io.BytesIO(content)))
+                except Exception:
+                    # 差分を計算できない月は記録せずに取り込む
+                    return
+                revision_rows.append(delta.added_rows)
+                # 取得時刻はリーダーが取得した時刻（月ごとのファイルの更新時刻）
+                fetch_times.append(int(mtime))
+
+            with get_refresh_coordinator().lock("combined"):
+                if (store.current() or "") < shared_version:
+                    version = store.adopt(data, "./data", on_partition=record_partition)
+                    store.mirror(version, "./data/economic_data.csv")
+            if revision_rows:
+                record_revisions(revision_rows, fetched_at=fetch_times)
+            collect_snapshots()
+        elif local_version is not None and (shared_version is None or local_version > shared_version):
+            # リーダー選出の有効時は、リーダー以外のノードの版（初回の取り込みなど）は公開しない
+            leader = get_refresh_leader()
+            if leader is None or leader.acquire():
+                share_snapshot(local_version)
+    except Exception as e:
+        st.warning(f"⚠️ 共有キャッシュとの同期に失敗しました: {e}")
+
+@st.cache_resource(show_spinner=False)
+def get_release_store():
+    """SQLite保存時のデータベース（初回は統合CSVがあれば取り込む）"""
+    store = ReleaseStore(SQLITE_DB_PATH)
+    store.initialize()
+    if len(store) == 0 and os.path.exists("./data/economic_data.csv"):
+        with st.spinner("🗄️ 統合データファイルをデータベースに取り込み中..."):
+            df = read_economic_data("./data/economic_data.csv")
+            months = df['date'].dt.strftime('%Y-%m')
+            store.replace_months({month: frame for month, frame in df.groupby(months, sort=True)})
+    else:
+        # タグ付けルールが変わっていれば保存済みの指標タグを更新
+        store.sync_tags(get_event_registry())
+    return store
+
+def store_partitions(partitions):
+    """更新された月ごとのファイルをデータベースに反映（自然キーで upsert）"""
+    try:
+        frames = {year_month: process_economic_data(pd.read_csv(path)) for year_month, path in partitions.items()}
+        with get_refresh_coordinator().lock("combined"):
+            store = get_release_store()
+            total_rows = store.replace_months(frames)
+            # SQLite保存時はセッションが常に最新の版を参照するため、それ以前の版のパネルは不要
+            remove_stale_panels(PANEL_CACHE_DIR, [store.version()])
+        st.success(f"📊 データベース更新完了: {len(frames)}か月分 {total_rows}件を反映")
+    except Exception as e:
+        st.error(f"データベース更新エラー: {e}")
+
+@st.cache_resource(show_spinner=False)
+def get_loader_pool():
+    """月ごとのファイルの並列読み込みに使うプロセスプール（起動コストを読み込みごとに払わないよう共有）"""
+    return create_loader_pool(LOAD_WORKERS)
+
+@cache_data('data', ttl=1800, show_spinner=False)  # 30分キャッシュ
+def load_data(data_version=None):
+    """データの読み込みとキャッシュ（全データ、データバージョンごとにキャッシュ）"""
     try:
-        if not os.path.exists("./data/economic_data.csv"):
+        if STORAGE_ENGINE == 'sqlite':
+            # 保存時に前処理済みのため、文字列の解析・タグ付けは行わない
+            return get_release_store().load_frame(get_event_registry())
+        
+        store = get_snapshot_store()
+        version = data_version or store.current()
+        # 他のノードが同じ版を前処理済みならそれを使う
+        shared = read_shared('dataset', version)
+        if shared is not None:
+            return localize_event_ids(shared)
+        if version is None or not os.path.exists(store.path(version)):
             st.error("データファイルが見つかりません")
             return pd.DataFrame()
-            
-        df = pd.read_csv("./data/economic_data.csv")
-        df["date"] = pd.to_datetime(df["date"], dayfirst=True, errors='coerce')
-        df = df.dropna(subset=['date'])
-        df["data_tag"] = "None"
-        
-        # イベント名をクリーンアップ（月情報などを除去して正規化）
-        def clean_event_name(event_name):
-            import re
-            if pd.isna(event_name):
-                return ""
-            # 月情報を除去して正規化
-            cleaned = re.sub(r'\s*\([A-Z][a-z]{2}\)\s*$', '', str(event_name))  # (Feb), (Jan)などを除去
-            return cleaned.strip()
-        
-        df['cleaned_event'] = df['event'].apply(clean_event_name)
-        
-        # 詳細な経済指標分類（地域・時期・種類を区別）
-        tag_patterns = {
-            # CPI関連（より詳細に分類）
-            'National CPI (YoY)': r'National.*CPI.*\(YoY\)',
-            'National CPI (MoM)': r'National.*CPI.*\(MoM\)',
-            'Tokyo CPI (YoY)': r'Tokyo.*CPI.*\(YoY\)',
-            'Tokyo CPI (MoM)': r'Tokyo.*CPI.*\(MoM\)',
-            'Tokyo CPI Ex Food & Energy (YoY)': r'Tokyo.*CPI.*Ex.*Food.*Energy.*\(YoY\)|CPI.*Tokyo.*Ex.*Food.*Energy.*\(YoY\)',
-            'Tokyo CPI Ex Food & Energy (MoM)': r'Tokyo.*CPI.*Ex.*Food.*Energy.*\(MoM\)|CPI.*Tokyo.*Ex.*Food.*Energy.*\(MoM\)',
-            'Core CPI (YoY)': r'Core.*CPI.*\(YoY\)',
-            'Core CPI (MoM)': r'Core.*CPI.*\(MoM\)',
-            'CPI (YoY)': r'CPI.*\(YoY\)|Consumer.*Price.*Index.*\(YoY\)',
-            'CPI (MoM)': r'CPI.*\(MoM\)|Consumer.*Price.*Index.*\(MoM\)',
-            
-            # 住宅関連
-            'Housing Prices (YoY)': r'Housing.*Price.*\(YoY\)|HPI.*\(YoY\)|House.*Price.*\(YoY\)',
-            'Housing Prices (MoM)': r'Housing.*Price.*\(MoM\)|HPI.*\(MoM\)|House.*Price.*\(MoM\)',
-            'Building Permits': r'Building Permits|Construction.*Permits',
-            'Housing Starts': r'Housing Starts|Home.*Starts',
-            
-            # 小売・消費関連
-            'Retail Sales (YoY)': r'Retail Sales.*\(YoY\)',
-            'Retail Sales (MoM)': r'Retail Sales.*\(MoM\)',
-            'Consumer Confidence': r'Consumer Confidence|Consumer Sentiment',
-            
-            # 雇用関連
-            'Employment Change': r'Employment Change|Nonfarm.*Payroll',
-            'Unemployment Rate': r'Unemployment Rate',
-            'Job Cuts (YoY)': r'Job.*Cuts.*\(YoY\)|Challenger.*Job.*Cuts.*\(YoY\)',
-            'Jobless Claims': r'Initial.*Claims|Continuing.*Claims|Jobless.*Claims',
-            
-            # 製造業・PMI
-            'Manufacturing PMI': r'Manufacturing.*PMI',
-            'Services PMI': r'Services.*PMI|Service.*Sector.*PMI',
-            'Composite PMI': r'Composite.*PMI',
-            
-            # 金融・金利
-            'Interest Rate': r'Interest Rate|Fed.*Rate|BoJ.*Rate|ECB.*Rate|BoE.*Rate|RBA.*Rate|FOMC|Bank Rate|Cash Rate',
-            'Money Supply (YoY)': r'Money Supply.*\(YoY\)|M[123].*Money.*Supply.*\(YoY\)',
-            'Money Supply (MoM)': r'Money Supply.*\(MoM\)|M[123].*Money.*Supply.*\(MoM\)',
-            
-            # 貿易・商品
-            'Trade Balance': r'Trade Balance|Current Account',
-            'Commodity Prices (YoY)': r'Commodity.*Prices.*\(YoY\)',
-            'Commodity Prices (MoM)': r'Commodity.*Prices.*\(MoM\)',
-            
-            # 産業生産
-            'Industrial Production (YoY)': r'Industrial Production.*\(YoY\)',
-            'Industrial Production (MoM)': r'Industrial Production.*\(MoM\)',
-            
-            # PPI関連
-            'PPI (YoY)': r'PPI.*\(YoY\)|Producer.*Price.*\(YoY\)',
-            'PPI (MoM)': r'PPI.*\(MoM\)|Producer.*Price.*\(MoM\)',
-            
-            # GDP関連
-            'GDP (YoY)': r'GDP.*\(YoY\)',
-            'GDP (QoQ)': r'GDP.*\(QoQ\)|GDP.*\(MoM\)',
-            
-            # その他
-            'Factory Orders': r'Factory.*Orders|Manufacturing.*Orders',
-            'Business Investment': r'Capital.*Expenditure|Business.*Investment|Capex',
-            'Loans (YoY)': r'Loans.*\(YoY\)|Credit.*\(YoY\)'
-        }
-        
-        # 指標を優先度順にマッチング（特定のものから先に）
-        for tag, pattern in tag_patterns.items():
-            # まだタグ付けされていない行のみマッチング
-            untagged_mask = df['data_tag'] == 'None'
-            pattern_mask = df['event'].str.contains(pattern, na=False, case=False)
-            final_mask = untagged_mask & pattern_mask
-            df.loc[final_mask, 'data_tag'] = tag
-        
-        # まだタグ付けされていないものは、クリーンアップしたイベント名をそのまま使用
-        untagged_mask = df['data_tag'] == 'None'
-        df.loc[untagged_mask, 'data_tag'] = df.loc[untagged_mask, 'cleaned_event']
-            
-        # 数値変換処理（全データに対して実行）
-        for col in ['actual', 'forecast', 'previous']:
-            if col in df.columns:
-                # 数値変換処理
-                def clean_numeric_value(value):
-                    if pd.isna(value) or value == '':
-                        return None
-                    # 文字列に変換
-                    str_val = str(value)
-                    # カンマ、%、K、M、Bを除去
-                    for char in [',', '%', 'K', 'M', 'B']:
-                        str_val = str_val.replace(char, '')
-                    # 数値に変換
-                    try:
-                        return float(str_val)
-                    except:
-                        return None
-                
-                df[col] = df[col].apply(clean_numeric_value)
         
+        if LOAD_WORKERS > 1:
+            # 統合ファイルと同じ内容を、同じ版の月ごとのファイルから並列に前処理して作る
+            df = read_partitioned_data(
+                partition_files(store.directory(version)), executor=get_loader_pool(), workers=LOAD_WORKERS
+            )
+        else:
+            df = read_economic_data(store.path(version))
+        write_shared(df, 'dataset', version)
         return df
     except Exception as e:
         st.error(f"データ読み込みエラー: {e}")
         return pd.DataFrame()
 
-def clean_and_interpolate_data(series):
-    """データの前処理と線形補間"""
+def latest_data_version():
+    """最新のデータバージョン（公開中のスナップショットの版、SQLite保存時はデータベースの書き込み回数）"""
+    if STORAGE_ENGINE == 'sqlite':
+        try:
+            return get_release_store().version()
+        except sqlite3.Error:
+            return None
+    return get_snapshot_store().current()
+
+def get_data_version():
+    """このセッションが参照するデータバージョン（実行の開始時に固定したスナップショットの版）"""
+    if STORAGE_ENGINE == 'sqlite':
+        return latest_data_version()
+    return st.session_state.get('data_version') or latest_data_version()
+
+@st.cache_resource(show_spinner=False)
+def get_dataset_store():
+    """プロセス内で共有する差分取り込み用のデータ受け渡し"""
+    return DatasetDeltaStore()
+
+@cache_resource('index', max_entries=2, show_spinner=False)
+def get_series_index(data_version):
+    """データバージョンごとに系列インデックスを構築してキャッシュ（サプライズ分析列を含む）
+
+    更新時に差分を適用済みのデータが登録されていれば、全件読み込みせずにそれを使う。
+    他のノードが同じ版の系列インデックスを共有キャッシュに保存済みなら、それを使う。
+    """
+    store = get_dataset_store()
+    series_index = store.take(data_version)
+    if series_index is None:
+        series_index = read_shared('series_index', data_version)
+        if series_index is not None:
+            series_index = SeriesIndex(localize_event_ids(series_index.df))
+            store.set_base(data_version, series_index)
+            return series_index
+        df = load_data(data_version)
+        if not df.empty:
+            df = add_surprise_columns(df)
+        series_index = SeriesIndex(df)
+    if len(series_index):
+        write_shared(series_index, 'series_index', data_version)
+    store.set_base(data_version, series_index)
+    return series_index
+
+def apply_data_deltas(base_index, deltas, data_version):
+    """更新された行のみを読み込み済みデータへ反映し、新しいデータバージョンとして登録"""
     try:
-        # 数値に変換（元のインデックスを保持）
-        numeric_series = pd.to_numeric(series, errors='coerce')
-        
-        # 0値をNaNに変換（ただし、実際に0が意味のある場合を考慮）
-        mask_zero = numeric_series == 0
-        if mask_zero.sum() > 0:
-            # 前後の値と比較して異常な0値を検出
-            zero_indices = numeric_series[mask_zero].index.tolist()
-            
-            for idx in zero_indices:
-                try:
-                    # 現在のインデックス位置を取得
-                    current_pos = numeric_series.index.get_loc(idx)
-                    
-                    # 前の値を取得
-                    prev_val = None
-                    if current_pos > 0:
-                        prev_data = numeric_series.iloc[:current_pos].dropna()
-                        if len(prev_data) > 0:
-                            prev_val = prev_data.iloc[-1]
-                    
-                    # 次の値を取得
-                    next_val = None
-                    if current_pos < len(numeric_series) - 1:
-                        next_data = numeric_series.iloc[current_pos+1:].dropna()
-                        if len(next_data) > 0:
-                            next_val = next_data.iloc[0]
-                    
-                    # 前後の値が0でない場合、0値をNaNに変換
-                    if prev_val is not None and next_val is not None:
-                        if prev_val != 0 and next_val != 0:
-                            numeric_series.loc[idx] = pd.NA
-                            
-                except (IndexError, KeyError, ValueError):
-                    # インデックスエラーの場合はスキップ
-                    continue
-        
-        # 前の値で穴埋め（forward fill）その後、線形補間
-        filled_series = numeric_series.ffill()
-        # 残ったNaN値は線形補間
-        interpolated_series = filled_series.interpolate(method='linear')
-        
-        return interpolated_series
-        
+        patched = apply_deltas(base_index.df, deltas)
     except Exception as e:
-        # エラーが発生した場合は元のシリーズを数値変換のみして返す
-        st.warning(f"データ補間でエラーが発生しました: {e}")
-        return pd.to_numeric(series, errors='coerce')
+        st.warning(f"⚠️ 差分の反映に失敗したため全件を再読み込みします: {e}")
+        return
+    get_dataset_store().register(data_version, SeriesIndex(patched))
+
+@st.cache_resource(show_spinner=False)
+def get_revision_log():
+    """改定履歴ログ（空の場合は読み込み済みデータを月ごとのファイルの更新時刻の値として記録）"""
+    log = RevisionLog(REVISION_LOG_PATH)
+    if len(log) == 0:
+        df = get_series_index(get_data_version()).df
+        if not df.empty:
+            log.record(df, fetched_at=partition_fetch_times(df['date'], "./data"))
+    return log
+
+@cache_resource('index', max_entries=2, show_spinner=False)
+def get_revision_series(data_version, log_version):
+    """速報値・最新改定値の系列をデータバージョン・ログのバージョンごとにキャッシュ"""
+    return revision_series(get_series_index(data_version).df, get_revision_log(), get_event_registry())
+
+@cache_resource('panel', max_entries=8, show_spinner=False)
+def get_monthly_panel(data_version, value_type, importance=None):
+    """データバージョン・値タイプ・重要度ごとに月次パネルを構築してキャッシュ（ディスク上はメモリマップ）"""
+    return load_or_build_panel(get_series_index(data_version).df, PANEL_CACHE_DIR, data_version, value_type, importance)
+
+@cache_resource('index', max_entries=2, show_spinner=False)
+def get_indicator_search_index(data_version):
+    """データバージョンごとに指標タグの検索インデックスを構築してキャッシュ"""
+    return IndicatorSearchIndex(get_series_index(data_version).df)
+
+@cache_resource('stats', max_entries=16, show_spinner=False)
+def get_correlation_matrix(data_version, value_type, currencies, lag, importance=None, tags=None):
+    """通貨ペア・ラグ・重要度ごとに指標間の相関行列を一括計算してキャッシュ
+
+    currencies は (基準通貨, 比較通貨) のタプル。基準通貨の指標の月 t と比較通貨の指標の月 t+lag の相関を返す。
+    """
+    panel = get_monthly_panel(data_version, value_type, importance)
+    base_currency, compare_currency = currencies
+    tag_list = [t for t in (panel.tags if tags is None else tags) if t != "None"]
+    tag_positions = panel.tag_positions(tag_list)
+
+    def usable_rows(currency):
+        # 重複月数の条件を満たし得る（観測月数が十分な）指標のみ対象にする
+        matrix = panel.currency_matrix(currency)[tag_positions]
+        observed = (~np.isnan(matrix)).sum(axis=1) >= CORRELATION_MIN_PERIODS
+        return [panel.tags[p] for p in tag_positions[observed]], np.asarray(matrix[observed])
+
+    row_tags, x = usable_rows(base_currency)
+    col_tags, y = usable_rows(compare_currency)
+    corr = lagged_correlation_matrix(x, y, lag) if row_tags and col_tags else np.empty((len(row_tags), len(col_tags)))
+    return pd.DataFrame(corr, index=row_tags, columns=col_tags)
+
+@cache_resource('stats', max_entries=8, show_spinner=False)
+def get_series_transforms(data_version, value_type):
+    """データバージョン・値タイプごとに全系列の派生系列を一括計算してキャッシュ"""
+    return compute_series_transforms(get_series_index(data_version).df, value_type)
 
 def get_indicator_unit_group(tag, sample_values):
     """指標の単位とスケールグループを判定（スケール細分化版）"""
@@ -550,8 +840,8 @@ def get_indicator_unit_group(tag, sample_values):
     else:
         return "other", "その他"
 
-def create_currency_chart(df, currency, value_type):
-    """通貨別チャート作成（動的スケールグルーピング）"""
+def create_currency_chart(df, currency, value_type, overlays=None):
+    """通貨別チャート作成（動的スケールグルーピング、overlaysは派生系列の事前計算済み列）"""
     data = df[(df['currency'] == currency) & (df['data_tag'] != "None")]
     
     if data.empty:
@@ -577,69 +867,20 @@ def create_currency_chart(df, currency, value_type):
     scale_groups = create_dynamic_scale_groups(indicator_stats, tag)
     
     # 各スケールグループ別にチャートを作成
-    return create_multi_scale_charts(data, currency, value_type, scale_groups, indicator_stats)
+    return create_multi_scale_charts(data, currency, value_type, scale_groups, indicator_stats, overlays)
 
 def create_single_axis_chart(data, currency, value_type, unit_group):
     """単軸チャート作成"""
-    fig = go.Figure()
-    colors = px.colors.qualitative.Set3 + px.colors.qualitative.Pastel1
-    
-    for i, tag in enumerate(sorted(data['data_tag'].unique())):
-        tag_data = data[data['data_tag'] == tag].copy()
-        if not tag_data.empty:
-            # 日付でソート
-            tag_data = tag_data.sort_values('date')
-            
-            # データの前処理と補間
-            cleaned_values = clean_and_interpolate_data(tag_data[value_type])
-            
-            # 有効なデータのみ使用
-            valid_mask = ~cleaned_values.isna()
-            if valid_mask.any():
-                valid_data = tag_data[valid_mask]
-                valid_values = cleaned_values[valid_mask]
-                
-                # 重要度情報を追加
-                importance_info = valid_data['importance'].iloc[0] if 'importance' in valid_data.columns and len(valid_data) > 0 else 'unknown'
-                importance_emoji = {'high': '🔴', 'medium': '🟡', 'low': '🟢'}.get(importance_info, '⚪')
-                
-                fig.add_trace(go.Scatter(
-                    x=valid_data['date'],
-                    y=valid_values,
-                    mode='lines+markers',
-                    name=f"{importance_emoji} {tag}",
-                    line=dict(color=colors[i % len(colors)], width=2, shape='linear'),
-                    marker=dict(size=4),
-                    connectgaps=True,
-                    hovertemplate=f'<b>{tag}</b><br>重要度: {importance_info}<br>Date: %{{x}}<br>Value: %{{y:.2f}}<br><extra></extra>'
-                ))
+    tags = sorted(str(tag) for tag in data['data_tag'].unique())
+    traces, _ = series_traces(data, 'data_tag', tags, value_type, fixed_colors=True)
     
-    # 単位に応じた軸設定
-    yaxis_title = get_yaxis_title(unit_group)
-    
-    fig.update_layout(
+    return chart_figure(
+        traces,
         title=f"🏛️ {currency} Economic Indicators ({value_type.capitalize()})",
-        xaxis_title="📅 Date",
-        yaxis_title=yaxis_title,
-        template="plotly_dark",
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        font=dict(color='white', family='Arial'),
-        height=700,
-        hovermode='x unified',
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="right",
-            x=1
-        )
+        # 単位に応じた軸設定
+        yaxis=grid_yaxis(title=dict(text=get_yaxis_title(unit_group))),
+        height=700
     )
-    
-    fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='#333')
-    fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='#333')
-    
-    return fig
 
 def create_dynamic_scale_groups(indicator_stats, tag_name_for_reference):
     """動的にスケールグループを作成（バランス版）"""
@@ -756,62 +997,50 @@ def create_dynamic_scale_groups(indicator_stats, tag_name_for_reference):
     
     return scale_groups
 
-def create_multi_scale_charts(data, currency, value_type, scale_groups, indicator_stats):
-    """スケールグループ別に複数のチャートを作成"""
+def create_multi_scale_charts(data, currency, value_type, scale_groups, indicator_stats, overlays=None):
+    """スケールグループ別のチャート情報を作成（チャートは表示するグループのみ build() で作成）"""
     charts = []
     
     for group in scale_groups:
         if not group['indicators']:
             continue
             
-        # グループごとのチャートを作成
-        fig = create_scale_group_chart(data, currency, value_type, group, indicator_stats)
-        if fig:
-            charts.append({
-                'figure': fig,
-                'unit_label': group['label'],
-                'indicators': group['indicators'],
-                'scale_min': group['min'],
-                'scale_max': group['max']
-            })
+        # グループごとのチャートは表示時に作成する
+        charts.append({
+            'build': lambda group=group: create_scale_group_chart(data, currency, value_type, group, indicator_stats, overlays),
+            'unit_label': group['label'],
+            'indicators': group['indicators'],
+            'scale_min': group['min'],
+            'scale_max': group['max']
+        })
     
     return charts
 
-def create_scale_group_chart(data, currency, value_type, group, indicator_stats):
-    """特定のスケールグループのチャートを作成"""
-    fig = go.Figure()
-    colors = px.colors.qualitative.Set3 + px.colors.qualitative.Pastel1
-    
-    color_idx = 0
-    for tag in sorted(group['indicators']):
-        tag_data = data[data['data_tag'] == tag].copy()
-        if not tag_data.empty:
-            tag_data = tag_data.sort_values('date')
-            cleaned_values = clean_and_interpolate_data(tag_data[value_type])
-            valid_mask = ~cleaned_values.isna()
-            
-            if valid_mask.any():
-                valid_data = tag_data[valid_mask]
-                valid_values = cleaned_values[valid_mask]
-                
-                importance_info = valid_data['importance'].iloc[0] if 'importance' in valid_data.columns and len(valid_data) > 0 else 'unknown'
-                importance_emoji = {'high': '🔴', 'medium': '🟡', 'low': '🟢'}.get(importance_info, '⚪')
-                
-                # 指標の統計情報を表示
-                stats = indicator_stats.get(tag, {})
-                hover_text = f"<b>{tag}</b><br>重要度: {importance_info}<br>範囲: {stats.get('min', 0):.2f}~{stats.get('max', 0):.2f}"
-                
-                fig.add_trace(go.Scatter(
-                    x=valid_data['date'],
-                    y=valid_values,
-                    mode='lines+markers',
-                    name=f"{importance_emoji} {tag}",
-                    line=dict(color=colors[color_idx % len(colors)], width=2, shape='linear'),
-                    marker=dict(size=4),
-                    connectgaps=True,
-                    hovertemplate=hover_text + "<br>Date: %{x}<br>Value: %{y:.2f}<br><extra></extra>"
-                ))
-                color_idx += 1
+@cache_resource('figure', max_entries=64, show_spinner=False)
+def get_scale_group_figure(data_version, currency, value_type, overlay_key, importance, full_coverage_only, indicators, _build):
+    """スケールグループのチャートを表示条件ごとにキャッシュ（_buildは初回のみ、他のノードが作成済みなら呼ばれない）"""
+    conditions = repr((currency, value_type, overlay_key, importance, full_coverage_only, indicators))
+    shared_key = hashlib.sha1(conditions.encode('utf-8')).hexdigest()
+    shared = read_shared('figure', data_version, shared_key)
+    if shared is not None:
+        return go.Figure(json.loads(shared), _validate=False)
+    fig = _build()
+    if get_shared_cache() is not None:
+        write_shared(figure_json(fig), 'figure', data_version, shared_key)
+    return fig
+
+def create_scale_group_chart(data, currency, value_type, group, indicator_stats, overlays=None):
+    """特定のスケールグループのチャートを作成（トレースは一括作成の高速パスで組み立て）"""
+    # 指標の統計情報をホバーに表示
+    hover_details = {}
+    for tag in group['indicators']:
+        stats = indicator_stats.get(tag, {})
+        hover_details[tag] = f"<br>範囲: {stats.get('min', 0):.2f}~{stats.get('max', 0):.2f}"
+    
+    # 派生系列のオーバーレイ（事前計算済みの値を行インデックスで取得）
+    traces, uses_secondary_axis = series_traces(
+        data, 'data_tag', sorted(group['indicators']), value_type, hover_details=hover_details, overlays=overlays
+    )
     
     # Y軸は自動スケールに任せる（固定しない）
     
@@ -820,39 +1049,32 @@ def create_scale_group_chart(data, currency, value_type, group, indicator_stats)
     if all(indicator_stats.get(ind, {}).get('max', 0) < 100 for ind in group['indicators']):
         unit_suffix = " (%)"
     
-    fig.update_layout(
+    layout = dict(
         title=dict(
             text=f"🏛️ {currency} - {group['label']} ({value_type.capitalize()})",
             y=0.95,  # タイトルを少し下に
             x=0.5,
             xanchor='center'
         ),
-        xaxis_title="📅 Date",
-        yaxis_title=f"📊 Value{unit_suffix}",
-        yaxis=dict(
-            showgrid=True,
-            gridwidth=1,
-            gridcolor='#333'
-        ),
-        template="plotly_dark",
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        font=dict(color='white', family='Arial'),
-        height=550,  # 高さを少し増やす
-        hovermode='x unified',
-        legend=dict(
-            orientation="h",
-            yanchor="top",
-            y=-0.15,  # 凡例をグラフの下に移動
-            xanchor="center",
-            x=0.5
-        ),
-        margin=dict(t=80, b=120)  # 上下のマージンを調整
+        yaxis=grid_yaxis(title=dict(text=f"📊 Value{unit_suffix}")),
+        height=550  # 高さを少し増やす
     )
     
-    fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='#333')
+    if uses_secondary_axis:
+        layout['yaxis2'] = get_overlay_yaxis()
     
-    return fig
+    return chart_figure(traces, base='legend_below', **layout)
+
+def get_overlay_yaxis():
+    """派生系列（差分・変化率など）用の右軸設定"""
+    return dict(
+        title="📐 派生系列",
+        side="right",
+        overlaying="y",
+        showgrid=False,
+        zeroline=True,
+        zerolinecolor='#555'
+    )
 
 def create_multi_unit_charts(data, currency, value_type, indicator_groups):
     """単位グループ別に複数のチャートを作成"""
@@ -881,39 +1103,11 @@ def create_multi_unit_charts(data, currency, value_type, indicator_groups):
 
 def create_unit_group_chart(data, currency, value_type, unit_group, group_info):
     """特定の単位グループのチャートを作成"""
-    fig = go.Figure()
-    colors = px.colors.qualitative.Set3 + px.colors.qualitative.Pastel1
-    
-    color_idx = 0
-    for tag in sorted(group_info['indicators']):
-        tag_data = data[data['data_tag'] == tag].copy()
-        if not tag_data.empty:
-            tag_data = tag_data.sort_values('date')
-            cleaned_values = clean_and_interpolate_data(tag_data[value_type])
-            valid_mask = ~cleaned_values.isna()
-            
-            if valid_mask.any():
-                valid_data = tag_data[valid_mask]
-                valid_values = cleaned_values[valid_mask]
-                
-                importance_info = valid_data['importance'].iloc[0] if 'importance' in valid_data.columns and len(valid_data) > 0 else 'unknown'
-                importance_emoji = {'high': '🔴', 'medium': '🟡', 'low': '🟢'}.get(importance_info, '⚪')
-                
-                fig.add_trace(go.Scatter(
-                    x=valid_data['date'],
-                    y=valid_values,
-                    mode='lines+markers',
-                    name=f"{importance_emoji} {tag}",
-                    line=dict(color=colors[color_idx % len(colors)], width=2, shape='linear'),
-                    marker=dict(size=4),
-                    connectgaps=True,
-                    hovertemplate=f'<b>{tag}</b><br>重要度: {importance_info}<br>Date: %{{x}}<br>Value: %{{y:.2f}}<br><extra></extra>'
-                ))
-                color_idx += 1
+    traces, _ = series_traces(data, 'data_tag', sorted(group_info['indicators']), value_type)
     
     # 単位に応じた軸設定
-    yaxis_title = get_yaxis_title(unit_group)
     yaxis_config = get_yaxis_config(unit_group)
+    yaxis_config['yaxis'] = dict(yaxis_config['yaxis'], title=dict(text=get_yaxis_title(unit_group)))
     
     # スケール情報を含むタイトルを作成
     scale_info = ""
@@ -927,36 +1121,15 @@ def create_unit_group_chart(data, currency, value_type, unit_group, group_info):
         elif "xlarge" in unit_group:
             scale_info = " (20%+スケール)"
     
-    fig.update_layout(
+    return chart_figure(
+        traces,
         title=f"🏛️ {currency} - {group_info['label']}{scale_info} ({value_type.capitalize()})",
-        xaxis_title="📅 Date",
-        yaxis_title=yaxis_title,
-        template="plotly_dark",
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        font=dict(color='white', family='Arial'),
         height=500,  # 少し低めに設定
-        hovermode='x unified',
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="right",
-            x=1
-        ),
         **yaxis_config
     )
-    
-    fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='#333')
-    fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='#333')
-    
-    return fig
 
 def create_dual_axis_chart(data, currency, value_type, indicator_groups):
     """デュアル軸チャート作成"""
-    fig = go.Figure()
-    colors = px.colors.qualitative.Set3 + px.colors.qualitative.Pastel1
-    
     # 主要グループと副グループを決定（より適切な優先順位）
     group_keys = list(indicator_groups.keys())
     
@@ -967,72 +1140,16 @@ def create_dual_axis_chart(data, currency, value_type, indicator_groups):
     primary_group = sorted_groups[0]
     secondary_group = sorted_groups[1] if len(sorted_groups) > 1 else sorted_groups[0]
     
-    # 色のインデックス
-    color_idx = 0
-    
-    # 第1軸のデータ
-    for tag in indicator_groups[primary_group]['indicators']:
-        tag_data = data[data['data_tag'] == tag].copy()
-        if not tag_data.empty:
-            tag_data = tag_data.sort_values('date')
-            cleaned_values = clean_and_interpolate_data(tag_data[value_type])
-            valid_mask = ~cleaned_values.isna()
-            
-            if valid_mask.any():
-                valid_data = tag_data[valid_mask]
-                valid_values = cleaned_values[valid_mask]
-                
-                importance_info = valid_data['importance'].iloc[0] if 'importance' in valid_data.columns and len(valid_data) > 0 else 'unknown'
-                importance_emoji = {'high': '🔴', 'medium': '🟡', 'low': '🟢'}.get(importance_info, '⚪')
-                
-                fig.add_trace(go.Scatter(
-                    x=valid_data['date'],
-                    y=valid_values,
-                    mode='lines+markers',
-                    name=f"{importance_emoji} {tag}",
-                    line=dict(color=colors[color_idx % len(colors)], width=2, shape='linear'),
-                    marker=dict(size=4),
-                    connectgaps=True,
-                    yaxis='y',
-                    hovertemplate=f'<b>{tag}</b><br>重要度: {importance_info}<br>Date: %{{x}}<br>Value: %{{y:.2f}}<br><extra></extra>'
-                ))
-                color_idx += 1
-    
-    # 第2軸のデータ
+    # 第1軸のデータ、続けて第2軸のデータ（第1軸に追加済みの指標は除く）
+    axes = {tag: 'y' for tag in indicator_groups[primary_group]['indicators']}
     for tag in indicator_groups[secondary_group]['indicators']:
-        if tag in indicator_groups[primary_group]['indicators']:
-            continue  # 既に追加済み
-            
-        tag_data = data[data['data_tag'] == tag].copy()
-        if not tag_data.empty:
-            tag_data = tag_data.sort_values('date')
-            cleaned_values = clean_and_interpolate_data(tag_data[value_type])
-            valid_mask = ~cleaned_values.isna()
-            
-            if valid_mask.any():
-                valid_data = tag_data[valid_mask]
-                valid_values = cleaned_values[valid_mask]
-                
-                importance_info = valid_data['importance'].iloc[0] if 'importance' in valid_data.columns and len(valid_data) > 0 else 'unknown'
-                importance_emoji = {'high': '🔴', 'medium': '🟡', 'low': '🟢'}.get(importance_info, '⚪')
-                
-                fig.add_trace(go.Scatter(
-                    x=valid_data['date'],
-                    y=valid_values,
-                    mode='lines+markers',
-                    name=f"{importance_emoji} {tag} (右軸)",
-                    line=dict(color=colors[color_idx % len(colors)], width=2, shape='linear', dash='dash'),
-                    marker=dict(size=4, symbol='diamond'),
-                    connectgaps=True,
-                    yaxis='y2',
-                    hovertemplate=f'<b>{tag}</b><br>重要度: {importance_info}<br>Date: %{{x}}<br>Value: %{{y:.2f}}<br><extra></extra>'
-                ))
-                color_idx += 1
+        axes.setdefault(tag, 'y2')
+    traces, _ = series_traces(data, 'data_tag', list(axes), value_type, axes=axes)
     
     # デュアル軸レイアウト
-    fig.update_layout(
+    return chart_figure(
+        traces,
         title=f"🏛️ {currency} Economic Indicators - Multi-Scale ({value_type.capitalize()})",
-        xaxis_title="📅 Date",
         yaxis=dict(
             title=f"📊 {indicator_groups[primary_group]['label']}",
             side="left",
@@ -1046,24 +1163,8 @@ def create_dual_axis_chart(data, currency, value_type, indicator_groups):
             overlaying="y",
             showgrid=False
         ),
-        template="plotly_dark",
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        font=dict(color='white', family='Arial'),
-        height=700,
-        hovermode='x unified',
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="right",
-            x=1
-        )
+        height=700
     )
-    
-    fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='#333')
-    
-    return fig
 
 def get_yaxis_title(unit_group):
     """単位グループに応じたY軸タイトルを取得"""
@@ -1089,8 +1190,8 @@ def get_yaxis_title(unit_group):
     }
     return titles.get(unit_group, "📊 値")
 
-def create_indicator_chart(df, indicator, value_type):
-    """指標別チャート作成（統一スケール）"""
+def create_indicator_chart(df, indicator, value_type, overlays=None):
+    """指標別チャート作成（統一スケール、overlaysは派生系列の事前計算済み列、トレースは一括作成の高速パスで組み立て）"""
     data = df[df['data_tag'] == indicator]
     
     if data.empty:
@@ -1101,75 +1202,35 @@ def create_indicator_chart(df, indicator, value_type):
     sample_values = data[value_type].head(50)
     unit_group, unit_label = get_indicator_unit_group(indicator, sample_values)
     
-    fig = go.Figure()
-    colors = px.colors.qualitative.Set2 + px.colors.qualitative.Dark2
-    
-    for i, currency in enumerate(sorted([str(c) for c in data['currency'].dropna().unique()])):
-        currency_data = data[data['currency'] == currency].copy()
-        if not currency_data.empty:
-            # 日付でソート
-            currency_data = currency_data.sort_values('date')
-            
-            # データの前処理と補間
-            cleaned_values = clean_and_interpolate_data(currency_data[value_type])
-            
-            # 有効なデータのみ使用
-            valid_mask = ~cleaned_values.isna()
-            if valid_mask.any():
-                valid_data = currency_data[valid_mask]
-                valid_values = cleaned_values[valid_mask]
-                
-                # 重要度情報を追加
-                importance_info = valid_data['importance'].iloc[0] if 'importance' in valid_data.columns and len(valid_data) > 0 else 'unknown'
-                importance_emoji = {'high': '🔴', 'medium': '🟡', 'low': '🟢'}.get(importance_info, '⚪')
-                
-                fig.add_trace(go.Scatter(
-                    x=valid_data['date'],
-                    y=valid_values,
-                    mode='lines+markers',
-                    name=f"{importance_emoji} {currency}",
-                    line=dict(color=colors[i % len(colors)], width=3, shape='linear'),
-                    marker=dict(size=5),
-                    connectgaps=True,  # ギャップを接続
-                    hovertemplate=f'<b>{currency}</b><br>重要度: {importance_info}<br>Date: %{{x}}<br>Value: %{{y:.2f}}<br><extra></extra>'
-                ))
+    # 派生系列のオーバーレイ（事前計算済みの値を行インデックスで取得）
+    currencies = sorted([str(c) for c in data['currency'].dropna().unique()])
+    traces, uses_secondary_axis = series_traces(
+        data, 'currency', currencies, value_type, colors=CURRENCY_COLORS, fixed_colors=True, line_width=3, marker_size=5,
+        overlays=overlays
+    )
     
     # 単位に応じたY軸タイトル
     yaxis_title = get_yaxis_title(unit_group)
     
     # 単位グループ別の軸設定
     yaxis_config = get_yaxis_config(unit_group)
+    yaxis_config['yaxis'] = dict(yaxis_config['yaxis'], title=dict(text=yaxis_title))
     
-    fig.update_layout(
+    layout = dict(
         title=dict(
             text=f"📊 {indicator} Cross-Currency Comparison ({value_type.capitalize()})",
             y=0.95,
             x=0.5,
             xanchor='center'
         ),
-        xaxis_title="📅 Date",
-        yaxis_title=yaxis_title,
-        template="plotly_dark",
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        font=dict(color='white', family='Arial'),
         height=750,  # 高さを少し増やす
-        hovermode='x unified',
-        legend=dict(
-            orientation="h",
-            yanchor="top",
-            y=-0.15,
-            xanchor="center",
-            x=0.5
-        ),
-        margin=dict(t=80, b=120),
         **yaxis_config
     )
     
-    fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='#333')
-    fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='#333')
+    if uses_secondary_axis:
+        layout['yaxis2'] = get_overlay_yaxis()
     
-    return fig
+    return chart_figure(traces, base='legend_below', **layout)
 
 def get_yaxis_config(unit_group):
     """単位グループに応じたY軸設定を取得"""
@@ -1235,34 +1296,101 @@ def get_yaxis_config(unit_group):
     else:
         return base_config
 
-def get_indicators_in_all_currencies(df):
-    """全通貨で揃っている経済指標を取得（類似指標含む）"""
-    # 利用可能な通貨を取得
-    all_currencies = sorted([str(c) for c in df['currency'].dropna().unique()])
-    
-    # 類似指標のマッピング（比較可能とみなす指標群）
-    similar_indicators = {
-        'CPI': ['CPI (YoY)', 'National CPI (YoY)', 'Core CPI (YoY)'],
-        'CPI_MoM': ['CPI (MoM)', 'National CPI (MoM)', 'Core CPI (MoM)'],
-        'Tokyo_CPI': ['Tokyo CPI (YoY)', 'CPI (YoY)'],  # 東京CPIと全国CPIは比較可能
-        'Building_Permits': ['Building Permits', 'Housing Starts'],  # 建設関連
-        'Factory_Orders': ['Factory Orders', 'Industrial Production (MoM)', 'Industrial Production (YoY)'],  # 製造業関連
-        'Housing_Prices': ['Housing Prices (MoM)', 'Housing Prices (YoY)'],
-        'PPI': ['PPI (MoM)', 'PPI (YoY)'],  # 生産者物価
-        'Retail_Sales': ['Retail Sales (MoM)', 'Retail Sales (YoY)']
-    }
-    
-    # 指標ごとにどの通貨で利用可能かを確認
-    indicator_currency_map = {}
-    for indicator in df['data_tag'].unique():
-        if indicator != "None":
-            indicator_currencies = set(df[df['data_tag'] == indicator]['currency'].dropna().unique())
-            indicator_currency_map[indicator] = indicator_currencies
+def create_correlation_heatmap(corr, base_currency, compare_currency, lag):
+    """指標間の相関ヒートマップ作成"""
+    lag_text = f"Lag {lag:+d}M" if lag else "Lag 0"
+    fig = go.Figure(go.Heatmap(
+        z=corr.to_numpy(),
+        x=list(corr.columns),
+        y=list(corr.index),
+        zmin=-1,
+        zmax=1,
+        colorscale='RdBu',
+        reversescale=True,
+        colorbar=dict(title="相関"),
+        hovertemplate=f'<b>{base_currency}</b> %{{y}}<br><b>{compare_currency}</b> %{{x}}<br>相関: %{{z:.2f}}<extra></extra>'
+    ))
     
-    # 類似指標グループで通貨カバレッジをチェック
-    group_coverage = {}
-    for group_name, indicators in similar_indicators.items():
-        covered_currencies = set()
+    fig.update_layout(
+        title=dict(
+            text=f"🔗 {base_currency} × {compare_currency} Indicator Correlation ({lag_text})",
+            y=0.97,
+            x=0.5,
+            xanchor='center'
+        ),
+        xaxis_title=f"{compare_currency} 指標",
+        yaxis_title=f"{base_currency} 指標",
+        template="plotly_dark",
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white', family='Arial'),
+        height=max(500, min(1200, 24 * len(corr.index) + 200)),
+        margin=dict(t=80, b=150)
+    )
+    fig.update_xaxes(tickangle=-45)
+    fig.update_yaxes(autorange='reversed')
+    
+    return fig
+
+def create_lag_profile_chart(lags, values, base_label, compare_label):
+    """ラグごとの相関（先行・遅行の確認用）チャート作成"""
+    colors = ['#d62728' if pd.notna(v) and v < 0 else '#1f77b4' for v in values]
+    fig = go.Figure(go.Bar(
+        x=list(lags),
+        y=values,
+        marker_color=colors,
+        hovertemplate='Lag: %{x:+d}M<br>相関: %{y:.2f}<extra></extra>'
+    ))
+    
+    fig.update_layout(
+        title=dict(
+            text=f"⏱️ {base_label} → {compare_label} Lead/Lag Profile",
+            y=0.95,
+            x=0.5,
+            xanchor='center'
+        ),
+        xaxis_title="ラグ（月、正: 基準指標が先行）",
+        yaxis_title="相関",
+        template="plotly_dark",
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white', family='Arial'),
+        height=400,
+        yaxis=dict(range=[-1, 1])
+    )
+    fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='#333', dtick=1)
+    fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='#333')
+    
+    return fig
+
+def get_indicators_in_all_currencies(panel):
+    """全通貨で揃っている経済指標を取得（類似指標含む）"""
+    # 利用可能な通貨を取得
+    all_currencies = list(panel.currencies)
+    
+    # 類似指標のマッピング（比較可能とみなす指標群）
+    similar_indicators = {
+        'CPI': ['CPI (YoY)', 'National CPI (YoY)', 'Core CPI (YoY)'],
+        'CPI_MoM': ['CPI (MoM)', 'National CPI (MoM)', 'Core CPI (MoM)'],
+        'Tokyo_CPI': ['Tokyo CPI (YoY)', 'CPI (YoY)'],  # 東京CPIと全国CPIは比較可能
+        'Building_Permits': ['Building Permits', 'Housing Starts'],  # 建設関連
+        'Factory_Orders': ['Factory Orders', 'Industrial Production (MoM)', 'Industrial Production (YoY)'],  # 製造業関連
+        'Housing_Prices': ['Housing Prices (MoM)', 'Housing Prices (YoY)'],
+        'PPI': ['PPI (MoM)', 'PPI (YoY)'],  # 生産者物価
+        'Retail_Sales': ['Retail Sales (MoM)', 'Retail Sales (YoY)']
+    }
+    
+    # 指標ごとにどの通貨で利用可能かを確認（パネルのカバレッジ行列から一括取得）
+    coverage = panel.coverage()
+    indicator_currency_map = {}
+    for t, indicator in enumerate(panel.tags):
+        if indicator != "None" and coverage[:, t].any():
+            indicator_currency_map[indicator] = {c for c, flag in zip(panel.currencies, coverage[:, t]) if flag}
+    
+    # 類似指標グループで通貨カバレッジをチェック
+    group_coverage = {}
+    for group_name, indicators in similar_indicators.items():
+        covered_currencies = set()
         for indicator in indicators:
             if indicator in indicator_currency_map:
                 covered_currencies.update(indicator_currency_map[indicator])
@@ -1284,23 +1412,765 @@ def get_indicators_in_all_currencies(df):
     
     return sorted(full_coverage_indicators), all_currencies
 
+def superseded_version_filter():
+    """最新の版でも、このプロセスのセッションが参照中の版でもないデータバージョンのエントリか"""
+    keep = {latest_data_version()}
+    if STORAGE_ENGINE != 'sqlite':
+        keep.update(get_snapshot_store().pinned_versions())
+    return lambda arguments: 'data_version' in arguments and arguments['data_version'] not in keep
+
+# 月次パネルのディスクキャッシュ（メモリ上のパネルは get_monthly_panel の統計に含まれる）
+CACHE_REGISTRY.register_source(
+    'panel_disk', 'disk',
+    lambda: dict(zip(('entries', 'bytes'), directory_usage(PANEL_CACHE_DIR))),
+    lambda: shutil.rmtree(PANEL_CACHE_DIR, ignore_errors=True)
+)
+
+def show_cache_panel():
+    """キャッシュ層ごとのヒット率・サイズ・追い出しの表示と、選択したキャッシュの破棄・統計の出力"""
+    with st.sidebar.expander("🧮 キャッシュ統計"):
+        metrics = pd.DataFrame(CACHE_REGISTRY.metrics())
+        if metrics.empty:
+            st.caption("キャッシュはまだ使われていません")
+            return
+        table = pd.DataFrame({
+            'キャッシュ': metrics['name'],
+            '層': metrics['layer'],
+            'ヒット率': metrics['hit_ratio'].astype(float).map(lambda x: '-' if pd.isna(x) else f"{x:.0%}"),
+            'ヒット': metrics['hits'].astype('Int64'),
+            'ミス': metrics['misses'].astype('Int64'),
+            '件数': metrics['entries'].astype('Int64'),
+            'MB': (pd.to_numeric(metrics['bytes']) / 1e6).round(1),
+            '追い出し': metrics['evictions'].astype('Int64'),
+            '再計算(秒)': metrics['recompute_seconds'].astype(float).round(2),
+        })
+        st.dataframe(table, hide_index=True, use_container_width=True)
+        
+        # 対象を絞った破棄（全キャッシュの一括クリアの代わり）
+        target = st.selectbox("破棄するキャッシュ:", list(metrics['name']), key="cache_invalidate_target")
+        scope = st.radio("対象:", ["参照されていないデータバージョン", "全て"], horizontal=True, key="cache_invalidate_scope")
+        if st.button("🗑️ 破棄", key="cache_invalidate"):
+            where = superseded_version_filter() if scope != "全て" else None
+            removed = CACHE_REGISTRY.invalidate(target, where=where)
+            st.success(f"🗑️ {target}: {removed}件を破棄しました")
+        
+        st.download_button(
+            "📤 メトリクスを出力 (Prometheus)",
+            CACHE_REGISTRY.prometheus(),
+            file_name="cache_metrics.prom",
+            mime="text/plain",
+            key="cache_metrics_download"
+        )
+
+def export_cache_metrics():
+    """キャッシュ統計をファイルに出力（CACHE_METRICS_PATH の設定時のみ、収集エージェントのテキスト形式）"""
+    if not CACHE_METRICS_PATH:
+        return
+    try:
+        atomic_write_bytes(CACHE_METRICS_PATH, CACHE_REGISTRY.prometheus().encode('utf-8'))
+    except OSError as e:
+        st.sidebar.warning(f"⚠️ キャッシュ統計の出力に失敗しました: {e}")
+
+def show_export_panel(series_index, search_index):
+    """選択した系列の一括エクスポート（ダウンロードの押下時にチャンク単位で一時ファイルへ書き出す）
+
+    Streamlit はダウンロードするデータをメモリ上に保持するため、画面から出力できるのは
+    EXPORT_MAX_ROWS 件まで（それ以上はコマンドラインでファイルへストリーミング出力する）。
+    """
+    df = series_index.df
+    export_currencies_all = list(search_index.currencies)
+    export_tags_all = list(search_index.tags)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        export_currencies = st.multiselect("🏛️ 通貨（未選択で全て）:", export_currencies_all, key="export_currencies")
+    with col2:
+        export_tags = st.multiselect("📊 経済指標（未選択で全て）:", export_tags_all, key="export_tags")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        export_start = st.date_input("開始日", value=df['date'].min().date(), key="export_start_date")
+    with col2:
+        export_end = st.date_input("終了日", value=df['date'].max().date(), key="export_end_date")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        export_value_types = st.multiselect(
+            "📈 値タイプ:",
+            [v for v in EXPORT_VALUE_TYPES if v in df.columns],
+            default=['actual', 'forecast', 'previous'],
+            key="export_value_types"
+        )
+    with col2:
+        export_format = st.radio(
+            "💾 出力形式:",
+            list(EXPORT_FORMATS),
+            format_func=lambda x: {'csv': 'CSV', 'parquet': 'Parquet', 'arrow': 'Arrow IPC'}.get(x, x),
+            horizontal=True,
+            key="export_format"
+        )
+    
+    if export_start > export_end:
+        st.warning("正しい日付範囲を設定してください")
+        return
+    
+    selection = dict(
+        currencies=export_currencies or None,
+        tags=export_tags or None,
+        start_date=export_start,
+        end_date=export_end
+    )
+    total_rows = len(selection_positions(series_index, **selection))
+    st.info(f"📋 エクスポート件数: {total_rows:,}件")
+    if total_rows > EXPORT_MAX_ROWS:
+        st.warning(
+            f"⚠️ 画面からのエクスポートは{EXPORT_MAX_ROWS:,}件までです。"
+            "条件を絞り込むか、コマンドライン（python data_export.py）で出力してください"
+        )
+        return
+    if export_format != 'csv' and importlib.util.find_spec('pyarrow') is None:
+        st.error(f"{export_format}形式の出力には pyarrow が必要です")
+        return
+    
+    def build_export():
+        # ダウンロードの押下時のみ作成（実行のたびに作成・セッションに保持しない）
+        with tempfile.TemporaryFile() as buffer:
+            export_selection(series_index, buffer, export_format, value_types=export_value_types, **selection)
+            buffer.seek(0)
+            return buffer.read()
+    
+    st.download_button(
+        "⬇️ ダウンロード",
+        data=build_export,
+        file_name=export_file_name(export_format, export_currencies, export_tags),
+        mime=EXPORT_FORMATS[export_format]['mime'],
+        on_click="ignore",
+        key="export_download"
+    )
+
+def release_rows(series_index, currencies, tags, importance):
+    """テーブル表示用の行の取得元（SQLite保存時は絞り込み・並べ替え・ページ分割をクエリとして実行）"""
+    if STORAGE_ENGINE == 'sqlite':
+        return get_release_store().query(currencies=currencies, tags=tags, importance=importance)
+    # 系列インデックスから日付昇順のテーブルを取得
+    return FrameRows(series_index.table(currencies=currencies, tags=tags, importance=importance))
+
+def show_paged_table(frame, columns, key, height=400):
+    """ページ分割テーブル（並べ替え・ページ分割はサーバー側で行い、表示中のページのみ送る）"""
+    sort_labels = {'date': '日付', 'currency': '通貨', 'importance': '重要度', 'event': 'イベント', 'data_tag': '指標',
+                   'actual': '実績', 'forecast': '予測', 'previous': '前回', 'surprise': 'サプライズ',
+                   'surprise_pct': 'サプライズ率', 'surprise_z': 'サプライズZ'}
+    
+    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+    with col1:
+        sort_column = st.selectbox(
+            "並べ替え:",
+            columns,
+            format_func=lambda x: sort_labels.get(x, x),
+            key=f"{key}_sort"
+        )
+    with col2:
+        ascending = st.selectbox(
+            "順序:",
+            [False, True],
+            format_func=lambda x: "昇順" if x else "降順",
+            key=f"{key}_ascending"
+        )
+    with col3:
+        page_size = st.selectbox(
+            "表示件数:",
+            PAGE_SIZE_OPTIONS,
+            index=PAGE_SIZE_OPTIONS.index(DEFAULT_PAGE_SIZE),
+            key=f"{key}_page_size"
+        )
+    with col4:
+        pages = page_count(len(frame), page_size)
+        # 絞り込みでページ数が減った場合は最終ページに戻す
+        if st.session_state.get(f"{key}_page", 1) > pages:
+            st.session_state[f"{key}_page"] = pages
+        page = st.number_input("ページ:", min_value=1, max_value=pages, step=1, key=f"{key}_page")
+    
+    rows, info = table_page(frame, columns, page=page, page_size=page_size, sort_column=sort_column, ascending=ascending)
+    st.caption(
+        f"全{info['total_rows']:,}件中 {info['start'] + 1 if info['total_rows'] else 0:,}–{info['stop']:,}件を表示"
+        f"（{info['page']}/{info['page_count']}ページ）"
+    )
+    st.dataframe(rows, use_container_width=True, hide_index=True, height=height)
+
+@st.fragment
+def show_currency_table(series_index, selected_currency, currency_indicators, importance_filter):
+    """通貨別データテーブル（フラグメント: 指標選択・日付フィルターの変更ではこの部分のみ再実行）"""
+    st.subheader("📋 データテーブル")
+    if currency_indicators:
+        # フィルター機能
+        selected_indicators = st.multiselect(
+            "表示する指標を選択:",
+            currency_indicators,
+            default=currency_indicators[:5]  # デフォルトで5つ表示
+        )
+        
+        if selected_indicators:
+            filtered_rows = release_rows(
+                series_index,
+                currencies=[selected_currency],
+                tags=selected_indicators,
+                importance=importance_filter
+            )
+            # 最新50件のデータを表示（新しい順に）
+            recent_data = filtered_rows.recent(50)
+            first_date, last_date = filtered_rows.date_bounds()
+            
+            # 重要度カラムを含める
+            display_columns = ['date', 'importance', 'event', 'data_tag', 'actual', 'forecast', 'previous', 'surprise', 'surprise_pct', 'surprise_z']
+            available_columns = [col for col in display_columns if col in recent_data.columns]
+            
+            st.dataframe(
+                recent_data[available_columns],
+                use_container_width=True,
+                height=500
+            )
+            
+            # 追加のデータ詳細を展開可能セクションで
+            with st.expander("🔍 詳細フィルターとデータ"):
+                # 日付フィルター
+                col1, col2 = st.columns(2)
+                with col1:
+                    start_date = st.date_input(
+                        "開始日",
+                        value=first_date.date() if first_date is not None else None
+                    )
+                with col2:
+                    end_date = st.date_input(
+                        "終了日", 
+                        value=last_date.date() if last_date is not None else None
+                    )
+                
+                # 日付でフィルター（メモリ上は二分探索で連続スライス、SQLite保存時は期間条件付きのクエリ）
+                if start_date and end_date:
+                    date_filtered = filtered_rows.between(start_date, end_date)
+                    
+                    st.write(f"📅 期間内のデータ: {len(date_filtered)}件")
+                    if len(date_filtered):
+                        # 重要度カラムを含める
+                        detail_columns = ['date', 'importance', 'event', 'data_tag', 'actual', 'forecast', 'previous', 'surprise', 'surprise_pct', 'surprise_z']
+                        available_detail_columns = [col for col in detail_columns if col in date_filtered.columns]
+                        
+                        show_paged_table(date_filtered, available_detail_columns, key="currency_detail")
+        else:
+            st.info("指標を選択してデータを表示してください")
+    else:
+        st.warning(f"{selected_currency}のデータがありません")
+
+@st.fragment
+def show_indicator_table(series_index, selected_indicator, indicator_currencies, importance_filter):
+    """指標別データテーブル（フラグメント: 通貨選択・日付フィルターの変更ではこの部分のみ再実行）"""
+    st.subheader("📋 データテーブル")
+    if indicator_currencies:
+        # 通貨フィルター
+        selected_currencies = st.multiselect(
+            "表示する通貨を選択:",
+            indicator_currencies,
+            default=indicator_currencies[:5]  # デフォルトで5つ表示
+        )
+        
+        if selected_currencies:
+            filtered_rows = release_rows(
+                series_index,
+                currencies=selected_currencies,
+                tags=[selected_indicator],
+                importance=importance_filter
+            )
+            # 最新50件のデータを表示（新しい順に）
+            recent_data = filtered_rows.recent(50)
+            first_date, last_date = filtered_rows.date_bounds()
+            
+            # 重要度カラムを含める
+            display_columns_indicator = ['date', 'currency', 'importance', 'event', 'actual', 'forecast', 'previous', 'surprise', 'surprise_pct', 'surprise_z']
+            available_columns_indicator = [col for col in display_columns_indicator if col in recent_data.columns]
+            
+            st.dataframe(
+                recent_data[available_columns_indicator],
+                use_container_width=True,
+                height=500
+            )
+            
+            # 追加のデータ詳細を展開可能セクションで
+            with st.expander("🔍 詳細フィルターとデータ"):
+                # 日付フィルター
+                col1, col2 = st.columns(2)
+                with col1:
+                    start_date = st.date_input(
+                        "開始日",
+                        value=first_date.date() if first_date is not None else None,
+                        key="indicator_start_date"
+                    )
+                with col2:
+                    end_date = st.date_input(
+                        "終了日", 
+                        value=last_date.date() if last_date is not None else None,
+                        key="indicator_end_date"
+                    )
+                
+                # 日付でフィルター（メモリ上は二分探索で連続スライス、SQLite保存時は期間条件付きのクエリ）
+                if start_date and end_date:
+                    date_filtered = filtered_rows.between(start_date, end_date)
+                    
+                    st.write(f"📅 期間内のデータ: {len(date_filtered)}件")
+                    if len(date_filtered):
+                        # 重要度カラムを含める
+                        detail_columns_indicator = ['date', 'currency', 'importance', 'event', 'actual', 'forecast', 'previous', 'surprise', 'surprise_pct', 'surprise_z']
+                        available_detail_indicator = [col for col in detail_columns_indicator if col in date_filtered.columns]
+                        
+                        show_paged_table(date_filtered, available_detail_indicator, key="indicator_detail")
+        else:
+            st.info("通貨を選択してデータを表示してください")
+    else:
+        st.warning(f"{selected_indicator}のデータがありません")
+
+@st.fragment
+def show_calendar_view():
+    """経済指標カレンダー（フラグメント: 期間・重要度の変更ではこの部分のみ再実行）"""
+    st.subheader("📅 経済指標カレンダー")
+    
+    # 日付範囲選択
+    col1, col2 = st.columns(2)
+    with col1:
+        start_date = st.date_input(
+            "開始日",
+            value=datetime.now() - timedelta(days=7),
+            help="表示する開始日を選択"
+        )
+    with col2:
+        end_date = st.date_input(
+            "終了日", 
+            value=datetime.now() + timedelta(days=30),  # 1ヶ月先まで
+            help="表示する終了日を選択"
+        )
+    
+    # 重要度フィルター（通貨フィルターは削除）
+    selected_importance = st.multiselect(
+        "⭐ 重要度を選択:",
+        options=['High', 'Medium', 'Low'],
+        default=['High', 'Medium'],
+        help="表示する重要度を選択"
+    )
+    
+    if selected_importance and start_date <= end_date:
+        # 直接investpyからカレンダーデータを取得
+        try:
+            with st.spinner("📅 カレンダーデータを取得中..."):
+                from_date = start_date.strftime('%d/%m/%Y')
+                to_date = end_date.strftime('%d/%m/%Y')
+                
+                calendar_data = get_data_source().economic_calendar(
+                    countries=['united states', 'euro zone', 'united kingdom', 'japan', 'australia'],
+                    from_date=from_date,
+                    to_date=to_date
+                )
+                
+                if not calendar_data.empty:
+                    # データの内容をデバッグ表示
+                    st.info(f"📊 取得データ: {len(calendar_data)}件")
+                    if 'importance' in calendar_data.columns:
+                        importance_counts = calendar_data['importance'].value_counts()
+                        st.info(f"重要度別件数: {dict(importance_counts)}")
+                    
+                    # 通貨マッピング
+                    currency_mapping = {
+                        'united states': 'USD',
+                        'euro zone': 'EUR', 
+                        'united kingdom': 'GBP',
+                        'japan': 'JPY',
+                        'australia': 'AUD'
+                    }
+                    
+                    # zone列をcurrencyに変換
+                    if 'zone' in calendar_data.columns:
+                        calendar_data['currency_display'] = calendar_data['zone'].map(currency_mapping).fillna(calendar_data['zone'])
+                    else:
+                        calendar_data['currency_display'] = calendar_data.get('currency', 'Unknown')
+                    
+                    # 重要度でフィルター（大文字小文字を統一）
+                    if 'importance' in calendar_data.columns:
+                        # 重要度の値を正規化
+                        calendar_data['importance_normalized'] = calendar_data['importance'].str.strip().str.title()
+                        selected_importance_normalized = [imp.strip().title() for imp in selected_importance]
+                        calendar_filtered = calendar_data[calendar_data['importance_normalized'].isin(selected_importance_normalized)].copy()
+                    else:
+                        st.warning("重要度列が見つかりません")
+                        calendar_filtered = calendar_data.copy()
+                    
+                    if not calendar_filtered.empty:
+                        st.info(f"🎯 フィルター後: {len(calendar_filtered)}件")
+                        
+                        # 重要度による色分け
+                        importance_colors = {
+                            'High': '🔴',
+                            'Medium': '🟡', 
+                            'Low': '🟢'
+                        }
+                        
+                        # 日付変換
+                        calendar_filtered['date_parsed'] = pd.to_datetime(calendar_filtered['date'], dayfirst=True, errors='coerce')
+                        calendar_filtered = calendar_filtered.dropna(subset=['date_parsed'])
+                        calendar_filtered['date_str'] = calendar_filtered['date_parsed'].dt.strftime('%Y-%m-%d')
+                        
+                        # 日付ごとにグループ化
+                        grouped = calendar_filtered.groupby('date_str')
+                        
+                        for date_str, group in grouped:
+                            with st.expander(f"📅 {date_str} ({len(group)}件)", expanded=True):
+                                # 重要度順にソート
+                                importance_order = {'High': 0, 'Medium': 1, 'Low': 2}
+                                group['importance_rank'] = group['importance'].map(importance_order).fillna(3)
+                                group_sorted = group.sort_values(['importance_rank', 'time'])
+                                
+                                for _, row in group_sorted.iterrows():
+                                    # 正規化された重要度を使用
+                                    importance_display = row.get('importance_normalized', row.get('importance', ''))
+                                    importance_icon = importance_colors.get(importance_display, '⚪')
+                                    
+                                    # 時間情報を取得
+                                    time_info = row.get('time', '')
+                                    if pd.notna(time_info) and str(time_info) != '':
+                                        time_display = f"⏰ {time_info}"
+                                    else:
+                                        time_display = ""
+                                    
+                                    col1, col2, col3, col4, col5 = st.columns([1, 1, 1, 4, 2])
+                                    with col1:
+                                        st.write(f"{importance_icon}")
+                                    with col2:
+                                        st.write(f"**{row['currency_display']}**")
+                                    with col3:
+                                        st.write(time_display)
+                                    with col4:
+                                        st.write(f"{row['event']}")
+                                    with col5:
+                                        if pd.notna(row.get('actual')) and str(row.get('actual')) != '':
+                                            st.write(f"実績: **{row['actual']}**")
+                                        elif pd.notna(row.get('forecast')) and str(row.get('forecast')) != '':
+                                            st.write(f"予測: {row['forecast']}")
+                                        else:
+                                            st.write("--")
+                    else:
+                        st.info("選択された重要度のデータがありません")
+                else:
+                    st.warning("指定期間にカレンダーデータがありません")
+                    
+        except Exception as e:
+            st.error(f"カレンダーデータ取得エラー: {e}")
+    else:
+        st.warning("重要度を選択し、正しい日付範囲を設定してください")
+
+@st.fragment
+def show_country_view(available_currencies, importance_filter, full_coverage_indicators, show_full_coverage_only):
+    """国別経済指標一覧（フラグメント: 国・データタイプの変更ではこの部分のみ再実行）"""
+    importance_key = tuple(importance_filter) if importance_filter else None
+    
+    st.subheader("🌏 国別経済指標ヒストリカル一覧")
+    
+    # 国選択
+    country_mapping = {
+        'USD': '🇺🇸 アメリカ',
+        'EUR': '🇪🇺 ユーロ圏', 
+        'GBP': '🇬🇧 イギリス',
+        'JPY': '🇯🇵 日本',
+        'AUD': '🇦🇺 オーストラリア'
+    }
+    
+    selected_country = st.selectbox(
+        "🏛️ 国を選択:",
+        options=available_currencies,
+        format_func=lambda x: country_mapping.get(x, x),
+        help="表示する国を選択してください"
+    )
+    
+    if selected_country:
+        # 選択された国の発表有無を月次パネルから取得（重要度・全通貨フィルター適用済みの範囲）
+        presence_panel = get_monthly_panel(get_data_version(), 'actual', importance_key)
+        tag_scope = full_coverage_indicators if show_full_coverage_only else presence_panel.tags
+        country_pos = presence_panel.currency_position(selected_country)
+        if country_pos is not None:
+            month_counts = presence_panel.counts[country_pos][presence_panel.tag_positions(tag_scope)].sum(axis=0)
+        else:
+            month_counts = np.zeros(len(presence_panel.months), dtype=np.int64)
+        
+        if month_counts.any():
+            # 直近2年分のデータを取得
+            months_with_data = presence_panel.months[month_counts > 0]
+            available_years = sorted({int(y) for y in months_with_data.astype('datetime64[Y]').astype(int) + 1970}, reverse=True)
+            
+            # 直近2年を自動選択
+            recent_years = available_years[:2] if len(available_years) >= 2 else available_years
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                # データタイプ選択（actualまたはforecast）
+                data_type = st.selectbox(
+                    "📊 データタイプ:",
+                    options=['actual', 'forecast'],
+                    format_func=lambda x: "📈 実績値" if x == "actual" else "🔮 予測値"
+                )
+            with col2:
+                st.info(f"📅 表示期間: {min(recent_years)}年 - {max(recent_years)}年")
+            
+            # 直近2年の月範囲（パネルの月軸上のスライス）
+            country_panel = get_monthly_panel(get_data_version(), data_type, importance_key)
+            recent_months = country_panel.month_range(f"{min(recent_years)}-01", f"{max(recent_years)}-12")
+            
+            if recent_months.stop > recent_months.start:
+                
+                # 経済指標の日本語変換マッピング
+                indicator_japanese = {
+                    'Unemployment Rate': '失業率',
+                    'Employment Rate': '雇用率', 
+                    'Initial Jobless Claims': '新規失業保険申請件数',
+                    'Continuing Jobless Claims': '継続失業保険申請件数',
+                    'CPI (YoY)': '消費者物価指数(前年比)',
+                    'CPI (MoM)': '消費者物価指数(前月比)',
+                    'Core CPI (YoY)': 'コア消費者物価指数(前年比)',
+                    'Core CPI (MoM)': 'コア消費者物価指数(前月比)',
+                    'National CPI (YoY)': '全国消費者物価指数(前年比)',
+                    'National CPI (MoM)': '全国消費者物価指数(前月比)',
+                    'Tokyo CPI (YoY)': '東京消費者物価指数(前年比)',
+                    'Tokyo CPI (MoM)': '東京消費者物価指数(前月比)',
+                    'PPI (YoY)': '生産者物価指数(前年比)',
+                    'PPI (MoM)': '生産者物価指数(前月比)',
+                    'GDP (QoQ)': 'GDP(前期比)',
+                    'GDP (YoY)': 'GDP(前年比)',
+                    'Current Account': '経常収支',
+                    'Trade Balance': '貿易収支',
+                    'PMI Manufacturing': '製造業PMI',
+                    'PMI Services': 'サービス業PMI',
+                    'Industrial Production (YoY)': '鉱工業生産指数(前年比)',
+                    'Industrial Production (MoM)': '鉱工業生産指数(前月比)',
+                    'Factory Orders': '工場受注',
+                    'Building Permits': '建設許可件数',
+                    'Housing Starts': '住宅着工件数',
+                    'Interest Rate': '政策金利',
+                    'Retail Sales (YoY)': '小売売上高(前年比)',
+                    'Retail Sales (MoM)': '小売売上高(前月比)',
+                    'Housing Prices (YoY)': '住宅価格指数(前年比)',
+                    'Housing Prices (MoM)': '住宅価格指数(前月比)',
+                    'Consumer Confidence': '消費者信頼感指数'
+                }
+                
+                # 経済指標をカテゴリ別に分類
+                indicator_categories = {
+                    '👥 雇用関連': ['Unemployment Rate', 'Employment Rate', 'Initial Jobless Claims', 'Continuing Jobless Claims'],
+                    '💰 物価関連': ['CPI (YoY)', 'CPI (MoM)', 'Core CPI (YoY)', 'Core CPI (MoM)', 'National CPI (YoY)', 'National CPI (MoM)', 'Tokyo CPI (YoY)', 'Tokyo CPI (MoM)', 'PPI (YoY)', 'PPI (MoM)'],
+                    '📈 景気関連': ['GDP (QoQ)', 'GDP (YoY)', 'Current Account', 'Trade Balance', 'PMI Manufacturing', 'PMI Services'],
+                    '🏭 製造業関連': ['Industrial Production (YoY)', 'Industrial Production (MoM)', 'Factory Orders', 'Building Permits', 'Housing Starts'],
+                    '🏦 政策金利': ['Interest Rate'],
+                    '🛒 消費関連': ['Retail Sales (YoY)', 'Retail Sales (MoM)', 'Housing Prices (YoY)', 'Housing Prices (MoM)', 'Consumer Confidence']
+                }
+                
+                # 全指標リスト
+                all_major_indicators = []
+                for indicators in indicator_categories.values():
+                    all_major_indicators.extend(indicators)
+                
+                # 主要指標のうち表示対象のもの
+                tag_scope_set = set(tag_scope)
+                major_indicators = [ind for ind in all_major_indicators if ind in tag_scope_set]
+                
+                if major_indicators:
+                    # 月 × 指標 のテーブルをパネルのスライスとして取得（各月の最新の値）
+                    try:
+                        pivot_table = country_panel.currency_frame(selected_country, major_indicators, recent_months)
+                        pivot_table.index = pivot_table.index.strftime('%Y年%m月')
+                        
+                        # 年月順に並び替え
+                        all_periods = sorted(pivot_table.index)
+                        
+                        # データが存在する指標のみ表示
+                        available_indicators = [col for col in pivot_table.columns if not pivot_table[col].isna().all()]
+                        
+                        if available_indicators:
+                            st.subheader(f"{country_mapping.get(selected_country, selected_country)} - 直近2年間 経済指標一覧")
+                            
+                            # 統計情報表示
+                            col1, col2, col3 = st.columns(3)
+                            with col1:
+                                st.metric("📊 指標数", len(available_indicators))
+                            with col2:
+                                st.metric("📅 データ期間", f"{min(recent_years)}-{max(recent_years)}年")
+                            with col3:
+                                total_data_points = pivot_table[available_indicators].notna().sum().sum()
+                                st.metric("📈 データポイント", total_data_points)
+                            
+                            # 縦軸にカテゴリ・指標、横軸に月のテーブル作成
+                            structured_data = []
+                            
+                            for category_name, indicators in indicator_categories.items():
+                                # そのカテゴリの指標で利用可能なもの
+                                category_indicators = [ind for ind in indicators if ind in available_indicators]
+                                
+                                if category_indicators:
+                                    # カテゴリヘッダー行を追加
+                                    category_row = {'ジャンル': category_name, '指標名': ''}
+                                    for month in pivot_table.index:
+                                        category_row[month] = ''
+                                    structured_data.append(category_row)
+                                    
+                                    # 各指標の行を追加
+                                    for indicator in category_indicators:
+                                        # 日本語名を取得、なければ英語名をそのまま使用
+                                        japanese_name = indicator_japanese.get(indicator, indicator)
+                                        indicator_row = {'ジャンル': '', '指標名': japanese_name}
+                                        for month in pivot_table.index:
+                                            value = pivot_table.loc[month, indicator] if month in pivot_table.index else None
+                                            if pd.notna(value) and isinstance(value, (int, float)):
+                                                indicator_row[month] = f"{value:.2f}"
+                                            else:
+                                                indicator_row[month] = "--"
+                                        structured_data.append(indicator_row)
+                            
+                            # DataFrameに変換
+                            if structured_data:
+                                structured_df = pd.DataFrame(structured_data)
+                                
+                                # インデックスを設定
+                                structured_df = structured_df.set_index(['ジャンル', '指標名'])
+                                
+                                # 数値データの変化に基づいてスタイリング関数を定義
+                                def color_changes(val):
+                                    if val == "--" or val == "":
+                                        return 'background-color: #f0f0f0'  # グレー（データなし）
+                                    return ''
+                                
+                                def highlight_dataframe(df):
+                                    # 各行（指標）について前月比での色分け
+                                    styled_df = df.copy()
+                                    
+                                    for idx in df.index:
+                                        if df.loc[idx].name[1] != '':  # 指標名が空でない行のみ処理
+                                            row_values = []
+                                            for col in df.columns:
+                                                val = df.loc[idx, col]
+                                                if val != "--" and val != "":
+                                                    try:
+                                                        row_values.append((col, float(val)))
+                                                    except:
+                                                        row_values.append((col, None))
+                                                else:
+                                                    row_values.append((col, None))
+                                            
+                                            # 前月比での色分け
+                                            for i, (col, current_val) in enumerate(row_values):
+                                                if current_val is not None and i > 0:
+                                                    prev_val = row_values[i-1][1]
+                                                    if prev_val is not None:
+                                                        if current_val > prev_val:
+                                                            styled_df.loc[idx, col] = f'<span style="background-color: rgba(255, 200, 200, 0.5)">{df.loc[idx, col]}</span>'
+                                                        elif current_val < prev_val:
+                                                            styled_df.loc[idx, col] = f'<span style="background-color: rgba(200, 255, 200, 0.5)">{df.loc[idx, col]}</span>'
+                                                        else:
+                                                            styled_df.loc[idx, col] = f'<span style="background-color: rgba(240, 240, 240, 0.5)">{df.loc[idx, col]}</span>'
+                                    
+                                    return styled_df
+                                
+                                # スタイル適用
+                                try:
+                                    def style_row(row):
+                                        styles = []
+                                        for i in range(len(row)):
+                                            if row.iloc[i] == '--' or row.iloc[i] == '':
+                                                styles.append('background-color: rgba(240, 240, 240, 0.3)')
+                                            else:
+                                                try:
+                                                    current_val = float(row.iloc[i])
+                                                    
+                                                    # 前の有効な値を遡って検索
+                                                    prev_val = None
+                                                    for j in range(i-1, -1, -1):
+                                                        if row.iloc[j] != '--' and row.iloc[j] != '':
+                                                            try:
+                                                                prev_val = float(row.iloc[j])
+                                                                break
+                                                            except:
+                                                                continue
+                                                    
+                                                    if prev_val is not None:
+                                                        if current_val > prev_val:
+                                                            styles.append('background-color: rgba(255, 200, 200, 0.3)')
+                                                        elif current_val < prev_val:
+                                                            styles.append('background-color: rgba(200, 255, 200, 0.3)')
+                                                        else:
+                                                            styles.append('background-color: rgba(255, 255, 200, 0.3)')
+                                                    else:
+                                                        styles.append('')  # 比較対象がない場合
+                                                except:
+                                                    styles.append('')
+                                        return styles
+                                    
+                                    styled_df = structured_df.style.apply(style_row, axis=1)
+                                    
+                                    st.dataframe(
+                                        styled_df,
+                                        use_container_width=True,
+                                        height=min(600, len(structured_df) * 35 + 100)
+                                    )
+                                except:
+                                    # スタイリングに失敗した場合は通常のDataFrameを表示
+                                    st.dataframe(
+                                        structured_df,
+                                        use_container_width=True,
+                                        height=min(600, len(structured_df) * 35 + 100)
+                                    )
+                                
+                                # 凡例を追加
+                                st.markdown("""
+                                **📊 色分け凡例:**
+                                - 🔴 **薄い赤**: 前月より増加
+                                - 🟢 **薄い緑**: 前月より減少  
+                                - ⚫ **グレー**: データなし
+                                """)
+                            
+                            # 注意書き
+                            st.info("""
+                            📌 **注意事項**
+                            - データは investpy から取得した実際の経済指標です
+                            - "--" は該当月にデータが発表されていないことを示します
+                            - 数値の単位は指標により異なります（%、数値など）
+                            - 将来の投資判断の参考としてご利用ください
+                            """)
+                            
+                        else:
+                            st.warning(f"{selected_year}年の主要経済指標データが見つかりません")
+                    except Exception as e:
+                        st.error(f"データ処理エラー: {e}")
+                else:
+                    st.warning(f"{selected_year}年の主要経済指標データがありません")
+            else:
+                st.warning(f"{selected_year}年のデータがありません")
+        else:
+            st.warning(f"{country_mapping.get(selected_country, selected_country)}のデータがありません")
+
 def main():
     # メインタイトル
     st.markdown('<h1 class="main-header">📊 Economic Data Dashboard</h1>', unsafe_allow_html=True)
     
     # データ更新チェック
     update_data_file()
+    # この実行で参照するデータの版を固定（実行中に更新されても途中で切り替わらない）
+    pin_data_version()
     
-    # データロード
+    # データロード（系列インデックスとサプライズ分析列はデータバージョンごとにキャッシュ）
     with st.spinner('📥 データを読み込み中...'):
-        df = load_data()
+        series_index = get_series_index(get_data_version())
+        df = series_index.df
+        search_index = get_indicator_search_index(get_data_version())
     
     if df.empty:
         st.error("❌ データの読み込みに失敗しました")
         return
     
     # 5通貨フルカバレッジ指標の情報
-    full_coverage_indicators, all_currencies = get_indicators_in_all_currencies(df)
+    full_coverage_indicators, all_currencies = get_indicators_in_all_currencies(
+        get_monthly_panel(get_data_version(), 'actual')
+    )
     
     # データ統計（豊富な情報表示）
     col1, col2, col3, col4, col5, col6 = st.columns(6)
@@ -1309,15 +2179,18 @@ def main():
     with col2:
         st.metric("🏛️ 通貨数", len(df['currency'].unique()))
     with col3:
-        st.metric("📊 経済指標数", len([tag for tag in df['data_tag'].unique() if tag != "None"]))
+        st.metric("📊 経済指標数", len(search_index))
     with col4:
         st.metric("🌐 全通貨指標", len(full_coverage_indicators))
     with col5:
         st.metric("📅 データ期間", f"{df['date'].min().year} - {df['date'].max().year}")
     with col6:
-        # ファイル更新時刻を表示
+        # 参照中のスナップショットの公開時刻を表示（SQLite保存時は統合ファイルの更新時刻）
         data_file = "./data/economic_data.csv"
-        if os.path.exists(data_file):
+        if STORAGE_ENGINE != 'sqlite' and get_data_version() is not None:
+            file_time = datetime.fromtimestamp(SnapshotStore.published_at(get_data_version()))
+            st.metric("🔄 ファイル更新", f"{file_time.strftime('%m-%d %H:%M')}")
+        elif os.path.exists(data_file):
             file_time = datetime.fromtimestamp(os.path.getmtime(data_file))
             st.metric("🔄 ファイル更新", f"{file_time.strftime('%m-%d %H:%M')}")
         else:
@@ -1341,13 +2214,20 @@ def main():
     
     # 利用可能な指標の一覧表示
     with st.expander("📋 利用可能な経済指標一覧"):
-        indicators = sorted([tag for tag in df['data_tag'].unique() if tag != "None"])
-        indicator_counts = df[df['data_tag'] != "None"]['data_tag'].value_counts()
+        list_query = st.text_input("🔍 指標を検索:", key="indicator_list_query", placeholder="例: cpi, unemp, pmi manu")
+        indicators = search_index.search(list_query)
+        indicator_counts = search_index.tag_counts()
         
-        cols = st.columns(3)
-        for i, indicator in enumerate(indicators):
-            with cols[i % 3]:
-                st.write(f"• **{indicator}**: {indicator_counts.get(indicator, 0):,} records")
+        if indicators:
+            # 列ごとに1つのMarkdownとしてまとめて表示
+            cols = st.columns(3)
+            for i, col in enumerate(cols):
+                with col:
+                    st.markdown("\n".join(
+                        f"- **{indicator}**: {indicator_counts.get(indicator, 0):,} records" for indicator in indicators[i::3]
+                    ))
+        else:
+            st.info("該当する指標がありません")
     
     # データ処理に関する説明
     with st.expander("🔧 データ処理について"):
@@ -1413,6 +2293,10 @@ def main():
                 if len(info['indicators']) > 5:
                     st.write(f"  • ... 他{len(info['indicators']) - 5}種類")
     
+    # 一括エクスポート
+    with st.expander("📦 データ一括エクスポート"):
+        show_export_panel(series_index, search_index)
+    
     st.markdown("---")
     
     # サイドバー
@@ -1421,35 +2305,60 @@ def main():
     # データ更新ボタン
     if st.sidebar.button("🔄 最新データ取得", help="最新の経済データを手動で取得します"):
         with st.spinner("🔄 最新データを取得中..."):
-            # キャッシュをクリアして強制更新
-            load_data.clear()
-            # ファイルのタイムスタンプを古くして強制更新
-            data_file = "./data/economic_data.csv"
-            if os.path.exists(data_file):
-                old_time = time.time() - (7 * 60 * 60)  # 7時間前に設定
-                os.utime(data_file, (old_time, old_time))
             update_data_file()
+            # どのセッションも参照していないデータバージョンの全件読み込み結果のみ破棄
+            CACHE_REGISTRY.invalidate('load_data', where=superseded_version_filter())
             st.rerun()  # ページをリフレッシュ
     
     # タブ選択
     analysis_type = st.sidebar.radio(
         "📈 分析タイプを選択:",
-        ["🏛️ 通貨別分析", "📊 指標別比較", "📅 経済指標カレンダー", "🌏 国別経済指標一覧"],
+        ["🏛️ 通貨別分析", "📊 指標別比較", "🔗 相関分析", "📅 経済指標カレンダー", "🌏 国別経済指標一覧"],
         index=0
     )
     
     # データタイプ選択
     value_type = st.sidebar.selectbox(
         "📊 データタイプ:",
-        ["forecast", "actual"],
-        format_func=lambda x: "🔮 予測値 (Forecast)" if x == "forecast" else "📈 実際値 (Actual)"
+        ["forecast", "actual", "surprise"],
+        format_func=lambda x: {
+            "forecast": "🔮 予測値 (Forecast)",
+            "actual": "📈 実際値 (Actual)",
+            "surprise": "⚡ サプライズ (Actual − Forecast)"
+        }.get(x, x)
     )
     
+    # 派生系列のオーバーレイ選択（通貨別・指標別チャートで使用）
+    overlay_transforms = []
+    if analysis_type in ["🏛️ 通貨別分析", "📊 指標別比較"]:
+        overlay_transforms = st.sidebar.multiselect(
+            "📐 派生系列オーバーレイ:",
+            list(SERIES_TRANSFORMS),
+            format_func=lambda x: SERIES_TRANSFORMS[x]['label'],
+            help="移動平均・差分・変化率などを各系列に重ねて表示します（右軸は差分・変化率）"
+        )
+    overlays = get_series_transforms(get_data_version(), value_type)[overlay_transforms] if overlay_transforms else None
+    overlay_key = tuple(overlay_transforms)
+    
+    # 速報値・最新改定値のオーバーレイ（実際値のみ、改定履歴ログから作成）
+    if analysis_type in ["🏛️ 通貨別分析", "📊 指標別比較"] and value_type == "actual":
+        show_revisions = st.sidebar.checkbox(
+            "📜 速報値と最新改定値を重ねる",
+            value=False,
+            help="改定履歴ログに最初に記録された実際値（速報値）と、次回発表の前回値で示された最新の改定値を表示します"
+        )
+        if show_revisions:
+            revision_log_version = get_revision_log().version()
+            revisions = get_revision_series(get_data_version(), revision_log_version)
+            overlays = revisions if overlays is None else pd.concat([overlays, revisions], axis=1)
+            overlay_key += tuple(REVISION_SERIES) + (revision_log_version,)
+    
     # 重要度フィルター
     st.sidebar.markdown("---")
     st.sidebar.subheader("🎯 重要度フィルター")
     
     # 利用可能な重要度を取得
+    importance_filter = None
     available_importance = sorted([str(i) for i in df['importance'].dropna().unique()]) if 'importance' in df.columns else []
     
     if available_importance:
@@ -1470,12 +2379,14 @@ def main():
         
         # 重要度でフィルター
         if selected_importance:
-            df = df[df['importance'].isin(selected_importance)]
+            importance_filter = selected_importance
         else:
             st.sidebar.warning("⚠️ 重要度を少なくとも1つ選択してください")
-            df = df[df['importance'].isin(available_importance)]  # 全て表示
+            importance_filter = available_importance  # 全て表示
+        df = df[df['importance'].isin(importance_filter)]
     else:
         st.sidebar.info("📊 重要度情報が利用できません")
+    importance_key = tuple(importance_filter) if importance_filter else None
     
     # 5通貨フィルター
     st.sidebar.markdown("---")
@@ -1488,6 +2399,7 @@ def main():
     )
     
     # フィルターを適用
+    coverage_tags = full_coverage_indicators if show_full_coverage_only else None
     if show_full_coverage_only:
         df = df[df['data_tag'].isin(full_coverage_indicators)]
     
@@ -1503,17 +2415,19 @@ def main():
         st.subheader(f"🏛️ {selected_currency} Economic Analysis")
         
         # 通貨の詳細情報
-        currency_data = df[df['currency'] == selected_currency]
-        currency_indicators = sorted([str(tag) for tag in currency_data['data_tag'].dropna().unique() if str(tag) != "None"])
+        currency_indicators = search_index.search(
+            currencies=[selected_currency], importance=importance_filter, tags=coverage_tags
+        )
+        currency_counts = search_index.tag_counts(currencies=[selected_currency], importance=importance_filter)
         
         col1, col2 = st.columns(2)
         with col1:
             st.info(f"📊 **利用可能な指標**: {len(currency_indicators)}")
         with col2:
-            st.info(f"📅 **データ件数**: {len(currency_data[currency_data['data_tag'] != 'None']):,}")
+            st.info(f"📅 **データ件数**: {sum(currency_counts[tag] for tag in currency_indicators):,}")
         
         # チャート作成
-        charts = create_currency_chart(df, selected_currency, value_type)
+        charts = create_currency_chart(df, selected_currency, value_type, overlays)
         if charts:
             # 単位分析結果を表示
             if len(charts) > 1:
@@ -1521,109 +2435,69 @@ def main():
             else:
                 st.info(f"📊 **統一スケール**: {charts[0]['unit_label']}")
             
-            # タブまたはエキスパンダーで複数チャートを表示
+            def scale_group_figure(chart_info):
+                # 表示するグループのチャートのみ作成（表示条件ごとにキャッシュ）
+                return get_scale_group_figure(
+                    get_data_version(), selected_currency, value_type, overlay_key, importance_key,
+                    show_full_coverage_only, tuple(chart_info['indicators']), chart_info['build']
+                )
+            
+            # 複数チャートはタブ風の切り替えで、選択中のグループのみ表示
             if len(charts) > 1:
-                # タブで表示
                 tab_names = [f"{chart['unit_label']} ({len(chart['indicators'])}指標)" for chart in charts]
-                tabs = st.tabs(tab_names)
+                selected_tab = st.segmented_control(
+                    "📏 スケールグループ:",
+                    options=list(range(len(charts))),
+                    format_func=lambda i: tab_names[i],
+                    default=0,
+                    key=f"scale_group_{selected_currency}"
+                )
+                chart_info = charts[selected_tab if selected_tab is not None and selected_tab < len(charts) else 0]
                 
-                for tab, chart_info in zip(tabs, charts):
-                    with tab:
-                        # 各タブ内に指標リストを表示
-                        with st.expander("📊 含まれる指標", expanded=False):
-                            indicators_text = "、".join(chart_info['indicators'])
-                            st.write(indicators_text)
-                        
-                        # チャートを表示
-                        st.plotly_chart(chart_info['figure'], use_container_width=True)
+                # 指標リストを表示
+                with st.expander("📊 含まれる指標", expanded=False):
+                    indicators_text = "、".join(chart_info['indicators'])
+                    st.write(indicators_text)
+                
+                # チャートを表示
+                st.plotly_chart(scale_group_figure(chart_info), use_container_width=True)
             else:
                 # 単一チャートの場合はそのまま表示
-                st.plotly_chart(charts[0]['figure'], use_container_width=True)
+                st.plotly_chart(scale_group_figure(charts[0]), use_container_width=True)
             
-            # データテーブル（デフォルトで表示）
-            st.subheader("📋 データテーブル")
-            table_data = df[(df['currency'] == selected_currency) & (df['data_tag'] != "None")]
-            if not table_data.empty:
-                # フィルター機能
-                selected_indicators = st.multiselect(
-                    "表示する指標を選択:",
-                    currency_indicators,
-                    default=currency_indicators[:5]  # デフォルトで5つ表示
-                )
-                
-                if selected_indicators:
-                    filtered_table = table_data[table_data['data_tag'].isin(selected_indicators)]
-                    # 最新50件のデータを表示
-                    recent_data = filtered_table.sort_values('date', ascending=False).head(50)
-                    
-                    # 重要度カラムを含める
-                    display_columns = ['date', 'importance', 'event', 'data_tag', 'actual', 'forecast', 'previous']
-                    available_columns = [col for col in display_columns if col in recent_data.columns]
-                    
-                    st.dataframe(
-                        recent_data[available_columns],
-                        use_container_width=True,
-                        height=500
-                    )
-                    
-                    # 追加のデータ詳細を展開可能セクションで
-                    with st.expander("🔍 詳細フィルターとデータ"):
-                        # 日付フィルター
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            start_date = st.date_input(
-                                "開始日",
-                                value=filtered_table['date'].min().date() if not filtered_table.empty else None
-                            )
-                        with col2:
-                            end_date = st.date_input(
-                                "終了日", 
-                                value=filtered_table['date'].max().date() if not filtered_table.empty else None
-                            )
-                        
-                        # 日付でフィルター
-                        if start_date and end_date:
-                            date_filtered = filtered_table[
-                                (filtered_table['date'].dt.date >= start_date) & 
-                                (filtered_table['date'].dt.date <= end_date)
-                            ]
-                            
-                            st.write(f"📅 期間内のデータ: {len(date_filtered)}件")
-                            if not date_filtered.empty:
-                                # 重要度カラムを含める
-                                detail_columns = ['date', 'importance', 'event', 'data_tag', 'actual', 'forecast', 'previous']
-                                available_detail_columns = [col for col in detail_columns if col in date_filtered.columns]
-                                
-                                st.dataframe(
-                                    date_filtered[available_detail_columns].sort_values('date', ascending=False),
-                                    use_container_width=True,
-                                    height=400
-                                )
-                else:
-                    st.info("指標を選択してデータを表示してください")
-            else:
-                st.warning(f"{selected_currency}のデータがありません")
+            # データテーブル（デフォルトで表示、チャートとは独立して再実行）
+            show_currency_table(series_index, selected_currency, currency_indicators, importance_filter)
     
     elif analysis_type == "📊 指標別比較":  # 指標別比較
-        # 指標選択
-        indicators = sorted([tag for tag in df['data_tag'].unique() if tag != "None"])
+        # 指標選択（検索語で絞り込み、関連度順に表示）
+        indicator_query = st.sidebar.text_input("🔍 指標を検索:", key="indicator_query", placeholder="例: cpi, unemp, pmi manu")
+        indicators = search_index.search(indicator_query, importance=importance_filter, tags=coverage_tags)
+        if not indicators:
+            st.sidebar.warning("⚠️ 該当する指標がないため全ての指標を表示します")
+            indicators = search_index.search(importance=importance_filter, tags=coverage_tags)
+        if not indicators:
+            st.warning("表示できる指標がありません")
+            return
         selected_indicator = st.sidebar.selectbox(
             "📊 経済指標を選択:",
             indicators,
-            index=indicators.index('CPI') if 'CPI' in indicators else 0
+            index=indicators.index('CPI') if 'CPI' in indicators and not indicator_query else 0
         )
         
         st.subheader(f"📊 {selected_indicator} Cross-Currency Comparison")
         
-        # 指標の詳細情報
+        # 指標の詳細情報（対象通貨・件数は月次パネルの発表件数から取得）
         indicator_data = df[df['data_tag'] == selected_indicator]
-        indicator_currencies = sorted([str(c) for c in indicator_data['currency'].dropna().unique()])
+        presence_panel = get_monthly_panel(get_data_version(), 'actual', importance_key)
+        indicator_currencies = presence_panel.currencies_for_tag(selected_indicator)
+        tag_pos = presence_panel.tag_position(selected_indicator)
+        indicator_count = int(presence_panel.counts[:, tag_pos, :].sum()) if tag_pos is not None else 0
         
         col1, col2, col3 = st.columns(3)
         with col1:
             st.info(f"🏛️ **対象通貨**: {len(indicator_currencies)}")
         with col2:
-            st.info(f"📅 **データ件数**: {len(indicator_data):,}")
+            st.info(f"📅 **データ件数**: {indicator_count:,}")
         with col3:
             # 指標の単位情報を表示
             if not indicator_data.empty and value_type in indicator_data.columns:
@@ -1632,492 +2506,97 @@ def main():
                 st.info(f"📏 **単位**: {unit_label}")
         
         # チャート作成
-        fig = create_indicator_chart(df, selected_indicator, value_type)
+        fig = create_indicator_chart(df, selected_indicator, value_type, overlays)
         if fig:
             st.plotly_chart(fig, use_container_width=True)
             
-            # データテーブル（デフォルトで表示）
-            st.subheader("📋 データテーブル")
-            table_data = df[df['data_tag'] == selected_indicator]
-            if not table_data.empty:
-                # 通貨フィルター
-                selected_currencies = st.multiselect(
-                    "表示する通貨を選択:",
-                    indicator_currencies,
-                    default=indicator_currencies[:5]  # デフォルトで5つ表示
-                )
-                
-                if selected_currencies:
-                    filtered_table = table_data[table_data['currency'].isin(selected_currencies)]
-                    # 最新50件のデータを表示
-                    recent_data = filtered_table.sort_values('date', ascending=False).head(50)
-                    
-                    # 重要度カラムを含める
-                    display_columns_indicator = ['date', 'currency', 'importance', 'event', 'actual', 'forecast', 'previous']
-                    available_columns_indicator = [col for col in display_columns_indicator if col in recent_data.columns]
-                    
-                    st.dataframe(
-                        recent_data[available_columns_indicator],
-                        use_container_width=True,
-                        height=500
-                    )
-                    
-                    # 追加のデータ詳細を展開可能セクションで
-                    with st.expander("🔍 詳細フィルターとデータ"):
-                        # 日付フィルター
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            start_date = st.date_input(
-                                "開始日",
-                                value=filtered_table['date'].min().date() if not filtered_table.empty else None,
-                                key="indicator_start_date"
-                            )
-                        with col2:
-                            end_date = st.date_input(
-                                "終了日", 
-                                value=filtered_table['date'].max().date() if not filtered_table.empty else None,
-                                key="indicator_end_date"
-                            )
-                        
-                        # 日付でフィルター
-                        if start_date and end_date:
-                            date_filtered = filtered_table[
-                                (filtered_table['date'].dt.date >= start_date) & 
-                                (filtered_table['date'].dt.date <= end_date)
-                            ]
-                            
-                            st.write(f"📅 期間内のデータ: {len(date_filtered)}件")
-                            if not date_filtered.empty:
-                                # 重要度カラムを含める
-                                detail_columns_indicator = ['date', 'currency', 'importance', 'event', 'actual', 'forecast', 'previous']
-                                available_detail_indicator = [col for col in detail_columns_indicator if col in date_filtered.columns]
-                                
-                                st.dataframe(
-                                    date_filtered[available_detail_indicator].sort_values('date', ascending=False),
-                                    use_container_width=True,
-                                    height=400
-                                )
-                else:
-                    st.info("通貨を選択してデータを表示してください")
-            else:
-                st.warning(f"{selected_indicator}のデータがありません")
+            # データテーブル（デフォルトで表示、チャートとは独立して再実行）
+            show_indicator_table(series_index, selected_indicator, indicator_currencies, importance_filter)
     
-    elif analysis_type == "📅 経済指標カレンダー":
-        # 経済指標カレンダー機能
-        st.subheader("📅 経済指標カレンダー")
+    elif analysis_type == "🔗 相関分析":
+        # 指標間の相関（通貨内・通貨間、ラグ付き）
+        st.subheader("🔗 経済指標の相関分析")
         
-        # 日付範囲選択
-        col1, col2 = st.columns(2)
-        with col1:
-            start_date = st.date_input(
-                "開始日",
-                value=datetime.now() - timedelta(days=7),
-                help="表示する開始日を選択"
-            )
-        with col2:
-            end_date = st.date_input(
-                "終了日", 
-                value=datetime.now() + timedelta(days=30),  # 1ヶ月先まで
-                help="表示する終了日を選択"
-            )
-        
-        # 重要度フィルター（通貨フィルターは削除）
-        selected_importance = st.multiselect(
-            "⭐ 重要度を選択:",
-            options=['High', 'Medium', 'Low'],
-            default=['High', 'Medium'],
-            help="表示する重要度を選択"
-        )
-        
-        if selected_importance and start_date <= end_date:
-            # 直接investpyからカレンダーデータを取得
-            try:
-                with st.spinner("📅 カレンダーデータを取得中..."):
-                    from_date = start_date.strftime('%d/%m/%Y')
-                    to_date = end_date.strftime('%d/%m/%Y')
-                    
-                    calendar_data = investpy.economic_calendar(
-                        time_zone=None,
-                        countries=['united states', 'euro zone', 'united kingdom', 'japan', 'australia'],
-                        from_date=from_date,
-                        to_date=to_date
-                    )
-                    
-                    if not calendar_data.empty:
-                        # データの内容をデバッグ表示
-                        st.info(f"📊 取得データ: {len(calendar_data)}件")
-                        if 'importance' in calendar_data.columns:
-                            importance_counts = calendar_data['importance'].value_counts()
-                            st.info(f"重要度別件数: {dict(importance_counts)}")
-                        
-                        # 通貨マッピング
-                        currency_mapping = {
-                            'united states': 'USD',
-                            'euro zone': 'EUR', 
-                            'united kingdom': 'GBP',
-                            'japan': 'JPY',
-                            'australia': 'AUD'
-                        }
-                        
-                        # zone列をcurrencyに変換
-                        if 'zone' in calendar_data.columns:
-                            calendar_data['currency_display'] = calendar_data['zone'].map(currency_mapping).fillna(calendar_data['zone'])
-                        else:
-                            calendar_data['currency_display'] = calendar_data.get('currency', 'Unknown')
-                        
-                        # 重要度でフィルター（大文字小文字を統一）
-                        if 'importance' in calendar_data.columns:
-                            # 重要度の値を正規化
-                            calendar_data['importance_normalized'] = calendar_data['importance'].str.strip().str.title()
-                            selected_importance_normalized = [imp.strip().title() for imp in selected_importance]
-                            calendar_filtered = calendar_data[calendar_data['importance_normalized'].isin(selected_importance_normalized)].copy()
-                        else:
-                            st.warning("重要度列が見つかりません")
-                            calendar_filtered = calendar_data.copy()
-                        
-                        if not calendar_filtered.empty:
-                            st.info(f"🎯 フィルター後: {len(calendar_filtered)}件")
-                            
-                            # 重要度による色分け
-                            importance_colors = {
-                                'High': '🔴',
-                                'Medium': '🟡', 
-                                'Low': '🟢'
-                            }
-                            
-                            # 日付変換
-                            calendar_filtered['date_parsed'] = pd.to_datetime(calendar_filtered['date'], dayfirst=True, errors='coerce')
-                            calendar_filtered = calendar_filtered.dropna(subset=['date_parsed'])
-                            calendar_filtered['date_str'] = calendar_filtered['date_parsed'].dt.strftime('%Y-%m-%d')
-                            
-                            # 日付ごとにグループ化
-                            grouped = calendar_filtered.groupby('date_str')
-                            
-                            for date_str, group in grouped:
-                                with st.expander(f"📅 {date_str} ({len(group)}件)", expanded=True):
-                                    # 重要度順にソート
-                                    importance_order = {'High': 0, 'Medium': 1, 'Low': 2}
-                                    group['importance_rank'] = group['importance'].map(importance_order).fillna(3)
-                                    group_sorted = group.sort_values(['importance_rank', 'time'])
-                                    
-                                    for _, row in group_sorted.iterrows():
-                                        # 正規化された重要度を使用
-                                        importance_display = row.get('importance_normalized', row.get('importance', ''))
-                                        importance_icon = importance_colors.get(importance_display, '⚪')
-                                        
-                                        # 時間情報を取得
-                                        time_info = row.get('time', '')
-                                        if pd.notna(time_info) and str(time_info) != '':
-                                            time_display = f"⏰ {time_info}"
-                                        else:
-                                            time_display = ""
-                                        
-                                        col1, col2, col3, col4, col5 = st.columns([1, 1, 1, 4, 2])
-                                        with col1:
-                                            st.write(f"{importance_icon}")
-                                        with col2:
-                                            st.write(f"**{row['currency_display']}**")
-                                        with col3:
-                                            st.write(time_display)
-                                        with col4:
-                                            st.write(f"{row['event']}")
-                                        with col5:
-                                            if pd.notna(row.get('actual')) and str(row.get('actual')) != '':
-                                                st.write(f"実績: **{row['actual']}**")
-                                            elif pd.notna(row.get('forecast')) and str(row.get('forecast')) != '':
-                                                st.write(f"予測: {row['forecast']}")
-                                            else:
-                                                st.write("--")
-                        else:
-                            st.info("選択された重要度のデータがありません")
-                    else:
-                        st.warning("指定期間にカレンダーデータがありません")
-                        
-            except Exception as e:
-                st.error(f"カレンダーデータ取得エラー: {e}")
+        correlation_currencies = list(get_monthly_panel(get_data_version(), value_type, importance_key).currencies)
+        if not correlation_currencies:
+            st.warning("相関分析に利用できるデータがありません")
         else:
-            st.warning("重要度を選択し、正しい日付範囲を設定してください")
-    
-    elif analysis_type == "🌏 国別経済指標一覧":
-        # 国別経済指標ヒストリカル一覧
-        st.subheader("🌏 国別経済指標ヒストリカル一覧")
-        
-        # 国選択
-        country_mapping = {
-            'USD': '🇺🇸 アメリカ',
-            'EUR': '🇪🇺 ユーロ圏', 
-            'GBP': '🇬🇧 イギリス',
-            'JPY': '🇯🇵 日本',
-            'AUD': '🇦🇺 オーストラリア'
-        }
-        
-        available_currencies = sorted([str(c) for c in df['currency'].dropna().unique()])
-        selected_country = st.selectbox(
-            "🏛️ 国を選択:",
-            options=available_currencies,
-            format_func=lambda x: country_mapping.get(x, x),
-            help="表示する国を選択してください"
-        )
-        
-        if selected_country:
-            # 選択された国のデータを取得
-            country_data = df[df['currency'] == selected_country].copy()
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                base_currency = st.selectbox(
+                    "🏛️ 基準通貨:",
+                    correlation_currencies,
+                    index=correlation_currencies.index('USD') if 'USD' in correlation_currencies else 0
+                )
+            with col2:
+                compare_currency = st.selectbox(
+                    "🏛️ 比較通貨:",
+                    correlation_currencies,
+                    index=correlation_currencies.index(base_currency),
+                    help="基準通貨と同じ通貨を選ぶと通貨内の指標間相関を表示します"
+                )
+            with col3:
+                lag = st.slider(
+                    "⏱️ ラグ（月）:",
+                    min_value=-CORRELATION_MAX_LAG,
+                    max_value=CORRELATION_MAX_LAG,
+                    value=0,
+                    help="正の値: 基準通貨の指標が比較通貨の指標に先行（基準の月tと比較の月t+ラグを比較）"
+                )
+            
+            correlation_tags = tuple(full_coverage_indicators) if show_full_coverage_only else None
+            corr = get_correlation_matrix(
+                get_data_version(), value_type, (base_currency, compare_currency), lag, importance_key, correlation_tags
+            )
             
-            if not country_data.empty:
-                # 直近2年分のデータを取得
-                country_data['year'] = pd.to_datetime(country_data['date']).dt.year
-                available_years = sorted(country_data['year'].dropna().unique(), reverse=True)
+            if corr.empty:
+                st.warning(f"相関を計算できる指標がありません（各指標に{CORRELATION_MIN_PERIODS}か月以上のデータが必要です）")
+            else:
+                st.info(f"📊 月次データ（各月の最新発表値）で計算しています。重複期間が{CORRELATION_MIN_PERIODS}か月未満のペアは空欄です。")
+                st.plotly_chart(create_correlation_heatmap(corr, base_currency, compare_currency, lag), use_container_width=True)
+                
+                # 相関の強いペア一覧
+                pairs = corr.stack().rename('相関').reset_index()
+                pairs.columns = [f'基準指標 ({base_currency})', f'比較指標 ({compare_currency})', '相関']
+                if base_currency == compare_currency and lag == 0:
+                    # 通貨内・ラグなしでは自己相関と重複ペアを除く
+                    pairs = pairs[pairs.iloc[:, 0] < pairs.iloc[:, 1]]
+                pairs = pairs.reindex(pairs['相関'].abs().sort_values(ascending=False).index).head(20)
                 
-                # 直近2年を自動選択
-                recent_years = available_years[:2] if len(available_years) >= 2 else available_years
+                with st.expander("📋 相関の強いペア（上位20）", expanded=True):
+                    st.dataframe(pairs.round(3), use_container_width=True, hide_index=True)
                 
+                # 先行・遅行の確認（選択したペアのラグごとの相関）
+                st.markdown("#### ⏱️ 先行・遅行の確認")
                 col1, col2 = st.columns(2)
                 with col1:
-                    # データタイプ選択（actualまたはforecast）
-                    data_type = st.selectbox(
-                        "📊 データタイプ:",
-                        options=['actual', 'forecast'],
-                        format_func=lambda x: "📈 実績値" if x == "actual" else "🔮 予測値"
-                    )
+                    lag_base_tag = st.selectbox(f"📈 基準指標 ({base_currency}):", list(corr.index), key="lag_base_tag")
                 with col2:
-                    st.info(f"📅 表示期間: {min(recent_years)}年 - {max(recent_years)}年")
-                
-                # 直近2年のデータを取得
-                year_data = country_data[country_data['year'].isin(recent_years)].copy()
+                    lag_compare_tag = st.selectbox(f"📉 比較指標 ({compare_currency}):", list(corr.columns), key="lag_compare_tag")
                 
-                if not year_data.empty:
-                    # 年月とイベントでピボットテーブル作成
-                    year_data['year_month'] = pd.to_datetime(year_data['date']).dt.strftime('%Y年%m月')
-                    
-                    # 経済指標の日本語変換マッピング
-                    indicator_japanese = {
-                        'Unemployment Rate': '失業率',
-                        'Employment Rate': '雇用率', 
-                        'Initial Jobless Claims': '新規失業保険申請件数',
-                        'Continuing Jobless Claims': '継続失業保険申請件数',
-                        'CPI (YoY)': '消費者物価指数(前年比)',
-                        'CPI (MoM)': '消費者物価指数(前月比)',
-                        'Core CPI (YoY)': 'コア消費者物価指数(前年比)',
-                        'Core CPI (MoM)': 'コア消費者物価指数(前月比)',
-                        'National CPI (YoY)': '全国消費者物価指数(前年比)',
-                        'National CPI (MoM)': '全国消費者物価指数(前月比)',
-                        'Tokyo CPI (YoY)': '東京消費者物価指数(前年比)',
-                        'Tokyo CPI (MoM)': '東京消費者物価指数(前月比)',
-                        'PPI (YoY)': '生産者物価指数(前年比)',
-                        'PPI (MoM)': '生産者物価指数(前月比)',
-                        'GDP (QoQ)': 'GDP(前期比)',
-                        'GDP (YoY)': 'GDP(前年比)',
-                        'Current Account': '経常収支',
-                        'Trade Balance': '貿易収支',
-                        'PMI Manufacturing': '製造業PMI',
-                        'PMI Services': 'サービス業PMI',
-                        'Industrial Production (YoY)': '鉱工業生産指数(前年比)',
-                        'Industrial Production (MoM)': '鉱工業生産指数(前月比)',
-                        'Factory Orders': '工場受注',
-                        'Building Permits': '建設許可件数',
-                        'Housing Starts': '住宅着工件数',
-                        'Interest Rate': '政策金利',
-                        'Retail Sales (YoY)': '小売売上高(前年比)',
-                        'Retail Sales (MoM)': '小売売上高(前月比)',
-                        'Housing Prices (YoY)': '住宅価格指数(前年比)',
-                        'Housing Prices (MoM)': '住宅価格指数(前月比)',
-                        'Consumer Confidence': '消費者信頼感指数'
-                    }
-                    
-                    # 経済指標をカテゴリ別に分類
-                    indicator_categories = {
-                        '👥 雇用関連': ['Unemployment Rate', 'Employment Rate', 'Initial Jobless Claims', 'Continuing Jobless Claims'],
-                        '💰 物価関連': ['CPI (YoY)', 'CPI (MoM)', 'Core CPI (YoY)', 'Core CPI (MoM)', 'National CPI (YoY)', 'National CPI (MoM)', 'Tokyo CPI (YoY)', 'Tokyo CPI (MoM)', 'PPI (YoY)', 'PPI (MoM)'],
-                        '📈 景気関連': ['GDP (QoQ)', 'GDP (YoY)', 'Current Account', 'Trade Balance', 'PMI Manufacturing', 'PMI Services'],
-                        '🏭 製造業関連': ['Industrial Production (YoY)', 'Industrial Production (MoM)', 'Factory Orders', 'Building Permits', 'Housing Starts'],
-                        '🏦 政策金利': ['Interest Rate'],
-                        '🛒 消費関連': ['Retail Sales (YoY)', 'Retail Sales (MoM)', 'Housing Prices (YoY)', 'Housing Prices (MoM)', 'Consumer Confidence']
-                    }
-                    
-                    # 全指標リスト
-                    all_major_indicators = []
-                    for indicators in indicator_categories.values():
-                        all_major_indicators.extend(indicators)
-                    
-                    # データタグが主要指標に含まれるデータを抽出
-                    filtered_data = year_data[year_data['data_tag'].isin(all_major_indicators)].copy()
-                    
-                    if not filtered_data.empty:
-                        # ピボットテーブル作成
-                        try:
-                            pivot_table = filtered_data.pivot_table(
-                                index='year_month',
-                                columns='data_tag',
-                                values=data_type,
-                                aggfunc='last'  # 最新の値を使用
-                            )
-                            
-                            # 年月順に並び替え
-                            all_periods = sorted(pivot_table.index)
-                            
-                            # データが存在する指標のみ表示
-                            available_indicators = [col for col in pivot_table.columns if not pivot_table[col].isna().all()]
-                            
-                            if available_indicators:
-                                st.subheader(f"{country_mapping.get(selected_country, selected_country)} - 直近2年間 経済指標一覧")
-                                
-                                # 統計情報表示
-                                col1, col2, col3 = st.columns(3)
-                                with col1:
-                                    st.metric("📊 指標数", len(available_indicators))
-                                with col2:
-                                    st.metric("📅 データ期間", f"{min(recent_years)}-{max(recent_years)}年")
-                                with col3:
-                                    total_data_points = pivot_table[available_indicators].notna().sum().sum()
-                                    st.metric("📈 データポイント", total_data_points)
-                                
-                                # 縦軸にカテゴリ・指標、横軸に月のテーブル作成
-                                structured_data = []
-                                
-                                for category_name, indicators in indicator_categories.items():
-                                    # そのカテゴリの指標で利用可能なもの
-                                    category_indicators = [ind for ind in indicators if ind in available_indicators]
-                                    
-                                    if category_indicators:
-                                        # カテゴリヘッダー行を追加
-                                        category_row = {'ジャンル': category_name, '指標名': ''}
-                                        for month in pivot_table.index:
-                                            category_row[month] = ''
-                                        structured_data.append(category_row)
-                                        
-                                        # 各指標の行を追加
-                                        for indicator in category_indicators:
-                                            # 日本語名を取得、なければ英語名をそのまま使用
-                                            japanese_name = indicator_japanese.get(indicator, indicator)
-                                            indicator_row = {'ジャンル': '', '指標名': japanese_name}
-                                            for month in pivot_table.index:
-                                                value = pivot_table.loc[month, indicator] if month in pivot_table.index else None
-                                                if pd.notna(value) and isinstance(value, (int, float)):
-                                                    indicator_row[month] = f"{value:.2f}"
-                                                else:
-                                                    indicator_row[month] = "--"
-                                            structured_data.append(indicator_row)
-                                
-                                # DataFrameに変換
-                                if structured_data:
-                                    structured_df = pd.DataFrame(structured_data)
-                                    
-                                    # インデックスを設定
-                                    structured_df = structured_df.set_index(['ジャンル', '指標名'])
-                                    
-                                    # 数値データの変化に基づいてスタイリング関数を定義
-                                    def color_changes(val):
-                                        if val == "--" or val == "":
-                                            return 'background-color: #f0f0f0'  # グレー（データなし）
-                                        return ''
-                                    
-                                    def highlight_dataframe(df):
-                                        # 各行（指標）について前月比での色分け
-                                        styled_df = df.copy()
-                                        
-                                        for idx in df.index:
-                                            if df.loc[idx].name[1] != '':  # 指標名が空でない行のみ処理
-                                                row_values = []
-                                                for col in df.columns:
-                                                    val = df.loc[idx, col]
-                                                    if val != "--" and val != "":
-                                                        try:
-                                                            row_values.append((col, float(val)))
-                                                        except:
-                                                            row_values.append((col, None))
-                                                    else:
-                                                        row_values.append((col, None))
-                                                
-                                                # 前月比での色分け
-                                                for i, (col, current_val) in enumerate(row_values):
-                                                    if current_val is not None and i > 0:
-                                                        prev_val = row_values[i-1][1]
-                                                        if prev_val is not None:
-                                                            if current_val > prev_val:
-                                                                styled_df.loc[idx, col] = f'<span style="background-color: rgba(255, 200, 200, 0.5)">{df.loc[idx, col]}</span>'
-                                                            elif current_val < prev_val:
-                                                                styled_df.loc[idx, col] = f'<span style="background-color: rgba(200, 255, 200, 0.5)">{df.loc[idx, col]}</span>'
-                                                            else:
-                                                                styled_df.loc[idx, col] = f'<span style="background-color: rgba(240, 240, 240, 0.5)">{df.loc[idx, col]}</span>'
-                                        
-                                        return styled_df
-                                    
-                                    # スタイル適用
-                                    try:
-                                        def style_row(row):
-                                            styles = []
-                                            for i in range(len(row)):
-                                                if row.iloc[i] == '--' or row.iloc[i] == '':
-                                                    styles.append('background-color: rgba(240, 240, 240, 0.3)')
-                                                else:
-                                                    try:
-                                                        current_val = float(row.iloc[i])
-                                                        
-                                                        # 前の有効な値を遡って検索
-                                                        prev_val = None
-                                                        for j in range(i-1, -1, -1):
-                                                            if row.iloc[j] != '--' and row.iloc[j] != '':
-                                                                try:
-                                                                    prev_val = float(row.iloc[j])
-                                                                    break
-                                                                except:
-                                                                    continue
-                                                        
-                                                        if prev_val is not None:
-                                                            if current_val > prev_val:
-                                                                styles.append('background-color: rgba(255, 200, 200, 0.3)')
-                                                            elif current_val < prev_val:
-                                                                styles.append('background-color: rgba(200, 255, 200, 0.3)')
-                                                            else:
-                                                                styles.append('background-color: rgba(255, 255, 200, 0.3)')
-                                                        else:
-                                                            styles.append('')  # 比較対象がない場合
-                                                    except:
-                                                        styles.append('')
-                                            return styles
-                                        
-                                        styled_df = structured_df.style.apply(style_row, axis=1)
-                                        
-                                        st.dataframe(
-                                            styled_df,
-                                            use_container_width=True,
-                                            height=min(600, len(structured_df) * 35 + 100)
-                                        )
-                                    except:
-                                        # スタイリングに失敗した場合は通常のDataFrameを表示
-                                        st.dataframe(
-                                            structured_df,
-                                            use_container_width=True,
-                                            height=min(600, len(structured_df) * 35 + 100)
-                                        )
-                                    
-                                    # 凡例を追加
-                                    st.markdown("""
-                                    **📊 色分け凡例:**
-                                    - 🔴 **薄い赤**: 前月より増加
-                                    - 🟢 **薄い緑**: 前月より減少  
-                                    - ⚫ **グレー**: データなし
-                                    """)
-                                
-                                # 注意書き
-                                st.info("""
-                                📌 **注意事項**
-                                - データは investpy から取得した実際の経済指標です
-                                - "--" は該当月にデータが発表されていないことを示します
-                                - 数値の単位は指標により異なります（%、数値など）
-                                - 将来の投資判断の参考としてご利用ください
-                                """)
-                                
-                            else:
-                                st.warning(f"{selected_year}年の主要経済指標データが見つかりません")
-                        except Exception as e:
-                            st.error(f"データ処理エラー: {e}")
-                    else:
-                        st.warning(f"{selected_year}年の主要経済指標データがありません")
-                else:
-                    st.warning(f"{selected_year}年のデータがありません")
-            else:
-                st.warning(f"{country_mapping.get(selected_country, selected_country)}のデータがありません")
+                lag_panel = get_monthly_panel(get_data_version(), value_type, importance_key)
+                lags = range(-CORRELATION_MAX_LAG, CORRELATION_MAX_LAG + 1)
+                profile = lag_correlation_profile(
+                    lag_panel.currency_matrix(base_currency)[lag_panel.tag_position(lag_base_tag)],
+                    lag_panel.currency_matrix(compare_currency)[lag_panel.tag_position(lag_compare_tag)],
+                    lags
+                )
+                st.plotly_chart(
+                    create_lag_profile_chart(lags, profile, f"{base_currency} {lag_base_tag}", f"{compare_currency} {lag_compare_tag}"),
+                    use_container_width=True
+                )
+                if not np.isnan(profile).all():
+                    best = int(np.nanargmax(np.abs(profile)))
+                    st.info(f"📌 相関が最も強いラグ: {list(lags)[best]:+d}か月（相関 {profile[best]:.2f}）")
+    
+    elif analysis_type == "📅 経済指標カレンダー":
+        # 経済指標カレンダー（期間・重要度の変更は独立して再実行）
+        show_calendar_view()
+    
+    elif analysis_type == "🌏 国別経済指標一覧":
+        # 国別経済指標ヒストリカル一覧（国・データタイプの変更は独立して再実行）
+        available_currencies = sorted([str(c) for c in df['currency'].dropna().unique()])
+        show_country_view(available_currencies, importance_filter, full_coverage_indicators, show_full_coverage_only)
     
     # フッター
     st.markdown("---")
@@ -2134,4 +2613,9 @@ def main():
     )
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    try:
+        main()
+    finally:
+        # 実行中の全てのキャッシュの利用を反映するため、統計は最後に表示・出力
+        show_cache_panel()
+        export_cache_metrics()
\ No newline at end of file
@@ -0,0 +1,199 @@
+"""
+選択した系列の一括エクスポート（CSV / Parquet / Arrow IPC をチャンク単位でストリーミング出力）
+
+コマンドラインからも利用可能:
+    python data_export.py --format parquet --currency USD --tag "CPI (YoY)" \
+        --start 2023-01-01 --end 2024-12-31 --value-type actual --value-type surprise -o cpi.parquet
+"""
+
+import argparse
+import sys
+from datetime import date
+
+from analytics import SURPRISE_VALUE_TYPES, add_surprise_columns
+from config import DATA_FILE_PATH, SQLITE_DB_PATH, STORAGE_ENGINE
+from data_loader import read_economic_data
+from event_registry import get_event_registry
+from series_index import SeriesIndex, date_range_bounds
+from sqlite_store import ReleaseStore
+
+# 出力形式ごとのMIMEタイプと拡張子
+EXPORT_FORMATS = {
+    'csv': {'mime': 'text/csv', 'extension': '.csv'},
+    'parquet': {'mime': 'application/vnd.apache.parquet', 'extension': '.parquet'},
+    'arrow': {'mime': 'application/vnd.apache.arrow.stream', 'extension': '.arrows'},
+}
+
+# 常に出力する識別列と、選択可能な値列
+EXPORT_KEY_COLUMNS = ['date', 'time', 'currency', 'importance', 'event', 'data_tag']
+EXPORT_VALUE_TYPES = ['actual', 'forecast', 'previous'] + SURPRISE_VALUE_TYPES
+
+# 1チャンクあたりの行数
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def selection_positions(series_index, currencies=None, tags=None, start_date=None, end_date=None):
+    """選択条件に一致する行位置（日付昇順）"""
+    df = series_index.df
+    positions = series_index.positions(currencies, tags)
+
+    # 行位置は日付昇順なので、期間指定は二分探索で位置範囲に変換できる
+    if len(positions) and (start_date is not None or end_date is not None):
+        dates = df['date'].to_numpy()[positions]
+        lo, hi = date_range_bounds(
+            dates,
+            start_date if start_date is not None else dates[0],
+            end_date if end_date is not None else dates[-1]
+        )
+        positions = positions[lo:hi]
+    return positions
+
+
+def iter_export_chunks(series_index, currencies=None, tags=None, start_date=None, end_date=None,
+                       value_types=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """選択条件に一致する行を日付昇順のチャンク（DataFrame）として順次生成"""
+    df = series_index.df
+    positions = selection_positions(series_index, currencies, tags, start_date, end_date)
+
+    columns = export_columns(value_types)
+    column_positions = [df.columns.get_loc(col) for col in columns if col in df.columns]
+
+    for offset in range(0, len(positions), chunk_size):
+        yield df.iloc[positions[offset:offset + chunk_size], column_positions]
+
+
+def export_columns(value_types=None):
+    """出力する列の一覧を取得（値タイプ未指定時は全ての値列）"""
+    if value_types is None:
+        value_types = EXPORT_VALUE_TYPES
+    return EXPORT_KEY_COLUMNS + [v for v in EXPORT_VALUE_TYPES if v in value_types]
+
+
+def build_arrow_schema(columns):
+    """出力列からArrowスキーマを作成（チャンク間で型を固定するため明示的に定義）"""
+    import pyarrow as pa
+
+    fields = []
+    for col in columns:
+        if col == 'date':
+            fields.append(pa.field(col, pa.timestamp('us')))
+        elif col in EXPORT_VALUE_TYPES:
+            fields.append(pa.field(col, pa.float64()))
+        else:
+            fields.append(pa.field(col, pa.string()))
+    return pa.schema(fields)
+
+
+def write_export(chunks, fileobj, fmt, columns):
+    """チャンクを順次ファイルへ書き出し、書き出した行数を返す"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"未対応のエクスポート形式です: {fmt}")
+
+    total_rows = 0
+
+    if fmt == 'csv':
+        header = True
+        for chunk in chunks:
+            fileobj.write(chunk.to_csv(index=False, header=header).encode('utf-8'))
+            header = False
+            total_rows += len(chunk)
+        if header:
+            # 該当データがない場合もヘッダーのみ出力
+            fileobj.write((','.join(columns) + '\n').encode('utf-8'))
+        return total_rows
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError(f"{fmt}形式の出力には pyarrow が必要です: {e}")
+
+    schema = build_arrow_schema(columns)
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(fileobj, schema)
+    else:
+        writer = pa.ipc.new_stream(fileobj, schema)
+
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            writer.write_table(table)
+            total_rows += len(chunk)
+    finally:
+        writer.close()
+
+    return total_rows
+
+
+def export_selection(series_index, fileobj, fmt, currencies=None, tags=None, start_date=None,
+                     end_date=None, value_types=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """選択条件に一致するデータを指定形式でストリーミング出力"""
+    columns = [col for col in export_columns(value_types) if col in series_index.df.columns]
+    chunks = iter_export_chunks(
+        series_index,
+        currencies=currencies,
+        tags=tags,
+        start_date=start_date,
+        end_date=end_date,
+        value_types=value_types,
+        chunk_size=chunk_size
+    )
+    return write_export(chunks, fileobj, fmt, columns)
+
+
+def export_file_name(fmt, currencies=None, tags=None):
+    """エクスポートファイル名を作成"""
+    parts = ['economic_data']
+    if currencies and len(currencies) <= 3:
+        parts.extend(currencies)
+    if tags and len(tags) == 1:
+        parts.append(''.join(c if c.isalnum() else '_' for c in tags[0]).strip('_'))
+    return '_'.join(parts) + EXPORT_FORMATS[fmt]['extension']
+
+
+def parse_args(argv=None):
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="経済指標データの一括エクスポート")
+    parser.add_argument('-o', '--output', required=True, help="出力先ファイル（'-'で標準出力）")
+    parser.add_argument('-f', '--format', choices=sorted(EXPORT_FORMATS), default='csv', help="出力形式")
+    parser.add_argument('--data-file', default=SQLITE_DB_PATH if STORAGE_ENGINE == 'sqlite' else DATA_FILE_PATH,
+                        help="統合データファイル（.csv）またはデータベース（.sqlite）のパス")
+    parser.add_argument('--currency', action='append', dest='currencies', help="通貨（複数指定可）")
+    parser.add_argument('--tag', action='append', dest='tags', help="経済指標タグ（複数指定可）")
+    parser.add_argument('--start', type=date.fromisoformat, help="開始日 (YYYY-MM-DD)")
+    parser.add_argument('--end', type=date.fromisoformat, help="終了日 (YYYY-MM-DD)")
+    parser.add_argument('--value-type', action='append', dest='value_types', choices=EXPORT_VALUE_TYPES,
+                        help="値タイプ（複数指定可、未指定時は全て）")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="1チャンクあたりの行数")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.data_file.endswith('.sqlite'):
+        df = ReleaseStore(args.data_file).load_frame(get_event_registry())
+    else:
+        df = read_economic_data(args.data_file)
+    series_index = SeriesIndex(add_surprise_columns(df))
+
+    if args.output == '-':
+        total_rows = export_selection(
+            series_index, sys.stdout.buffer, args.format,
+            currencies=args.currencies, tags=args.tags, start_date=args.start, end_date=args.end,
+            value_types=args.value_types, chunk_size=args.chunk_size
+        )
+    else:
+        with open(args.output, 'wb') as f:
+            total_rows = export_selection(
+                series_index, f, args.format,
+                currencies=args.currencies, tags=args.tags, start_date=args.start, end_date=args.end,
+                value_types=args.value_types, chunk_size=args.chunk_size
+            )
+
+    print(f"📦 {total_rows}件をエクスポートしました ({args.format})", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+"""
+経済データの読み込みと前処理（日付変換・指標タグ付け・数値変換）
+
+月ごとのファイルをプロセスプールで並列に前処理して結合することもできる（結果は統合CSVの
+読み込みと同じ）。ワーカーからの結果は pyarrow があればArrow IPCのバッファで受け渡す。
+
+コマンドラインから読み込み時間を計測可能:
+    python data_loader.py --workers 1 4 16
+"""
+
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from config import DATA_FILE_PATH
+from event_registry import get_event_registry
+
+
+def clean_numeric_value(value):
+    """発表値の文字列を数値に変換（カンマ・%・K・M・Bを除去、変換できない値はNone）"""
+    if pd.isna(value) or value == '':
+        return None
+    # 文字列に変換
+    str_val = str(value)
+    # カンマ、%、K、M、Bを除去
+    for char in [',', '%', 'K', 'M', 'B']:
+        str_val = str_val.replace(char, '')
+    # 数値に変換
+    try:
+        return float(str_val)
+    except:
+        return None
+
+
+def parse_economic_data(df):
+    """日付変換・数値変換（イベント名のID変換以外の前処理、月ごとに独立して実行可能）
+
+    前処理済みのDataFrameと、単位判定用の各行の生の値（数値変換前）を返す。
+    """
+    df["date"] = pd.to_datetime(df["date"], dayfirst=True, errors='coerce')
+    df = df.dropna(subset=['date'])
+
+    raw_values = df['actual'].combine_first(df['forecast']).combine_first(df['previous'])
+
+    # 数値変換処理（全データに対して実行）
+    for col in ['actual', 'forecast', 'previous']:
+        if col in df.columns:
+            df[col] = df[col].apply(clean_numeric_value)
+
+    return df, raw_values
+
+
+def tag_economic_data(df, raw_values, registry=None):
+    """イベント名のID変換・指標タグ付けを行い、日付昇順に並べ替え"""
+    if registry is None:
+        registry = get_event_registry()
+
+    # イベント名を整数IDに変換（クリーンアップ・タグ判定・単位判定は未登録の名前のみ）
+    event_ids = registry.intern(df['event'], raw_values)
+    df['event_id'] = event_ids
+    # 文字列列はIDをコードとするカテゴリ列として保持（行ごとの文字列は持たない）
+    df['event'] = registry.event_categorical(event_ids)
+    df['data_tag'] = registry.tag_categorical(event_ids)
+
+    # 日付昇順に並べ替え、以降のスライスは全て日付順を保つ
+    return sort_by_date(df)
+
+
+def localize_event_ids(df, registry=None):
+    """他のノードで前処理されたデータのイベントIDを、このノードのレジストリのIDに付け替え
+
+    イベントIDはノードごとのレジストリで割り当てられるため、共有キャッシュから取得したデータは
+    イベント名のカテゴリ列から引き直す（このノードで未登録の名前は登録する）。
+    """
+    if df.empty or 'event' not in df.columns:
+        return df
+    if registry is None:
+        registry = get_event_registry()
+
+    events = df['event'].cat
+    event_ids = registry.intern(pd.Series(events.categories, dtype=object))[events.codes]
+    return df.assign(
+        event_id=event_ids,
+        event=registry.event_categorical(event_ids),
+        data_tag=registry.tag_categorical(event_ids)
+    )
+
+
+def sort_by_date(df):
+    """日付昇順に並べ替え（同じ日付の行は月ごとのファイル内の行番号順）
+
+    同じ日付の行は同じ月のファイルに含まれるため、行番号（id列）で並べれば読み込み方によらず
+    同じ順序になる（統合CSVの全件読み込みと差分取り込みの結果を一致させるため）。
+    """
+    columns = ['date', 'id'] if 'id' in df.columns else ['date']
+    return df.sort_values(columns, kind='mergesort').reset_index(drop=True)
+
+
+def process_economic_data(df, registry=None):
+    """生データを前処理（日付変換・指標タグ付け・数値変換・日付昇順ソート）"""
+    df, raw_values = parse_economic_data(df)
+    return tag_economic_data(df, raw_values, registry)
+
+
+def read_economic_data(path=DATA_FILE_PATH):
+    """統合CSVを読み込んで前処理済みのDataFrameを取得"""
+    return process_economic_data(pd.read_csv(path))
+
+
+def partition_files(data_dir="./data"):
+    """月ごとのファイル（economic_data_YYYY-MM.csv）を年月順に取得"""
+    return sorted(glob.glob(os.path.join(data_dir, "economic_data_*.csv")))
+
+
+def _load_partitions(paths):
+    """月ごとのファイル（連続する複数か月分）を読み込んで日付変換・数値変換（プロセスプールのワーカーで実行）
+
+    統合CSVでの重複除去と同じ判定ができるよう、列の型推論は行わず文字列のまま読み込み、
+    生の行のハッシュ値を _raw_key 列として残す。結果は pyarrow があればArrow IPCのバイト列で返す。
+    """
+    raw = pd.concat([pd.read_csv(path, dtype=object) for path in paths], ignore_index=True)
+    raw_keys = pd.util.hash_pandas_object(raw, index=False, categorize=False).to_numpy()
+    df, raw_values = parse_economic_data(raw.assign(_raw_key=raw_keys))
+
+    # 単位判定用の生の値はイベント名ごとの最初の値のみ返す
+    has_value = raw_values.notna().to_numpy()
+    firsts = pd.Series(raw_values.to_numpy()[has_value], index=df['event'].to_numpy()[has_value])
+    samples = firsts[~firsts.index.duplicated()].to_dict()
+
+    return _encode_frame(df), samples
+
+
+def _encode_frame(df):
+    """DataFrameをプロセス間で受け渡す形式に変換（Arrow IPCのバイト列、pyarrowがなければそのまま）"""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return df
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _decode_frame(payload):
+    """_encode_frame の結果をDataFrameに戻す"""
+    if isinstance(payload, pd.DataFrame):
+        return payload
+    import pyarrow as pa
+
+    df = pa.ipc.open_stream(payload).read_all().to_pandas()
+    # Arrowの欠損（None）を統合CSVの読み込みと同じNaNに揃える
+    return df.replace({None: np.nan})
+
+
+def create_loader_pool(workers):
+    """月ごとのファイルの前処理に使うプロセスプール（スレッドを持つプロセスから安全に起動できるspawn方式）"""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def read_partitioned_data(paths, executor=None, workers=1, registry=None):
+    """月ごとのファイルを並列に前処理して結合（read_economic_data で統合CSVを読んだ場合と同じ結果）
+
+    ファイルは年月順に workers 個のまとまりに分けて処理する（ファイルごとの固定コストを抑えるため）。
+    executor を省略した場合は workers 個のプロセスで一時的なプールを作成する（workersが1なら同じプロセスで実行）。
+    イベント名のID変換はレジストリを共有するため、結合後にこのプロセスでまとめて行う。
+    """
+    if not paths:
+        raise FileNotFoundError("月ごとのデータファイルが見つかりません")
+    chunks = [list(chunk) for chunk in np.array_split(np.asarray(paths, dtype=object), min(workers, len(paths)))]
+    if executor is not None:
+        results = list(executor.map(_load_partitions, chunks))
+    elif workers > 1:
+        with create_loader_pool(workers) as pool:
+            results = list(pool.map(_load_partitions, chunks))
+    else:
+        results = [_load_partitions(chunk) for chunk in chunks]
+
+    frames = [_decode_frame(payload) for payload, _ in results]
+    # 空のまとまりは列の型が決まらないため、全て空の場合を除いて結合から外す
+    frames = [frame for frame in frames if not frame.empty] or frames[:1]
+
+    df = pd.concat(frames, ignore_index=True)
+    # 統合CSVと同様に、月をまたいで重複する行は最初の1行のみ残す
+    df = df[~df['_raw_key'].duplicated()].drop(columns='_raw_key').reset_index(drop=True)
+    if 'id' in df.columns:
+        df['id'] = pd.to_numeric(df['id'])
+    # 値が全て欠損の月は数値列の型が決まらないため、結合後に揃える
+    for col in ['actual', 'forecast', 'previous']:
+        if col in df.columns:
+            df[col] = df[col].astype(float)
+
+    samples = {}
+    for _, partition_samples in results:
+        for event, value in partition_samples.items():
+            samples.setdefault(event, value)
+    raw_values = df['event'].map(samples)
+
+    return tag_economic_data(df, raw_values, registry)
+
+
+def parse_args(argv=None):
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="経済データの読み込み時間の計測（統合CSV / 月ごとのファイルの並列読み込み）")
+    parser.add_argument('--data-dir', default=os.path.dirname(DATA_FILE_PATH), help="月ごとのファイルの置き場")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16], help="計測するプロセス数（複数指定可）")
+    parser.add_argument('--repeat', type=int, default=3, help="計測回数（最短時間を表示）")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = partition_files(args.data_dir)
+    registry = get_event_registry()
+
+    def best_of(load):
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            rows = len(load())
+            timings.append(time.perf_counter() - started)
+        return min(timings), rows
+
+    print(f"📁 月ごとのファイル: {len(paths)}件（CPU {os.cpu_count()}コア）")
+    baseline, rows = best_of(lambda: read_economic_data(DATA_FILE_PATH))
+    print(f"統合CSV（1プロセス）: {baseline:.3f}秒, {rows}件")
+
+    for workers in args.workers:
+        if workers > 1:
+            started = time.perf_counter()
+            pool = create_loader_pool(workers)
+            # ワーカーの起動（pandasの読み込み）を計測から除く
+            list(pool.map(abs, range(workers)))
+            startup = time.perf_counter() - started
+        else:
+            pool, startup = None, 0.0
+        try:
+            seconds, rows = best_of(lambda: read_partitioned_data(paths, executor=pool, workers=workers, registry=registry))
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        print(f"月ごと並列（{workers}プロセス）: {seconds:.3f}秒, {rows}件 "
+              f"（統合CSV比 {baseline / seconds:.2f}倍, プール起動 {startup:.2f}秒）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,312 @@
+"""
+データ取得元の切り替え（ライブ取得・記録・再生）
+
+- live:   investpy とフォールバックAPIから取得する（通常運用）
+- record: ライブ取得した結果をフィクスチャとして保存しながら返す
+- replay: 保存済みのフィクスチャを返す（遅延・失敗の注入が可能、ネットワーク不要）
+
+取得パイプラインのスループット・リトライ・同時実行の挙動を、ネットワークなしで
+再現性のある形で計測するために使う。
+
+コマンドラインからも利用可能:
+    python data_sources.py record --start 2025-01 --end 2025-06
+    python data_sources.py bench --start 2025-01 --end 2025-06 --workers 4 --latency 0.2 --failure-rate 0.1
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from atomic_io import atomic_write_bytes
+from config import FIXTURE_DIR
+from http_cache import CachedHttpClient, CachedResponse
+
+# 経済カレンダーの取得対象国（ダッシュボードの月ごとの取得と同じ）
+CALENDAR_COUNTRIES = ['united states', 'euro zone', 'united kingdom', 'japan', 'australia']
+
+
+class FixtureNotFoundError(LookupError):
+    """再生モードで該当するフィクスチャが保存されていない"""
+
+
+class InjectedFailureError(ConnectionError):
+    """再生モードで注入された取得失敗"""
+
+
+class DataSource:
+    """経済カレンダーとフォールバックAPIの取得元インターフェース"""
+
+    mode = None
+
+    def economic_calendar(self, countries, from_date, to_date, time_zone=None):
+        """経済カレンダーを取得（investpy.economic_calendar と同じ形式のDataFrame）"""
+        raise NotImplementedError
+
+    def get(self, url, headers=None, ttl=None, timeout=10):
+        """HTTP GET（CachedResponse を返す）"""
+        raise NotImplementedError
+
+
+class LiveDataSource(DataSource):
+    """investpy と共有HTTPクライアントから直接取得"""
+
+    mode = 'live'
+
+    def __init__(self, http_client):
+        self.http_client = http_client
+
+    def economic_calendar(self, countries, from_date, to_date, time_zone=None):
+        import investpy
+
+        return investpy.economic_calendar(
+            time_zone=time_zone,
+            countries=list(countries),
+            from_date=from_date,
+            to_date=to_date
+        )
+
+    def get(self, url, headers=None, ttl=None, timeout=10):
+        return self.http_client.get(url, headers=headers, ttl=ttl, timeout=timeout)
+
+
+class FixtureStore:
+    """取得結果をリクエスト内容ごとに保存するフィクスチャ置き場
+
+    経済カレンダーはCSV、HTTPレスポンスは本文をそのまま保存し、メタデータはJSONで保持する。
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    @staticmethod
+    def request_key(kind, params):
+        """リクエスト内容（種類とパラメータ）からフィクスチャのキーを作成"""
+        payload = json.dumps({'kind': kind, 'params': params}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + '.json', base + '.body'
+
+    def save(self, kind, params, content, meta=None):
+        """フィクスチャを保存（本文を先に、メタデータを最後に置き換える）"""
+        key = self.request_key(kind, params)
+        meta_path, body_path = self._paths(key)
+        os.makedirs(self.directory, exist_ok=True)
+        record = {'kind': kind, 'params': params, 'recorded_at': time.time()}
+        record.update(meta or {})
+        atomic_write_bytes(body_path, content)
+        atomic_write_bytes(meta_path, json.dumps(record, ensure_ascii=False).encode('utf-8'))
+
+    def load(self, kind, params):
+        """フィクスチャを読み込み（メタデータ, 本文）、なければ FixtureNotFoundError"""
+        meta_path, body_path = self._paths(self.request_key(kind, params))
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                content = f.read()
+        except OSError:
+            raise FixtureNotFoundError(f"フィクスチャがありません: {kind} {params}")
+        return meta, content
+
+
+def _calendar_params(countries, from_date, to_date, time_zone):
+    return {'countries': list(countries), 'from_date': from_date, 'to_date': to_date, 'time_zone': time_zone}
+
+
+class RecordingDataSource(DataSource):
+    """別の取得元の結果をフィクスチャとして保存しながら返す"""
+
+    mode = 'record'
+
+    def __init__(self, inner, store):
+        self.inner = inner
+        self.store = store
+
+    def economic_calendar(self, countries, from_date, to_date, time_zone=None):
+        data = self.inner.economic_calendar(countries, from_date, to_date, time_zone)
+        self.store.save(
+            'economic_calendar',
+            _calendar_params(countries, from_date, to_date, time_zone),
+            data.to_csv(index=False).encode('utf-8')
+        )
+        return data
+
+    def get(self, url, headers=None, ttl=None, timeout=10):
+        response = self.inner.get(url, headers=headers, ttl=ttl, timeout=timeout)
+        self.store.save(
+            'http_get',
+            {'url': url},
+            response.content,
+            {'status_code': response.status_code, 'headers': response.headers}
+        )
+        return response
+
+
+class ReplayDataSource(DataSource):
+    """保存済みのフィクスチャを返す取得元（ネットワーク不要）
+
+    latency:      1リクエストあたりの遅延（秒）
+    jitter:       遅延に加える一様乱数の幅（秒）
+    failure_rate: 注入する失敗の確率（0〜1）
+    seed:         遅延・失敗の乱数シード（同じシードなら同じ順序で失敗する）
+    """
+
+    mode = 'replay'
+
+    def __init__(self, store, latency=0.0, jitter=0.0, failure_rate=0.0, seed=None):
+        self.store = store
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'served': 0, 'injected_failures': 0, 'misses': 0}
+
+    def _simulate(self, description):
+        """遅延と失敗を注入"""
+        with self._lock:
+            self.stats['requests'] += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = self.failure_rate > 0 and self._random.random() < self.failure_rate
+            if fail:
+                self.stats['injected_failures'] += 1
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            raise InjectedFailureError(f"注入された取得失敗: {description}")
+
+    def _load(self, kind, params):
+        try:
+            meta, content = self.store.load(kind, params)
+        except FixtureNotFoundError:
+            with self._lock:
+                self.stats['misses'] += 1
+            raise
+        with self._lock:
+            self.stats['served'] += 1
+        return meta, content
+
+    def economic_calendar(self, countries, from_date, to_date, time_zone=None):
+        self._simulate(f"economic_calendar {from_date}-{to_date}")
+        _, content = self._load('economic_calendar', _calendar_params(countries, from_date, to_date, time_zone))
+        if not content.strip():
+            return pd.DataFrame()
+        return pd.read_csv(io.BytesIO(content))
+
+    def get(self, url, headers=None, ttl=None, timeout=10):
+        self._simulate(f"GET {url}")
+        meta, content = self._load('http_get', {'url': url})
+        return CachedResponse(
+            url=url,
+            status_code=meta.get('status_code', 200),
+            content=content,
+            headers=meta.get('headers', {}),
+            fetched_at=meta.get('recorded_at', 0),
+            from_cache=True
+        )
+
+
+def create_data_source(mode, http_client, fixture_dir, latency=0.0, jitter=0.0, failure_rate=0.0, seed=None):
+    """モード名から取得元を作成"""
+    if mode == 'live':
+        return LiveDataSource(http_client)
+    if mode == 'record':
+        return RecordingDataSource(LiveDataSource(http_client), FixtureStore(fixture_dir))
+    if mode == 'replay':
+        return ReplayDataSource(FixtureStore(fixture_dir), latency, jitter, failure_rate, seed)
+    raise ValueError(f"未対応のデータ取得モードです: {mode}")
+
+
+def month_ranges(start_month, end_month):
+    """月の範囲 [start_month, end_month] を (年月, 開始日, 終了日) の一覧に変換（日付は dd/mm/YYYY）"""
+    ranges = []
+    for period in pd.period_range(start_month, end_month, freq='M'):
+        ranges.append((
+            period.strftime('%Y-%m'),
+            period.start_time.strftime('%d/%m/%Y'),
+            period.end_time.strftime('%d/%m/%Y')
+        ))
+    return ranges
+
+
+def fetch_months(source, months, workers=1, retries=0):
+    """月ごとの経済カレンダーを並列取得し、結果と計測値を返す"""
+
+    def fetch(month):
+        year_month, from_date, to_date = month
+        attempts = 0
+        started = time.perf_counter()
+        while True:
+            attempts += 1
+            try:
+                data = source.economic_calendar(CALENDAR_COUNTRIES, from_date, to_date)
+                return year_month, len(data), attempts, time.perf_counter() - started, None
+            except Exception as e:
+                if attempts > retries or isinstance(e, FixtureNotFoundError):
+                    return year_month, 0, attempts, time.perf_counter() - started, e
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(fetch, months))
+    elapsed = time.perf_counter() - started
+
+    return results, {
+        'months': len(months),
+        'succeeded': sum(1 for r in results if r[4] is None),
+        'rows': sum(r[1] for r in results),
+        'attempts': sum(r[2] for r in results),
+        'elapsed': elapsed,
+        'months_per_sec': len(months) / elapsed if elapsed > 0 else float('inf')
+    }
+
+
+def parse_args(argv=None):
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="経済カレンダー取得の記録・再生ベンチマーク")
+    parser.add_argument('command', choices=['record', 'bench'], help="record: ライブ取得して保存 / bench: 保存済みデータで計測")
+    parser.add_argument('--start', required=True, help="開始年月 (YYYY-MM)")
+    parser.add_argument('--end', required=True, help="終了年月 (YYYY-MM)")
+    parser.add_argument('--fixture-dir', default=FIXTURE_DIR, help="フィクスチャの保存先")
+    parser.add_argument('--workers', type=int, default=1, help="同時取得数")
+    parser.add_argument('--retries', type=int, default=0, help="失敗時の再試行回数")
+    parser.add_argument('--latency', type=float, default=0.0, help="再生時の遅延（秒）")
+    parser.add_argument('--jitter', type=float, default=0.0, help="再生時の遅延のばらつき（秒）")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="再生時に注入する失敗の確率")
+    parser.add_argument('--seed', type=int, default=None, help="乱数シード")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    months = month_ranges(args.start, args.end)
+
+    if args.command == 'record':
+        source = create_data_source('record', CachedHttpClient(), args.fixture_dir)
+    else:
+        source = create_data_source('replay', None, args.fixture_dir, args.latency, args.jitter,
+                                    args.failure_rate, args.seed)
+
+    results, summary = fetch_months(source, months, workers=args.workers, retries=args.retries)
+    for year_month, rows, attempts, seconds, error in results:
+        status = f"エラー: {error}" if error is not None else f"{rows}件"
+        print(f"{year_month}: {status}（試行{attempts}回, {seconds:.2f}秒）")
+    print(
+        f"📊 {summary['succeeded']}/{summary['months']}か月成功, {summary['rows']}件, "
+        f"試行{summary['attempts']}回, {summary['elapsed']:.2f}秒 ({summary['months_per_sec']:.1f}か月/秒)"
+    )
+    return 0 if summary['succeeded'] == summary['months'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+差分取り込み（更新された月ごとのファイルの追加・変更行だけを読み込み済みデータへ反映）
+
+更新前後の月ごとのファイルをそれぞれ前処理して行キーを比較し、消えた行と増えた行のみを
+前処理済みのデータに適用する。全履歴の再読み込み・再タグ付け・再数値変換は行わない。
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+from analytics import add_surprise_columns
+from data_loader import process_economic_data, sort_by_date
+from event_registry import get_event_registry
+
+# 行の同一性を判定する列（前処理後の値で比較）
+# 月ごとのファイル内の行番号（id）も含める。行が挿入されて後続の行番号がずれた場合も全件読み込みと同じ値になり、
+# 統合CSVの重複除去（生の行全体で判定）で残る行と同じ行が残る
+DELTA_KEY_COLUMNS = ['id', 'date', 'time', 'currency', 'importance', 'event_id', 'actual', 'forecast', 'previous']
+
+
+def row_keys(df):
+    """前処理済みの行ごとのキー（ハッシュ値）を取得"""
+    columns = [col for col in DELTA_KEY_COLUMNS if col in df.columns]
+    if df.empty:
+        return np.empty(0, dtype=np.uint64)
+    return pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+
+
+class PartitionDelta:
+    """月ごとのファイル1つ分の差分（削除された行キーと追加された前処理済みの行）"""
+
+    def __init__(self, removed_keys, added_rows):
+        self.removed_keys = removed_keys
+        self.added_rows = added_rows
+
+    @property
+    def is_empty(self):
+        return len(self.removed_keys) == 0 and self.added_rows.empty
+
+
+def compute_partition_delta(old_raw, new_raw, registry=None):
+    """更新前後の生データ（CSVから読み込んだもの）から差分を計算"""
+    registry = get_event_registry() if registry is None else registry
+
+    old = process_economic_data(old_raw.copy(), registry) if old_raw is not None and not old_raw.empty else None
+    new = process_economic_data(new_raw.copy(), registry)
+
+    new_keys = row_keys(new)
+    old_keys = row_keys(old) if old is not None else np.empty(0, dtype=np.uint64)
+
+    removed_keys = np.setdiff1d(old_keys, new_keys)
+    added_rows = new[~np.isin(new_keys, old_keys)]
+    return PartitionDelta(removed_keys, added_rows)
+
+
+def apply_deltas(df, deltas, registry=None):
+    """前処理済みデータ（サプライズ列を含む）に差分を適用した新しいDataFrameを返す
+
+    元のdfは変更しない。サプライズ列は差分に関係する系列のみ再計算する。
+    """
+    registry = get_event_registry() if registry is None else registry
+    deltas = [delta for delta in deltas if not delta.is_empty]
+    if not deltas:
+        return df
+
+    removed_keys = np.unique(np.concatenate([delta.removed_keys for delta in deltas]))
+    added = [delta.added_rows for delta in deltas if not delta.added_rows.empty]
+
+    keep_mask = ~np.isin(row_keys(df), removed_keys) if len(removed_keys) else np.ones(len(df), dtype=bool)
+    removed_rows = df[~keep_mask]
+
+    patched = pd.concat([df[keep_mask]] + added, ignore_index=True)
+    # 全件読み込みと同じ行・順序にする（月をまたいで重複する行は1行のみ残し、同じ日付の行は行番号順）
+    patched = sort_by_date(patched[~pd.Series(row_keys(patched)).duplicated().to_numpy()])
+    # 新しいイベント名が登録されている可能性があるため、カテゴリ列はIDから作り直す
+    event_ids = patched['event_id'].to_numpy()
+    patched['event'] = registry.event_categorical(event_ids)
+    patched['data_tag'] = registry.tag_categorical(event_ids)
+
+    # 追加・削除された行の系列のみサプライズ列を再計算
+    changed = pd.concat([removed_rows[['currency', 'data_tag']].astype(str)] +
+                        [rows[['currency', 'data_tag']].astype(str) for rows in added])
+    changed_keys = pd.MultiIndex.from_frame(changed.drop_duplicates())
+    affected = pd.MultiIndex.from_arrays([patched['currency'].astype(str), patched['data_tag'].astype(str)]).isin(changed_keys)
+    if affected.any():
+        subset = add_surprise_columns(patched.loc[affected, ['date', 'currency', 'data_tag', 'actual', 'forecast']].copy())
+        for col in ['surprise', 'surprise_pct', 'surprise_z']:
+            if col not in patched.columns:
+                patched[col] = np.nan
+            patched.loc[affected, col] = subset[col].to_numpy()
+
+    return patched
+
+
+class DatasetDeltaStore:
+    """プロセス内で最後に読み込んだデータと、差分適用済みデータ（新バージョン）の受け渡し"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._base = (None, None)
+        self._patched = {}
+
+    def set_base(self, data_version, value):
+        """差分適用の元になる、最後に構築したデータを記録"""
+        with self._lock:
+            self._base = (data_version, value)
+
+    def base(self):
+        with self._lock:
+            return self._base
+
+    def register(self, data_version, value):
+        """差分適用済みのデータを新しいデータバージョンとして登録"""
+        with self._lock:
+            self._patched = {data_version: value}
+
+    def take(self, data_version):
+        """データバージョンに対応する差分適用済みデータを取り出し（なければNone）"""
+        with self._lock:
+            return self._patched.pop(data_version, None)
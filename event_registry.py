@@ -0,0 +1,294 @@
+"""
+イベント名レジストリ（イベント名ごとに整数IDを割り当て、クリーンアップ名・指標タグ・単位を一度だけ計算して永続化）
+"""
+
+import hashlib
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from atomic_io import atomic_write_csv
+from config import EVENT_REGISTRY_PATH
+from refresh_coordinator import FileLock
+
+# 詳細な経済指標分類（地域・時期・種類を区別）
+TAG_PATTERNS = {
+    # CPI関連（より詳細に分類）
+    'National CPI (YoY)': r'National.*CPI.*\(YoY\)',
+    'National CPI (MoM)': r'National.*CPI.*\(MoM\)',
+    'Tokyo CPI (YoY)': r'Tokyo.*CPI.*\(YoY\)',
+    'Tokyo CPI (MoM)': r'Tokyo.*CPI.*\(MoM\)',
+    'Tokyo CPI Ex Food & Energy (YoY)': r'Tokyo.*CPI.*Ex.*Food.*Energy.*\(YoY\)|CPI.*Tokyo.*Ex.*Food.*Energy.*\(YoY\)',
+    'Tokyo CPI Ex Food & Energy (MoM)': r'Tokyo.*CPI.*Ex.*Food.*Energy.*\(MoM\)|CPI.*Tokyo.*Ex.*Food.*Energy.*\(MoM\)',
+    'Core CPI (YoY)': r'Core.*CPI.*\(YoY\)',
+    'Core CPI (MoM)': r'Core.*CPI.*\(MoM\)',
+    'CPI (YoY)': r'CPI.*\(YoY\)|Consumer.*Price.*Index.*\(YoY\)',
+    'CPI (MoM)': r'CPI.*\(MoM\)|Consumer.*Price.*Index.*\(MoM\)',
+    
+    # 住宅関連
+    'Housing Prices (YoY)': r'Housing.*Price.*\(YoY\)|HPI.*\(YoY\)|House.*Price.*\(YoY\)',
+    'Housing Prices (MoM)': r'Housing.*Price.*\(MoM\)|HPI.*\(MoM\)|House.*Price.*\(MoM\)',
+    'Building Permits': r'Building Permits|Construction.*Permits',
+    'Housing Starts': r'Housing Starts|Home.*Starts',
+    
+    # 小売・消費関連
+    'Retail Sales (YoY)': r'Retail Sales.*\(YoY\)',
+    'Retail Sales (MoM)': r'Retail Sales.*\(MoM\)',
+    'Consumer Confidence': r'Consumer Confidence|Consumer Sentiment',
+    
+    # 雇用関連
+    'Employment Change': r'Employment Change|Nonfarm.*Payroll',
+    'Unemployment Rate': r'Unemployment Rate',
+    'Job Cuts (YoY)': r'Job.*Cuts.*\(YoY\)|Challenger.*Job.*Cuts.*\(YoY\)',
+    'Jobless Claims': r'Initial.*Claims|Continuing.*Claims|Jobless.*Claims',
+    
+    # 製造業・PMI
+    'Manufacturing PMI': r'Manufacturing.*PMI',
+    'Services PMI': r'Services.*PMI|Service.*Sector.*PMI',
+    'Composite PMI': r'Composite.*PMI',
+    
+    # 金融・金利
+    'Interest Rate': r'Interest Rate|Fed.*Rate|BoJ.*Rate|ECB.*Rate|BoE.*Rate|RBA.*Rate|FOMC|Bank Rate|Cash Rate',
+    'Money Supply (YoY)': r'Money Supply.*\(YoY\)|M[123].*Money.*Supply.*\(YoY\)',
+    'Money Supply (MoM)': r'Money Supply.*\(MoM\)|M[123].*Money.*Supply.*\(MoM\)',
+    
+    # 貿易・商品
+    'Trade Balance': r'Trade Balance|Current Account',
+    'Commodity Prices (YoY)': r'Commodity.*Prices.*\(YoY\)',
+    'Commodity Prices (MoM)': r'Commodity.*Prices.*\(MoM\)',
+    
+    # 産業生産
+    'Industrial Production (YoY)': r'Industrial Production.*\(YoY\)',
+    'Industrial Production (MoM)': r'Industrial Production.*\(MoM\)',
+    
+    # PPI関連
+    'PPI (YoY)': r'PPI.*\(YoY\)|Producer.*Price.*\(YoY\)',
+    'PPI (MoM)': r'PPI.*\(MoM\)|Producer.*Price.*\(MoM\)',
+    
+    # GDP関連
+    'GDP (YoY)': r'GDP.*\(YoY\)',
+    'GDP (QoQ)': r'GDP.*\(QoQ\)|GDP.*\(MoM\)',
+    
+    # その他
+    'Factory Orders': r'Factory.*Orders|Manufacturing.*Orders',
+    'Business Investment': r'Capital.*Expenditure|Business.*Investment|Capex',
+    'Loans (YoY)': r'Loans.*\(YoY\)|Credit.*\(YoY\)'
+}
+
+# 月情報（(Feb)、(Jan)など）を除去する正規表現
+MONTH_SUFFIX_PATTERN = r'\s*\([A-Z][a-z]{2}\)\s*$'
+
+# 値の末尾の単位記号（数値変換時に除去されるもの）
+UNIT_SUFFIXES = ['%', 'K', 'M', 'B']
+
+# タグ付けルールのバージョン（ルールが変わったら保存済みのタグを再計算する）
+RULES_VERSION = hashlib.sha1(
+    repr((MONTH_SUFFIX_PATTERN, list(TAG_PATTERNS.items()))).encode('utf-8')
+).hexdigest()[:12]
+
+REGISTRY_COLUMNS = ['event_id', 'event', 'cleaned_event', 'data_tag', 'unit_class', 'rules_version']
+
+_COMPILED_TAG_PATTERNS = [(tag, re.compile(pattern, re.IGNORECASE)) for tag, pattern in TAG_PATTERNS.items()]
+_MONTH_SUFFIX_RE = re.compile(MONTH_SUFFIX_PATTERN)
+
+
+def clean_event_name(event_name):
+    """イベント名をクリーンアップ（月情報などを除去して正規化）"""
+    return _MONTH_SUFFIX_RE.sub('', event_name).strip()
+
+
+def classify_event(event_name):
+    """イベント名から指標タグを判定（優先度順に最初に一致したタグ、なければクリーンアップ名）"""
+    for tag, pattern in _COMPILED_TAG_PATTERNS:
+        if pattern.search(event_name):
+            return tag
+    return clean_event_name(event_name)
+
+
+def detect_unit_class(raw_value):
+    """生の値文字列から単位記号（%、K、M、B、なしは空文字）を判定"""
+    if raw_value is None or pd.isna(raw_value):
+        return ''
+    str_val = str(raw_value).strip()
+    for suffix in UNIT_SUFFIXES:
+        if str_val.endswith(suffix):
+            return suffix
+    return ''
+
+
+class EventRegistry:
+    """イベント名 ⇔ 整数IDの対応表（指標タグも整数IDで管理）
+
+    新しいイベント名が現れたときだけクリーンアップ・タグ判定・単位判定を行い、
+    結果はCSVに追記保存する。IDは一度割り当てたら変わらない。
+    """
+
+    def __init__(self, path=EVENT_REGISTRY_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        self.events = []
+        self.cleaned_events = []
+        self.unit_classes = []
+        self.event_tag_ids = []
+        self.tags = []
+        self._event_ids = {}
+        self._tag_ids = {}
+
+    def __len__(self):
+        return len(self.events)
+
+    def _load(self):
+        """保存済みのレジストリを読み込み（タグ付けルールが古い行はタグを再計算）"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        saved = pd.read_csv(self.path, keep_default_na=False, dtype=str)
+        if saved.empty:
+            return
+        saved = saved.sort_values('event_id', key=lambda s: s.astype(int))
+
+        stale = False
+        for row in saved.itertuples(index=False):
+            tag = row.data_tag
+            if row.rules_version != RULES_VERSION:
+                tag = classify_event(row.event)
+                stale = True
+            self._append(row.event, row.cleaned_event, tag, row.unit_class)
+
+        if stale:
+            self.save()
+
+    def _append(self, event, cleaned_event, tag, unit_class):
+        """イベントを末尾に追加してIDを返す"""
+        event_id = len(self.events)
+        tag_id = self._tag_ids.get(tag)
+        if tag_id is None:
+            tag_id = len(self.tags)
+            self._tag_ids[tag] = tag_id
+            self.tags.append(tag)
+
+        self.events.append(event)
+        self.cleaned_events.append(cleaned_event)
+        self.unit_classes.append(unit_class)
+        self.event_tag_ids.append(tag_id)
+        self._event_ids[event] = event_id
+        return event_id
+
+    def event_id(self, event):
+        """イベント名のID（未登録ならNone）"""
+        return self._event_ids.get(event)
+
+    def tag_id(self, tag):
+        """指標タグのID（未登録ならNone）"""
+        return self._tag_ids.get(tag)
+
+    def intern(self, events, raw_values=None):
+        """イベント名の配列を整数IDの配列に変換（未登録の名前のみ登録処理を行う）
+
+        raw_valuesは各行の生の値文字列（単位判定用、省略可）。
+        """
+        events = pd.Series(events, copy=False).fillna('').astype(str)
+        codes, uniques = pd.factorize(events)
+
+        with self._lock:
+            new_positions = [i for i, name in enumerate(uniques) if name not in self._event_ids]
+            if new_positions:
+                self._register(uniques, new_positions, codes, raw_values)
+
+            unique_ids = np.fromiter((self._event_ids[name] for name in uniques), dtype=np.int32, count=len(uniques))
+
+        return unique_ids[codes]
+
+    def _register(self, uniques, new_positions, codes, raw_values):
+        """未登録のイベント名を登録して保存（他プロセスと競合しないようロック内で再読込）"""
+        # 新しいイベント名ごとに最初の非空の生の値を取得（単位判定用）
+        sample_values = {}
+        if raw_values is not None:
+            raw = pd.Series(raw_values, copy=False).reset_index(drop=True)
+            new_codes = np.isin(codes, new_positions) & raw.notna().to_numpy()
+            if new_codes.any():
+                first = raw[new_codes].groupby(codes[new_codes]).first()
+                sample_values = first.to_dict()
+
+        with self._file_lock():
+            # 他プロセスが追加した分を取り込んでからIDを割り当てる（永続化しない場合は取り込む分がない）
+            if self.path:
+                self._reset()
+                self._load()
+            for position in new_positions:
+                name = uniques[position]
+                if name in self._event_ids:
+                    continue
+                self._append(
+                    name,
+                    clean_event_name(name),
+                    classify_event(name),
+                    detect_unit_class(sample_values.get(position))
+                )
+            self.save()
+
+    def _file_lock(self):
+        """レジストリファイルのプロセス間ロック"""
+        return FileLock(f"{self.path}.lock") if self.path else _NullLock()
+
+    def save(self):
+        """レジストリをCSVに保存"""
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        atomic_write_csv(self.to_frame(), self.path, index=False)
+
+    def to_frame(self):
+        """レジストリをDataFrameとして取得"""
+        return pd.DataFrame({
+            'event_id': np.arange(len(self.events), dtype=np.int32),
+            'event': self.events,
+            'cleaned_event': self.cleaned_events,
+            'data_tag': [self.tags[tag_id] for tag_id in self.event_tag_ids],
+            'unit_class': self.unit_classes,
+            'rules_version': RULES_VERSION
+        }, columns=REGISTRY_COLUMNS)
+
+    def tag_ids_for(self, event_ids):
+        """イベントIDの配列を指標タグIDの配列に変換"""
+        return np.asarray(self.event_tag_ids, dtype=np.int32)[event_ids]
+
+    def event_categorical(self, event_ids):
+        """イベントIDの配列をイベント名のカテゴリ列に変換（コード＝イベントID）"""
+        return pd.Categorical.from_codes(event_ids, categories=pd.Index(self.events, dtype=object))
+
+    def tag_categorical(self, event_ids):
+        """イベントIDの配列を指標タグのカテゴリ列に変換（コード＝指標タグID）"""
+        return pd.Categorical.from_codes(self.tag_ids_for(event_ids), categories=pd.Index(self.tags, dtype=object))
+
+
+class _NullLock:
+    """永続化しない場合のダミーロック"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_event_registry(path=EVENT_REGISTRY_PATH):
+    """プロセス内で共有するレジストリを取得"""
+    with _registries_lock:
+        registry = _registries.get(path)
+        if registry is None:
+            registry = EventRegistry(path)
+            _registries[path] = registry
+        return registry
@@ -0,0 +1,150 @@
+"""
+Plotlyの図の高速な組み立て（内部で整形済みのNumPy配列から図のdictを直接作成し、プロパティの検証を省略）
+
+go.Scatter などのグラフオブジェクトはプロパティの設定ごとに検証・配列のコピーを行うため、
+トレース数・点数の多い図では組み立てに時間がかかる。内部データから作るトレースは形式が
+分かっているため、dictのまま検証なしで図にまとめる（レイアウトのみ通常どおり検証する）。float の配列は plotly.js の型付き配列
+（base64）として、datetime64 の配列はそのまま orjson（あれば）に渡してJSONに変換する。
+
+コマンドラインから組み立て・変換時間を計測可能:
+    python fast_figure.py --traces 5 20 50 --points 300 3000
+"""
+
+import argparse
+import base64
+import json
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objs as go
+import plotly.io as pio
+import plotly.tools
+
+try:
+    import orjson  # noqa: F401
+    JSON_ENGINE = 'orjson'
+except ImportError:
+    JSON_ENGINE = 'json'
+
+_templates = {}
+
+
+def layout_template(name):
+    """名前付きテンプレート（plotly_dark など）を展開済みのdictで取得（展開は初回のみ）"""
+    template = _templates.get(name)
+    if template is None:
+        template = pio.templates[name].to_plotly_json()
+        _templates[name] = template
+    return template
+
+
+def float_array(values):
+    """float配列を plotly.js の型付き配列（リトルエンディアンのfloat64をbase64化）に変換"""
+    values = np.ascontiguousarray(values, dtype='<f8')
+    return {'dtype': 'f8', 'bdata': base64.b64encode(values).decode('ascii')}
+
+
+def scatter(x, y, **props):
+    """散布図（折れ線）トレースのdict（xはNumPy配列、yは型付き配列として保持し、プロパティは検証しない）"""
+    trace = {'type': 'scatter', 'x': np.asarray(x), 'y': float_array(y)}
+    trace.update(props)
+    return trace
+
+
+def figure_layout(layout=None):
+    """レイアウトをdictに変換（レイアウトは小さいため通常どおり検証し、テンプレートは展開済みのものを再利用）"""
+    layout = dict(layout or {})
+    template = layout.pop('template', None)
+    result = go.Layout(layout).to_plotly_json()
+    if template is not None:
+        result['template'] = layout_template(template) if isinstance(template, str) else template
+    return result
+
+
+def assemble_figure(traces, layout=None, base=None):
+    """トレースのdictとレイアウトから図を作成（トレースの検証は省略）
+
+    baseは figure_layout で検証済みの共通レイアウトで、layout の設定を上に重ねる（baseは再検証しない）。
+    """
+    result = figure_layout(layout)
+    if base is not None:
+        result = dict(base, **result)
+    return go.Figure({'data': list(traces), 'layout': result}, _validate=False)
+
+
+def figure_json(fig):
+    """図をJSON文字列に変換（st.plotly_chart と同じく検証なし、orjson があれば使用）"""
+    return pio.to_json(fig, validate=False, engine=JSON_ENGINE)
+
+
+def parse_args(argv=None):
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="Plotlyの図の組み立て・JSON変換時間の計測（検証あり / 高速パス）")
+    parser.add_argument('--traces', type=int, nargs='+', default=[5, 20, 50], help="トレース数（複数指定可）")
+    parser.add_argument('--points', type=int, nargs='+', default=[300, 3000], help="トレースあたりの点数（複数指定可）")
+    parser.add_argument('--repeat', type=int, default=5, help="計測回数（最短時間を表示）")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = np.random.default_rng(0)
+
+    def validated_figure(series):
+        fig = go.Figure()
+        for i, (x, y) in enumerate(series):
+            fig.add_trace(go.Scatter(x=x, y=y, mode='lines+markers', name=f"series {i}",
+                                     line=dict(width=2), marker=dict(size=4), connectgaps=True,
+                                     hovertemplate="Date: %{x}<br>Value: %{y:.2f}<extra></extra>"))
+        fig.update_layout(template="plotly_dark", height=550, hovermode='x unified')
+        return fig
+
+    def fast_figure(series):
+        traces = [
+            scatter(x, y, mode='lines+markers', name=f"series {i}", line=dict(width=2), marker=dict(size=4),
+                    connectgaps=True, hovertemplate="Date: %{x}<br>Value: %{y:.2f}<extra></extra>")
+            for i, (x, y) in enumerate(series)
+        ]
+        return assemble_figure(traces, dict(template="plotly_dark", height=550, hovermode='x unified'))
+
+    def render(fig):
+        # st.plotly_chart と同じ変換（図をdictに戻してからJSONへ）
+        return figure_json(plotly.tools.return_figure_from_figure_or_data(fig, validate_figure=True))
+
+    def best_of(func):
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = func()
+            timings.append(time.perf_counter() - started)
+        return min(timings) * 1000, result
+
+    # テンプレートの展開・初回インポートを計測から除く
+    render(validated_figure([(pd.date_range('2020-01-01', periods=3), np.zeros(3))]))
+    render(fast_figure([(pd.date_range('2020-01-01', periods=3), np.zeros(3))]))
+
+    print(f"JSONエンジン: {JSON_ENGINE}")
+    for n_traces in args.traces:
+        for n_points in args.points:
+            dates = pd.date_range('2000-01-01', periods=n_points, freq='D').to_numpy()
+            series = [(dates, rng.standard_normal(n_points)) for _ in range(n_traces)]
+
+            slow_build, slow_fig = best_of(lambda: validated_figure(series))
+            slow_render, slow_json = best_of(lambda: render(slow_fig))
+            fast_build, fast_fig = best_of(lambda: fast_figure(series))
+            fast_render, fast_json = best_of(lambda: render(fast_fig))
+
+            print(
+                f"{n_traces}トレース × {n_points}点: "
+                f"検証あり 組み立て {slow_build:.1f}ms + 変換 {slow_render:.1f}ms / "
+                f"高速パス 組み立て {fast_build:.1f}ms + 変換 {fast_render:.1f}ms "
+                f"（{(slow_build + slow_render) / (fast_build + fast_render):.1f}倍, "
+                f"{len(fast_json) / 1e6:.2f}MB, 出力一致: {json.loads(slow_json) == json.loads(fast_json)}）"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+HTTP取得レイヤー（セッションプール・条件付きリクエスト・ディスクキャッシュ・重複リクエストの集約）
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from atomic_io import atomic_write_bytes
+from config import HTTP_CACHE_DIR, HTTP_CACHE_TTL, HTTP_POOL_MAXSIZE
+
+# キャッシュに保存するレスポンスヘッダー
+CACHED_HEADERS = ['Content-Type', 'ETag', 'Last-Modified', 'Cache-Control']
+
+
+class CachedResponse:
+    """キャッシュ可能なHTTPレスポンス（requests.Responseの必要部分のみ）"""
+
+    def __init__(self, url, status_code, content, headers, fetched_at, from_cache=False):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.fetched_at = fetched_at
+        self.from_cache = from_cache
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class CachedHttpClient:
+    """プール済みセッションとディスクキャッシュを共有するHTTPクライアント
+
+    - 同一ホストへの接続はセッションのコネクションプールで再利用する
+    - TTL内のレスポンスはディスクキャッシュから返す
+    - TTL切れのレスポンスは ETag / Last-Modified で再検証する（304なら本文を再利用）
+    - refresh_cycle() 内では同じURLへのリクエストを1回の取得に集約する
+    """
+
+    def __init__(self, cache_dir=HTTP_CACHE_DIR, default_ttl=HTTP_CACHE_TTL, session=None,
+                 pool_maxsize=HTTP_POOL_MAXSIZE):
+        self.cache_dir = cache_dir
+        self.default_ttl = default_ttl
+        self.session = session if session is not None else self._create_session(pool_maxsize)
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._cycle_results = None
+        self._active_cycles = 0
+        self.stats = {'network': 0, 'revalidated': 0, 'cache_hits': 0, 'coalesced': 0, 'stale_on_error': 0}
+
+    @staticmethod
+    def _create_session(pool_maxsize):
+        """コネクションプール付きのセッションを作成"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    @contextmanager
+    def refresh_cycle(self):
+        """更新サイクル中は同じURLへのリクエストを1回の取得に集約
+
+        複数のセッション（スレッド）の更新サイクルが重なった場合は結果を共有し、
+        最後のサイクルが終わった時点で破棄する（先に終わったサイクルが他のサイクルの集約を止めない）。
+        """
+        with self._lock:
+            if self._active_cycles == 0:
+                self._cycle_results = {}
+            self._active_cycles += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._active_cycles -= 1
+                if self._active_cycles == 0:
+                    self._cycle_results = None
+
+    def get(self, url, headers=None, ttl=None, timeout=10):
+        """GETリクエスト（キャッシュ・再検証・重複集約付き）"""
+        ttl = self.default_ttl if ttl is None else ttl
+
+        with self._lock:
+            if self._cycle_results is not None and url in self._cycle_results:
+                self.stats['coalesced'] += 1
+                return self._cycle_results[url]
+
+            future = self._inflight.get(url)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[url] = future
+            else:
+                self.stats['coalesced'] += 1
+
+        # 同じURLを取得中のスレッドがあれば、その結果を待つ
+        if not owner:
+            return future.result()
+
+        try:
+            response = self._get_uncoalesced(url, headers, ttl, timeout)
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(url, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._inflight.pop(url, None)
+            if self._cycle_results is not None:
+                self._cycle_results[url] = response
+        future.set_result(response)
+        return response
+
+    def _get_uncoalesced(self, url, headers, ttl, timeout):
+        """キャッシュを確認し、必要な場合のみネットワークから取得"""
+        cached = self._load(url)
+        now = time.time()
+
+        if cached is not None and now - cached.fetched_at < ttl:
+            with self._lock:
+                self.stats['cache_hits'] += 1
+            return cached
+
+        request_headers = dict(headers or {})
+        if cached is not None:
+            if cached.headers.get('ETag'):
+                request_headers['If-None-Match'] = cached.headers['ETag']
+            if cached.headers.get('Last-Modified'):
+                request_headers['If-Modified-Since'] = cached.headers['Last-Modified']
+
+        try:
+            raw = self.session.get(url, headers=request_headers, timeout=timeout)
+        except requests.RequestException:
+            # ネットワークエラー時は古いキャッシュがあればそれを返す
+            if cached is not None:
+                with self._lock:
+                    self.stats['stale_on_error'] += 1
+                return cached
+            raise
+
+        if raw.status_code == 304 and cached is not None:
+            with self._lock:
+                self.stats['revalidated'] += 1
+            # 本文は再利用し、取得時刻と検証用ヘッダーのみ更新
+            for name in CACHED_HEADERS:
+                if name in raw.headers:
+                    cached.headers[name] = raw.headers[name]
+            cached.fetched_at = now
+            self._store(cached)
+            cached.from_cache = True
+            return cached
+
+        with self._lock:
+            self.stats['network'] += 1
+
+        response = CachedResponse(
+            url=url,
+            status_code=raw.status_code,
+            content=raw.content,
+            headers={name: raw.headers[name] for name in CACHED_HEADERS if name in raw.headers},
+            fetched_at=now
+        )
+        if raw.status_code == 200:
+            self._store(response)
+        return response
+
+    def _cache_path(self, url):
+        """URLに対応するキャッシュファイルのパス（メタデータ、本文）"""
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.cache_dir, key)
+        return base + '.json', base + '.body'
+
+    def _load(self, url):
+        """ディスクキャッシュからレスポンスを読み込み"""
+        meta_path, body_path = self._cache_path(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                content = f.read()
+        except (OSError, ValueError):
+            return None
+
+        if meta.get('url') != url:
+            return None
+
+        return CachedResponse(
+            url=url,
+            status_code=meta.get('status_code', 200),
+            content=content,
+            headers=meta.get('headers', {}),
+            fetched_at=meta.get('fetched_at', 0),
+            from_cache=True
+        )
+
+    def _store(self, response):
+        """レスポンスをディスクキャッシュへ保存（一時ファイルに書いてから置き換え）"""
+        meta_path, body_path = self._cache_path(response.url)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        meta = {
+            'url': response.url,
+            'status_code': response.status_code,
+            'headers': response.headers,
+            'fetched_at': response.fetched_at
+        }
+        # 本文を先に置き換え、メタデータは最後に置き換える（メタデータが本文より新しくならないように）
+        atomic_write_bytes(body_path, response.content)
+        atomic_write_bytes(meta_path, json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+
+    def clear(self):
+        """ディスクキャッシュを全て削除"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith(('.json', '.body')):
+                try:
+                    os.remove(os.path.join(self.cache_dir, filename))
+                except OSError:
+                    pass
+
@@ -0,0 +1,120 @@
+"""
+経済指標タグの検索インデックス（トークン・前方一致の転置インデックスと通貨・重要度のファセット）
+
+データバージョンごとに一度だけ構築し、指標の選択・一覧表示で共有する。
+"""
+
+import bisect
+import re
+
+import numpy as np
+import pandas as pd
+
+TOKEN_PATTERN = re.compile(r'[0-9a-z]+')
+
+
+def tokenize(text):
+    """検索用トークン（英数字の連続、小文字）に分割"""
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+class IndicatorSearchIndex:
+    """指標タグの転置インデックス
+
+    tags:   指標タグ（名前順）
+    counts: tag × currency × importance の発表件数（ファセットでの絞り込み・件数表示用）
+    """
+
+    def __init__(self, df):
+        frame = df[df['data_tag'].notna() & (df['data_tag'].astype(str) != "None")]
+        tag_values = frame['data_tag'].astype(str)
+        currency_values = frame['currency'].astype(str)
+        importance_values = frame['importance'].astype(str) if 'importance' in frame.columns else pd.Series('', index=frame.index)
+
+        tag_codes, tags = pd.factorize(tag_values, sort=True)
+        currency_codes, currencies = pd.factorize(currency_values, sort=True)
+        importance_codes, importances = pd.factorize(importance_values, sort=True)
+
+        self.tags = [str(t) for t in tags]
+        self.currencies = [str(c) for c in currencies]
+        self.importances = [str(i) for i in importances]
+        self._tag_pos = {t: i for i, t in enumerate(self.tags)}
+        self._currency_pos = {c: i for i, c in enumerate(self.currencies)}
+        self._importance_pos = {imp: i for i, imp in enumerate(self.importances)}
+        self._lower_tags = [t.lower() for t in self.tags]
+
+        shape = (len(self.tags), len(self.currencies), len(self.importances))
+        counts = np.zeros(shape, dtype=np.int64)
+        if len(frame):
+            np.add.at(counts, (tag_codes, currency_codes, importance_codes), 1)
+        self.counts = counts
+
+        # トークン → 指標タグ位置の転置インデックス（前方一致はソート済みトークンの二分探索）
+        postings = {}
+        for i, tag in enumerate(self.tags):
+            for token in set(tokenize(tag)):
+                postings.setdefault(token, []).append(i)
+        self._tokens = sorted(postings)
+        self._postings = [np.array(postings[token], dtype=np.int64) for token in self._tokens]
+
+    def __len__(self):
+        return len(self.tags)
+
+    def _prefix_matches(self, prefix):
+        """前方一致するトークンを持つ指標タグの位置"""
+        lo = bisect.bisect_left(self._tokens, prefix)
+        hi = bisect.bisect_left(self._tokens, prefix + '￿')
+        if lo == hi:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(self._postings[lo:hi]))
+
+    def _facet_counts(self, currencies=None, importance=None):
+        """ファセット条件での指標タグごとの発表件数"""
+        counts = self.counts
+        if currencies is not None:
+            counts = counts[:, [self._currency_pos[c] for c in currencies if c in self._currency_pos], :]
+        if importance is not None:
+            counts = counts[:, :, [self._importance_pos[i] for i in importance if i in self._importance_pos]]
+        return counts.sum(axis=(1, 2))
+
+    def tag_counts(self, currencies=None, importance=None):
+        """指標タグごとの発表件数（ファセット条件付き）"""
+        return dict(zip(self.tags, self._facet_counts(currencies, importance).tolist()))
+
+    def search(self, query='', currencies=None, importance=None, tags=None, limit=None):
+        """指標タグを検索（全トークンの前方一致、ファセット・候補タグでの絞り込み付き）
+
+        空の検索語では条件に合う全ての指標を名前順で返す。検索語がある場合は
+        完全一致 → 先頭一致 → 完全一致トークン数 → 発表件数 → 名前 の順に並べる。
+        """
+        facet_counts = self._facet_counts(currencies, importance)
+        candidates = np.flatnonzero(facet_counts > 0)
+        if tags is not None:
+            allowed = [self._tag_pos[t] for t in tags if t in self._tag_pos]
+            candidates = np.intersect1d(candidates, allowed)
+
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            result = [self.tags[i] for i in candidates]
+            return result[:limit] if limit else result
+
+        for token in query_tokens:
+            candidates = np.intersect1d(candidates, self._prefix_matches(token), assume_unique=True)
+            if not len(candidates):
+                return []
+
+        query_lower = str(query).strip().lower()
+        query_token_set = set(query_tokens)
+
+        def rank(i):
+            name = self._lower_tags[i]
+            exact_tokens = len(query_token_set & set(tokenize(name)))
+            return (
+                0 if name == query_lower else 1 if name.startswith(query_lower) else 2,
+                -exact_tokens,
+                -int(facet_counts[i]),
+                self.tags[i]
+            )
+
+        result = [self.tags[i] for i in sorted(candidates, key=rank)]
+        return result[:limit] if limit else result
@@ -0,0 +1,360 @@
+"""
+同時セッションの負荷試験（Streamlit のサーバーを起動し、複数の模擬セッションでヘッドレスに操作）
+
+各セッションはブラウザと同じWebSocketのプロトコルでサーバーに接続し、思考時間（指数分布）を
+挟みながら分析タイプ・通貨・指標・データタイプ・重要度フィルターを切り替えて再実行させる。
+再実行の要求からスクリプトの実行完了までを再実行の待ち時間として集計し、サーバーの各プロセスと
+この試験プロセスのCPU使用率・RSSを計測する（/proc が読める環境のみ）。
+
+既定ではサーバーを再生モード（ECONOMIC_DATA_SOURCE=replay）で起動するため、ネットワークなしで
+保存済みのフィクスチャに対して実行できる（python data_sources.py record で事前に記録）。
+WebSocketの接続には websockets パッケージ（Streamlit の依存関係）を使い、ウィジェットの値は
+インストール済みの Streamlit の形式（選択系は表示ラベル、1.54 より前のラジオボタンは選択肢の位置）で送る。
+
+コマンドラインから実行:
+    python load_test.py --sessions 8 --duration 60 --think-time 2
+    python load_test.py --sessions 16 --servers 2 --json load_test.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from config import FIXTURE_DIR
+from warmup import SERVER_FLAGS, free_port, run_script, wait_until_ready
+
+STREAM_PATH = "/_stcore/stream"
+
+# 操作と、その操作で変更するウィジェット（種類・ラベル）・選ばれやすさ
+ACTIONS = {
+    'analysis_type': ('radio', "📈 分析タイプを選択:", 2),
+    'currency': ('selectbox', "🏛️ 通貨を選択:", 3),
+    'indicator': ('selectbox', "📊 経済指標を選択:", 3),
+    'value_type': ('selectbox', "📊 データタイプ:", 2),
+    'importance': ('multiselect', "表示する重要度:", 2),
+}
+
+PERCENTILES = (50, 95, 99)
+
+# ラジオボタンの値が選択肢の位置（int_value）から表示ラベル（string_value）に変わったバージョン
+RADIO_STRING_VALUE_VERSION = "1.54.0"
+
+
+def radio_sends_index():
+    """インストール済みの Streamlit のラジオボタンが選択肢の位置で値を受け取るか"""
+    import streamlit
+    from packaging.version import Version
+
+    return Version(streamlit.__version__) < Version(RADIO_STRING_VALUE_VERSION)
+
+
+def _clock_ticks():
+    try:
+        return os.sysconf('SC_CLK_TCK')
+    except (AttributeError, ValueError, OSError):
+        return 100
+
+
+def process_usage(pid):
+    """プロセスの累積CPU時間（秒）と現在のRSS（バイト）を /proc から取得（取得できなければNone）"""
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as f:
+            # コマンド名に空白を含む場合があるため、最後の ')' 以降を分割する
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f"/proc/{pid}/statm", 'r') as f:
+            rss_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / _clock_ticks()
+    return cpu_seconds, rss_pages * os.sysconf('SC_PAGE_SIZE')
+
+
+class UsageMonitor:
+    """プロセスごとのCPU使用率（平均）とRSS（最大）を一定間隔で記録"""
+
+    def __init__(self, processes, interval=0.5):
+        self.processes = processes  # 名前 → pid
+        self.interval = interval
+        self._first = {}
+        self._last = {}
+        self._peak_rss = {}
+
+    def sample(self):
+        now = time.perf_counter()
+        for name, pid in self.processes.items():
+            usage = process_usage(pid)
+            if usage is None:
+                continue
+            self._first.setdefault(name, (now, usage[0]))
+            self._last[name] = (now, usage[0])
+            self._peak_rss[name] = max(self._peak_rss.get(name, 0), usage[1])
+
+    async def run(self, stop):
+        while not stop.is_set():
+            self.sample()
+            try:
+                await asyncio.wait_for(stop.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+        self.sample()
+
+    def summary(self):
+        result = {}
+        for name, pid in self.processes.items():
+            if name not in self._last:
+                continue
+            (start, cpu_start), (end, cpu_end) = self._first[name], self._last[name]
+            result[name] = {
+                'pid': pid,
+                'cpu_percent': 100 * (cpu_end - cpu_start) / (end - start) if end > start else 0.0,
+                'cpu_seconds': cpu_end - cpu_start,
+                'peak_rss_mb': self._peak_rss[name] / 1e6
+            }
+        return result
+
+
+class SimulatedSession:
+    """ブラウザの代わりにWebSocketでサーバーに接続し、ウィジェットを操作して再実行させるセッション"""
+
+    def __init__(self, url, rng):
+        self.url = url.replace("http://", "ws://").replace("https://", "wss://") + STREAM_PATH
+        self.rng = rng
+        self.widgets = {}  # (種類, ラベル) → ウィジェットのproto
+        self.values = {}  # ウィジェットID → 送信するWidgetState
+        self._ws = None
+
+    async def connect(self):
+        import websockets
+
+        self._ws = await websockets.connect(self.url, subprotocols=["streamlit"], max_size=None)
+
+    async def close(self):
+        if self._ws is not None:
+            await self._ws.close()
+
+    async def rerun(self):
+        """現在のウィジェットの値で再実行し、完了までの秒数とスクリプトの例外の件数を返す"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.page_script_hash = ""
+        message.rerun_script.widget_states.widgets.extend(self.values.values())
+
+        started = time.perf_counter()
+        await self._ws.send(message.SerializeToString())
+        widgets = {}
+        exceptions = 0
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await self._ws.recv())
+            kind = forward.WhichOneof('type')
+            if kind == 'delta' and forward.delta.WhichOneof('type') == 'new_element':
+                element = forward.delta.new_element
+                element_type = element.WhichOneof('type')
+                if element_type == 'exception':
+                    exceptions += 1
+                proto = getattr(element, element_type)
+                if getattr(proto, 'id', None) and hasattr(proto, 'label'):
+                    widgets[(element_type, proto.label)] = proto
+            elif kind == 'script_finished':
+                # st.rerun() による途中終了の後は、続けて実行される次の実行の完了まで待つ
+                if forward.script_finished != forward.FINISHED_EARLY_FOR_RERUN:
+                    break
+        elapsed = time.perf_counter() - started
+
+        self.widgets = widgets
+        # 表示されなくなったウィジェットの値は送らない（ブラウザと同様）
+        current_ids = {proto.id for proto in widgets.values()}
+        self.values = {widget_id: state for widget_id, state in self.values.items() if widget_id in current_ids}
+        return elapsed, exceptions
+
+    def available_actions(self):
+        return [name for name, (kind, label, _) in ACTIONS.items() if (kind, label) in self.widgets]
+
+    def choose_action(self):
+        actions = self.available_actions()
+        if not actions:
+            return None
+        return self.rng.choices(actions, weights=[ACTIONS[name][2] for name in actions])[0]
+
+    def apply(self, action):
+        """操作に対応するウィジェットの値を無作為に変更"""
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        kind, label, _ = ACTIONS[action]
+        proto = self.widgets[(kind, label)]
+        options = list(proto.options)
+        state = WidgetState(id=proto.id)
+        if kind == 'multiselect':
+            state.string_array_value.data.extend(self.rng.sample(options, self.rng.randint(1, len(options))))
+        elif kind == 'radio' and radio_sends_index():
+            state.int_value = self.rng.randrange(len(options))
+        else:
+            state.string_value = self.rng.choice(options)
+        self.values[proto.id] = state
+
+
+async def run_session(number, url, args, deadline, results):
+    """1セッション分の操作を期限まで繰り返す（開始は思考時間の範囲でずらす）"""
+    rng = random.Random(None if args.seed is None else args.seed + number)
+    session = SimulatedSession(url, rng)
+    await asyncio.sleep(rng.uniform(0, args.think_time))
+    try:
+        await session.connect()
+        elapsed, exceptions = await session.rerun()
+        results.append({'session': number, 'action': 'initial', 'seconds': elapsed, 'exceptions': exceptions})
+        while True:
+            await asyncio.sleep(rng.expovariate(1 / args.think_time) if args.think_time > 0 else 0)
+            if time.perf_counter() >= deadline:
+                break
+            action = session.choose_action()
+            if action is None:
+                action = 'reload'
+            else:
+                session.apply(action)
+            elapsed, exceptions = await session.rerun()
+            results.append({'session': number, 'action': action, 'seconds': elapsed, 'exceptions': exceptions})
+    except Exception as e:
+        results.append({'session': number, 'action': 'error', 'seconds': None, 'exceptions': 1, 'error': str(e)})
+    finally:
+        await session.close()
+
+
+def start_servers(args):
+    """負荷試験用のサーバーを起動（取得元は --source、ポートは空いているものを使用）"""
+    env = dict(os.environ, ECONOMIC_DATA_SOURCE=args.source, ECONOMIC_FIXTURE_DIR=os.path.abspath(args.fixture_dir))
+    servers = []
+    for _ in range(args.servers):
+        port = free_port()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", "dashboard.py", "--server.port", str(port), *SERVER_FLAGS],
+            cwd=args.app_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        servers.append((f"http://localhost:{port}", process))
+    return servers
+
+
+def stop_servers(servers):
+    for _, process in servers:
+        process.terminate()
+    for _, process in servers:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def latency_summary(seconds):
+    """待ち時間の件数・パーセンタイル・最大"""
+    if not seconds:
+        return {'count': 0}
+    values = np.asarray(seconds)
+    summary = {'count': len(values), 'max': float(values.max())}
+    for percentile in PERCENTILES:
+        summary[f"p{percentile}"] = float(np.percentile(values, percentile))
+    return summary
+
+
+def _format_latency(summary):
+    if not summary['count']:
+        return "0回"
+    return (f"{summary['count']}回: " + " / ".join(f"p{p} {summary[f'p{p}']:.3f}秒" for p in PERCENTILES)
+            + f" / 最大 {summary['max']:.3f}秒")
+
+
+async def run_load_test(args, urls, monitor):
+    results = []
+    stop = asyncio.Event()
+    monitor_task = asyncio.create_task(monitor.run(stop))
+    deadline = time.perf_counter() + args.duration
+    # セッションはサーバーに順番に割り当てる（ロードバランサーの振り分けの代わり）
+    await asyncio.gather(*[
+        run_session(number, urls[number % len(urls)], args, deadline, results) for number in range(args.sessions)
+    ])
+    stop.set()
+    await monitor_task
+    return results
+
+
+def parse_args(argv=None):
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="同時セッションの負荷試験（再実行の待ち時間・CPU・RSS）")
+    parser.add_argument('--sessions', type=int, default=8, help="同時セッション数")
+    parser.add_argument('--duration', type=float, default=60.0, help="操作を続ける秒数")
+    parser.add_argument('--think-time', type=float, default=2.0, help="操作間の思考時間の平均（秒、指数分布）")
+    parser.add_argument('--servers', type=int, default=1, help="起動するサーバーのプロセス数（セッションを順番に割り当て）")
+    parser.add_argument('--url', help="起動済みのサーバーに対して実行（指定時はサーバーを起動しない）")
+    parser.add_argument('--source', default='replay', choices=['replay', 'live'], help="起動するサーバーのデータ取得元")
+    parser.add_argument('--fixture-dir', default=FIXTURE_DIR, help="再生するフィクスチャの置き場")
+    parser.add_argument('--app-dir', default=os.path.dirname(os.path.abspath(__file__)), help="ダッシュボードのディレクトリ")
+    parser.add_argument('--no-warmup', action='store_true', help="試験前のウォームアップを行わない（初回表示を含めて計測）")
+    parser.add_argument('--timeout', type=float, default=120.0, help="サーバーの起動・ウォームアップの待ち時間（秒）")
+    parser.add_argument('--seed', type=int, default=None, help="操作・思考時間の乱数シード")
+    parser.add_argument('--json', help="結果をJSONで保存するパス")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    servers = [] if args.url else start_servers(args)
+    urls = [args.url] if args.url else [url for url, _ in servers]
+    try:
+        for url in urls:
+            wait_until_ready(url, args.timeout)
+            if not args.url and not args.no_warmup:
+                run_script(url, args.timeout)
+
+        processes = {f"server {url}": process.pid for url, process in servers}
+        processes['load_test'] = os.getpid()
+        monitor = UsageMonitor(processes)
+        print(f"🧪 負荷試験: {args.sessions}セッション × {args.duration:.0f}秒"
+              f"（思考時間 平均{args.think_time}秒, サーバー {len(urls)}プロセス"
+              f"{'' if args.url else f', 取得元 {args.source}'}）")
+        results = asyncio.run(run_load_test(args, urls, monitor))
+    finally:
+        stop_servers(servers)
+
+    reruns = [item for item in results if item['action'] not in ('initial', 'error')]
+    summary = {
+        'config': {key: getattr(args, key) for key in ('sessions', 'duration', 'think_time', 'servers', 'source', 'seed')},
+        'initial': latency_summary([item['seconds'] for item in results if item['action'] == 'initial']),
+        'rerun': latency_summary([item['seconds'] for item in reruns]),
+        'actions': {
+            action: latency_summary([item['seconds'] for item in reruns if item['action'] == action])
+            for action in sorted({item['action'] for item in reruns})
+        },
+        'exceptions': sum(item['exceptions'] for item in results),
+        'session_errors': [item['error'] for item in results if item['action'] == 'error'],
+        'processes': monitor.summary()
+    }
+
+    print(f"🖥️ 初回表示 {_format_latency(summary['initial'])}")
+    print(f"🔁 再実行 {_format_latency(summary['rerun'])}")
+    for action, action_summary in summary['actions'].items():
+        print(f"   {action}: {_format_latency(action_summary)}")
+    for name, usage in summary['processes'].items():
+        print(f"⚙️ {name} (pid {usage['pid']}): CPU {usage['cpu_percent']:.0f}%"
+              f"（{usage['cpu_seconds']:.1f}秒）, RSS 最大 {usage['peak_rss_mb']:.0f}MB")
+    if summary['exceptions']:
+        print(f"⚠️ スクリプトの例外 {summary['exceptions']}件")
+    for error in summary['session_errors']:
+        print(f"❌ セッションエラー: {error}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summary, 'samples': results}, f, ensure_ascii=False, indent=2)
+        print(f"💾 結果を保存しました: {args.json}")
+    return 1 if summary['session_errors'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""
+月次パネル（通貨 × 経済指標 × 月 の3次元NumPy配列、欠損はNaN）
+
+長い形式のDataFrameを毎回フィルター・ピボットする代わりに、データバージョンごとに
+一度だけ整列させた配列を作り、通貨間比較・カバレッジ確認・国別テーブル・相関計算を
+配列スライスで行う。ディスク上にはメモリマップ可能な .npy 形式で保存できる。
+"""
+
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+class MonthlyPanel:
+    """通貨 × 経済指標 × 月 の整列済みパネル
+
+    values[c, t, m] はその月の最後の発表値（欠損はNaN）、
+    counts[c, t, m] はその月の発表件数（値の有無に関わらず数える）。
+    """
+
+    def __init__(self, currencies, tags, months, values, counts, value_type):
+        self.currencies = list(currencies)
+        self.tags = list(tags)
+        self.months = np.asarray(months, dtype='datetime64[M]')
+        self.values = values
+        self.counts = counts
+        self.value_type = value_type
+        self._currency_pos = {c: i for i, c in enumerate(self.currencies)}
+        self._tag_pos = {t: i for i, t in enumerate(self.tags)}
+
+    @classmethod
+    def from_frame(cls, df, value_type):
+        """日付昇順の長い形式DataFrameからパネルを作成"""
+        valid = df['currency'].notna().to_numpy() & df['data_tag'].notna().to_numpy()
+        frame = df[valid]
+
+        currency_codes, currencies = pd.factorize(frame['currency'].astype(str), sort=True)
+        tag_codes, tags = pd.factorize(frame['data_tag'].astype(str), sort=True)
+        month_values = frame['date'].to_numpy().astype('datetime64[M]')
+
+        if len(month_values):
+            first_month, last_month = month_values.min(), month_values.max()
+            months = np.arange(first_month, last_month + np.timedelta64(1, 'M'), dtype='datetime64[M]')
+        else:
+            months = np.empty(0, dtype='datetime64[M]')
+        month_codes = (month_values - (months[0] if len(months) else month_values)).astype(np.int64)
+
+        shape = (len(currencies), len(tags), len(months))
+        flat_index = np.ravel_multi_index((currency_codes, tag_codes, month_codes), shape) if len(frame) else np.empty(0, dtype=np.int64)
+
+        counts = np.bincount(flat_index, minlength=int(np.prod(shape))).astype(np.int32).reshape(shape)
+
+        values = np.full(shape, np.nan)
+        numeric = pd.to_numeric(frame[value_type], errors='coerce').to_numpy(dtype=float) if value_type in frame.columns else np.full(len(frame), np.nan)
+        has_value = ~np.isnan(numeric)
+        if has_value.any():
+            # 日付昇順なので、セルごとに最後の値（欠損を除く）を採用する
+            last_values = pd.Series(numeric[has_value]).groupby(flat_index[has_value]).last()
+            values.reshape(-1)[last_values.index.to_numpy()] = last_values.to_numpy()
+
+        return cls(list(currencies), list(tags), months, values, counts, value_type)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def currency_position(self, currency):
+        return self._currency_pos.get(currency)
+
+    def tag_position(self, tag):
+        return self._tag_pos.get(tag)
+
+    def tag_positions(self, tags):
+        """指標タグのリストを位置配列に変換（存在しないタグは除外）"""
+        return np.array([self._tag_pos[t] for t in tags if t in self._tag_pos], dtype=np.int64)
+
+    def month_range(self, start_month=None, end_month=None):
+        """月の範囲 [start_month, end_month] に対応するスライス"""
+        lo = 0 if start_month is None else int(self.months.searchsorted(np.datetime64(start_month, 'M'), side='left'))
+        hi = len(self.months) if end_month is None else int(self.months.searchsorted(np.datetime64(end_month, 'M'), side='right'))
+        return slice(lo, max(lo, hi))
+
+    def coverage(self):
+        """通貨 × 指標 のカバレッジ（一度でも発表があればTrue）"""
+        return self.counts.sum(axis=2) > 0
+
+    def currencies_for_tag(self, tag):
+        """指標が発表されている通貨の一覧"""
+        t = self._tag_pos.get(tag)
+        if t is None:
+            return []
+        covered = self.counts[:, t, :].sum(axis=1) > 0
+        return [c for c, flag in zip(self.currencies, covered) if flag]
+
+    def tag_matrix(self, tag, months=slice(None)):
+        """指標の 通貨 × 月 の行列（通貨間比較用）"""
+        t = self._tag_pos.get(tag)
+        if t is None:
+            return np.full((len(self.currencies), len(self.months[months])), np.nan)
+        return self.values[:, t, months]
+
+    def currency_matrix(self, currency, months=slice(None)):
+        """通貨の 指標 × 月 の行列（国別テーブル・相関計算用）"""
+        c = self._currency_pos.get(currency)
+        if c is None:
+            return np.full((len(self.tags), len(self.months[months])), np.nan)
+        return self.values[c, :, months]
+
+    def currency_frame(self, currency, tags=None, months=slice(None)):
+        """通貨の 月 × 指標 のDataFrame（値が全て欠損の行・列は除く）"""
+        tag_list = self.tags if tags is None else [t for t in tags if t in self._tag_pos]
+        matrix = self.currency_matrix(currency, months)[self.tag_positions(tag_list)] if tag_list else np.empty((0, 0))
+        frame = pd.DataFrame(matrix.T, index=pd.DatetimeIndex(self.months[months]), columns=tag_list)
+        return frame.dropna(how='all').dropna(axis=1, how='all')
+
+    def save(self, directory):
+        """メモリマップ可能な形式（.npy + メタデータJSON）で保存（一時ディレクトリから置き換え）"""
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = os.path.join(parent, f".{os.path.basename(directory)}.{os.getpid()}.{threading.get_ident()}.tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        try:
+            np.save(os.path.join(tmp_dir, 'values.npy'), self.values)
+            np.save(os.path.join(tmp_dir, 'counts.npy'), self.counts)
+            meta = {
+                'value_type': self.value_type,
+                'currencies': self.currencies,
+                'tags': self.tags,
+                'months': [str(m) for m in self.months]
+            }
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(tmp_dir, directory)
+        except OSError:
+            # 他のプロセスが先に同じパネルを保存した場合など
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.isdir(directory):
+                raise
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        """保存済みパネルを読み込み（既定では読み取り専用のメモリマップ）"""
+        with open(os.path.join(directory, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        values = np.load(os.path.join(directory, 'values.npy'), mmap_mode=mmap_mode)
+        counts = np.load(os.path.join(directory, 'counts.npy'), mmap_mode=mmap_mode)
+        months = np.array(meta['months'], dtype='datetime64[M]')
+        return cls(meta['currencies'], meta['tags'], months, values, counts, meta['value_type'])
+
+
+def panel_cache_key(data_version, value_type, importance=None):
+    """パネルのディスクキャッシュ用ディレクトリ名"""
+    importance_key = '-'.join(sorted(importance)) if importance else 'all'
+    return f"{data_version}_{value_type}_{importance_key}"
+
+
+def load_or_build_panel(df, cache_dir, data_version, value_type, importance=None):
+    """ディスクキャッシュにあればメモリマップで読み込み、なければ作成して保存"""
+    if cache_dir is None or data_version is None:
+        return MonthlyPanel.from_frame(_filter_importance(df, importance), value_type)
+
+    directory = os.path.join(cache_dir, panel_cache_key(data_version, value_type, importance))
+    if os.path.isdir(directory):
+        try:
+            return MonthlyPanel.load(directory)
+        except (OSError, ValueError, KeyError):
+            shutil.rmtree(directory, ignore_errors=True)
+
+    panel = MonthlyPanel.from_frame(_filter_importance(df, importance), value_type)
+    try:
+        panel.save(directory)
+    except OSError:
+        pass
+    return panel
+
+
+def remove_stale_panels(cache_dir, keep_versions):
+    """keep_versions に含まれないデータバージョンのパネルを削除（削除したパネルの数を返す）
+
+    参照中のセッションがある版のパネルを消さないよう、データ（スナップショット）の削除に合わせて呼ぶ。
+    """
+    if not os.path.isdir(cache_dir):
+        return 0
+    keep = {str(version) for version in keep_versions}
+    removed = 0
+    for name in os.listdir(cache_dir):
+        if name.startswith('.') or name.partition('_')[0] in keep:
+            continue
+        shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+        removed += 1
+    return removed
+
+
+def _filter_importance(df, importance):
+    """重要度で絞り込み"""
+    if importance is None or 'importance' not in df.columns:
+        return df
+    return df[df['importance'].isin(list(importance))]
@@ -0,0 +1,97 @@
+"""
+ページ単位のテーブル表示（並べ替え・ページ分割をサーバー側で行い、表示するページのみ返す）
+"""
+
+import numpy as np
+import pandas as pd
+
+from series_index import slice_date_range
+
+# 1ページあたりの行数の選択肢と既定値
+PAGE_SIZE_OPTIONS = [25, 50, 100, 200]
+DEFAULT_PAGE_SIZE = 50
+
+
+def sort_order(frame, sort_column='date', ascending=False):
+    """表示順の行位置を取得
+
+    frameは日付昇順であることを前提とし、日付での並べ替えは位置をそのまま（降順は逆順に）使う。
+    その他の列は安定ソートのため、同じ値の行は日付順のまま並ぶ。欠損値は常に末尾。
+    """
+    n = len(frame)
+    if sort_column == 'date' or sort_column not in frame.columns:
+        return np.arange(n) if ascending else np.arange(n - 1, -1, -1)
+
+    values = frame[sort_column]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # カテゴリ列はカテゴリの登録順ではなく名前順に並べる
+        values = values.astype(str)
+    values = pd.Series(values.to_numpy())
+    if not ascending:
+        # 降順でも同じ値の行は新しい日付を先にする
+        values = values.iloc[::-1]
+    return values.sort_values(ascending=ascending, kind='mergesort', na_position='last').index.to_numpy()
+
+
+def page_count(total_rows, page_size):
+    """ページ数（0件でも1ページ）"""
+    return max(1, -(-total_rows // page_size))
+
+
+class FrameRows:
+    """日付昇順のDataFrameを行の取得元として扱う（sqlite_store.ReleaseQuery と同じ操作）"""
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.columns = list(frame.columns)
+
+    def __len__(self):
+        return len(self.frame)
+
+    def recent(self, limit=50):
+        """新しい順に最大limit件"""
+        return self.frame.iloc[::-1].head(limit)
+
+    def date_bounds(self):
+        """最初と最後の日付（該当なしは (None, None)）"""
+        if self.frame.empty:
+            return None, None
+        return self.frame['date'].iloc[0], self.frame['date'].iloc[-1]
+
+    def between(self, start_date, end_date):
+        """期間 [start_date, end_date] に絞り込んだ取得元（二分探索で連続スライスを取得）"""
+        return FrameRows(slice_date_range(self.frame, start_date, end_date))
+
+    def rows(self, columns, sort_column='date', ascending=False, offset=0, limit=None):
+        """並べ替えた行の一部を取得"""
+        order = sort_order(self.frame, sort_column, ascending)
+        stop = len(order) if limit is None else offset + limit
+        column_positions = [self.frame.columns.get_loc(col) for col in columns if col in self.frame.columns]
+        return self.frame.iloc[order[offset:stop], column_positions]
+
+
+def table_page(source, columns, page=1, page_size=DEFAULT_PAGE_SIZE, sort_column='date', ascending=False):
+    """指定ページの行とページ情報を取得（返す行数はページサイズ以下で一定）
+
+    sourceはDataFrame（日付昇順）または FrameRows・ReleaseQuery などの行の取得元。
+    """
+    if isinstance(source, pd.DataFrame):
+        source = FrameRows(source)
+    total_rows = len(source)
+    pages = page_count(total_rows, page_size)
+    page = min(max(1, int(page)), pages)
+
+    start = (page - 1) * page_size
+    stop = min(start + page_size, total_rows)
+    rows = source.rows(columns, sort_column, ascending, offset=start, limit=stop - start)
+
+    return rows, {
+        'total_rows': total_rows,
+        'page': page,
+        'page_count': pages,
+        'page_size': page_size,
+        'start': start,
+        'stop': stop,
+        'sort_column': sort_column,
+        'ascending': ascending
+    }
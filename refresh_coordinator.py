@@ -0,0 +1,140 @@
+"""
+データ更新の調整（プロセス間ファイルロックとプロセス内の取得中月の重複排除）
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# ロック取得待ちの既定タイムアウト（秒）とポーリング間隔
+DEFAULT_LOCK_TIMEOUT = 300
+LOCK_POLL_INTERVAL = 0.1
+
+
+class FileLock:
+    """プロセス間の排他ロック（ロックファイルに対するflock）
+
+    同一プロセス内でもファイルを開くたびに別のロックとして扱われるため、
+    スレッド間の排他にも使える。
+    """
+
+    def __init__(self, path, timeout=DEFAULT_LOCK_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._file = None
+
+    def acquire(self, blocking=True):
+        """ロックを取得（取得できなければFalse）"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        lock_file = open(self.path, 'a+b')
+        deadline = time.monotonic() + (self.timeout if blocking else 0)
+        while True:
+            try:
+                _lock_nonblocking(lock_file)
+                self._file = lock_file
+                return True
+            except OSError:
+                if time.monotonic() >= deadline:
+                    lock_file.close()
+                    return False
+                time.sleep(LOCK_POLL_INTERVAL)
+
+    def release(self):
+        """ロックを解放"""
+        if self._file is None:
+            return
+        try:
+            _unlock(self._file)
+        finally:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        if not self.acquire():
+            raise TimeoutError(f"ロックを取得できませんでした: {self.path}")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+def _lock_nonblocking(lock_file):
+    """ノンブロッキングで排他ロック（取得できなければOSError）"""
+    if fcntl is not None:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+
+
+def _unlock(lock_file):
+    """排他ロックを解放"""
+    if fcntl is not None:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+    else:
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class RefreshCoordinator:
+    """同じ対象（月ごとのパーティションなど）の更新を1回に集約するコーディネーター
+
+    - プロセス内: 取得中の対象を記録し、後から来たスレッドは完了を待って取得を省略する
+    - プロセス間: 対象ごとのファイルロックで排他し、取得後に鮮度を再確認させる
+    """
+
+    def __init__(self, lock_dir, timeout=DEFAULT_LOCK_TIMEOUT):
+        self.lock_dir = lock_dir
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def lock_path(self, key):
+        """対象に対応するロックファイルのパス"""
+        return os.path.join(self.lock_dir, f"{key}.lock")
+
+    def lock(self, key):
+        """対象のプロセス間ロック（with文で使用）"""
+        return FileLock(self.lock_path(key), timeout=self.timeout)
+
+    @contextmanager
+    def claim(self, key):
+        """対象の更新権を取得（Trueなら呼び出し側が更新、Falseなら他の更新が完了済み）
+
+        Trueの場合も、ロック待ちの間に他プロセスが更新を終えている可能性があるため、
+        呼び出し側で鮮度を再確認すること。
+        """
+        with self._lock:
+            event = self._inflight.get(key)
+            owner = event is None
+            if owner:
+                event = threading.Event()
+                self._inflight[key] = event
+
+        if not owner:
+            # 同じプロセス内で取得中のスレッドがあれば、その完了を待つ
+            event.wait(self.timeout)
+            yield False
+            return
+
+        file_lock = FileLock(self.lock_path(key), timeout=self.timeout)
+        acquired = False
+        try:
+            acquired = file_lock.acquire()
+            yield acquired
+        finally:
+            if acquired:
+                file_lock.release()
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
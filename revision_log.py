@@ -0,0 +1,344 @@
+"""
+発表値の改定履歴（実績・予測・前回値の変化を追記専用のログに記録し、任意時点での値を復元）
+
+月ごとのファイルは更新のたびに上書きされるため、発表後に改定された値（次回発表の「前回値」として
+現れる）は元の値が残らない。取得した値が前回の記録から変わった場合のみ、
+(イベントID, 通貨, 発表日時, 項目) をキーに取得時刻付きの固定長レコード（28バイト）として追記する。
+
+読み込み時はキー・取得時刻順に並べた索引を作り、「ある時点での値」（as of）・速報値（最初の記録）・
+最新値をキーごとの位置の一括計算で取得する。ログへの追記分は次回の読み込み時に末尾だけ読み足す。
+
+コマンドラインから記録件数・照会時間を確認可能:
+    python revision_log.py --as-of 2024-01-01
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import REVISION_LOG_PATH
+from refresh_coordinator import FileLock
+
+# ファイル先頭の識別子（形式を変えた場合は番号を上げる）
+LOG_MAGIC = b'ECONREV1'
+
+# 記録する項目（レコードには位置を保存）
+REVISION_FIELDS = ['actual', 'forecast', 'previous']
+
+# 1レコードの形式（発表日時は1970-01-01からの分、取得時刻はUNIX秒）
+RECORD_DTYPE = np.dtype([
+    ('event_id', '<i4'),
+    ('currency', 'S3'),
+    ('field', 'u1'),
+    ('released', '<i4'),
+    ('fetched', '<i8'),
+    ('value', '<f8')
+])
+
+# 改定履歴から作る系列（チャートのオーバーレイ用、same_scale は SERIES_TRANSFORMS と同じ意味）
+REVISION_SERIES = {
+    'first_print': {'label': '速報値', 'same_scale': True},
+    'latest_revision': {'label': '最新改定値', 'same_scale': True},
+}
+
+_KEY_FIELDS = ['field', 'event_id', 'currency', 'released']
+
+
+def release_minutes(dates, times):
+    """発表日（datetime）と時刻（HH:MM、All Day などは0時扱い）を1970-01-01からの分に変換"""
+    days = pd.to_datetime(pd.Series(dates)).to_numpy().astype('datetime64[D]').astype(np.int64)
+    # 時刻の種類は少ないため、重複を除いてから変換する
+    codes, uniques = pd.factorize(pd.Series(times).astype(str))
+    parts = pd.Series(uniques).str.extract(r'^(\d{1,2}):(\d{2})$')
+    unique_minutes = (pd.to_numeric(parts[0], errors='coerce') * 60 + pd.to_numeric(parts[1], errors='coerce')).fillna(0)
+    minutes = np.append(unique_minutes.to_numpy(dtype=np.int64), 0)[codes]
+    return (days * 1440 + minutes).astype(np.int32)
+
+
+def frame_keys(frame):
+    """前処理済みのデータ（event_id・currency・date・time列）から (イベントID, 通貨, 発表日時) のキー配列を取得"""
+    times = frame['time'] if 'time' in frame.columns else pd.Series('', index=frame.index)
+    codes, uniques = pd.factorize(frame['currency'].astype(str))
+    currencies = np.append(pd.Series(uniques).str.encode('ascii', errors='replace').to_numpy().astype('S3'), b'')[codes]
+    return frame['event_id'].to_numpy(dtype=np.int32), currencies, release_minutes(frame['date'], times)
+
+
+def _pack_keys(fields, event_ids, currencies, released, currency_table):
+    """キーを1つの64ビット整数にまとめる（項目2ビット・通貨8ビット・イベントID22ビット・発表日時32ビット）"""
+    if len(currency_table) > 256 or (len(event_ids) and int(np.max(event_ids)) >= 1 << 22):
+        raise ValueError("改定履歴のキーが表現できる範囲を超えています")
+    currency_codes = np.searchsorted(currency_table, currencies).astype(np.uint64)
+    return (
+        (np.asarray(fields, dtype=np.uint64) << np.uint64(62))
+        | (currency_codes << np.uint64(54))
+        | (np.asarray(event_ids, dtype=np.uint64) << np.uint64(32))
+        | (np.asarray(released, dtype=np.int64).astype(np.uint64) & np.uint64(0xFFFFFFFF))
+    )
+
+
+class RevisionLog:
+    """改定履歴の追記専用ログ
+
+    ファイルは識別子に続けて RECORD_DTYPE のレコードを並べたもの。追記はファイルロック内で行い、
+    途中で中断された末尾の不完全なレコードは読み込み時に無視し、次の追記時に切り詰める。
+    """
+
+    def __init__(self, path=REVISION_LOG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records = np.empty(0, dtype=RECORD_DTYPE)
+        self._loaded_bytes = 0
+        self._index = None
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._records)
+
+    def version(self):
+        """ログのバージョン（ファイルサイズ、追記のたびに増える）"""
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def _refresh(self):
+        """前回読み込んだ位置以降に追記されたレコードを読み足す"""
+        size = self.version()
+        header = len(LOG_MAGIC)
+        if size <= max(self._loaded_bytes, header):
+            return
+        with open(self.path, 'rb') as f:
+            if self._loaded_bytes == 0:
+                if f.read(header) != LOG_MAGIC:
+                    raise ValueError(f"改定履歴ログの形式が正しくありません: {self.path}")
+                self._loaded_bytes = header
+            f.seek(self._loaded_bytes)
+            count = (size - self._loaded_bytes) // RECORD_DTYPE.itemsize
+            if count == 0:
+                return
+            tail = np.frombuffer(f.read(count * RECORD_DTYPE.itemsize), dtype=RECORD_DTYPE)
+        self._records = np.concatenate([self._records, tail])
+        self._loaded_bytes += count * RECORD_DTYPE.itemsize
+        self._index = None
+
+    def _sorted_index(self):
+        """キー・取得時刻順の並び順と、キーごとの先頭位置（読み足すたびに作り直す）"""
+        if self._index is None:
+            records = self._records
+            order = np.lexsort(tuple(records[name] for name in ['fetched', 'released', 'currency', 'event_id', 'field']))
+            ordered = records[order]
+            changed = np.zeros(len(ordered), dtype=bool)
+            changed[:1] = True
+            for name in _KEY_FIELDS:
+                changed[1:] |= ordered[name][1:] != ordered[name][:-1]
+            self._index = (ordered, np.flatnonzero(changed))
+        return self._index
+
+    def _positions(self, as_of=None, first=False):
+        """キーごとに使うレコードの位置（as_of時点で最新のもの、firstなら最初のもの、記録がなければ-1）"""
+        ordered, starts = self._sorted_index()
+        if len(ordered) == 0:
+            return ordered, starts
+        if first:
+            positions = starts.copy()
+        else:
+            candidates = np.arange(len(ordered))
+            if as_of is not None:
+                candidates = np.where(ordered['fetched'] <= int(as_of), candidates, -1)
+            positions = np.maximum.reduceat(candidates, starts)
+        if first and as_of is not None:
+            positions[ordered['fetched'][positions] > int(as_of)] = -1
+        return ordered, positions
+
+    def _select(self, field, as_of=None, first=False):
+        """項目のキーごとのレコード（as_of はUNIX秒、その時点までに記録された最新値。first なら速報値）"""
+        with self._lock:
+            self._refresh()
+            ordered, positions = self._positions(as_of, first)
+        if len(ordered) == 0:
+            return ordered
+        positions = positions[positions >= 0]
+        return ordered[positions[ordered['field'][positions] == REVISION_FIELDS.index(field)]]
+
+    def snapshot(self, field='actual', as_of=None, first=False):
+        """項目の値をキーごとに取得（as_of はUNIX秒、その時点までに記録された最新値。first なら速報値）
+
+        event_id・currency・released（発表日時の分）・value・fetched 列のDataFrameを返す。
+        """
+        selected = self._select(field, as_of, first)
+        return pd.DataFrame({
+            'event_id': selected['event_id'],
+            'currency': selected['currency'].astype(str),
+            'released': selected['released'],
+            'value': selected['value'],
+            'fetched': selected['fetched']
+        })
+
+    def lookup(self, frame, field='actual', as_of=None, first=False):
+        """前処理済みのデータの各行に対応する記録値を取得（frameの行順の配列、記録がなければNaN）"""
+        values = np.full(len(frame), np.nan)
+        selected = self._select(field, as_of, first)
+        if len(selected) == 0 or frame.empty:
+            return values
+        event_ids, currencies, released = frame_keys(frame)
+        currency_table = np.unique(np.concatenate([selected['currency'], currencies]))
+        known = _pack_keys(0, selected['event_id'], selected['currency'], selected['released'], currency_table)
+        matches = pd.Index(known).get_indexer(_pack_keys(0, event_ids, currencies, released, currency_table))
+        found = matches >= 0
+        values[found] = selected['value'][matches[found]]
+        return values
+
+    def record(self, frame, fetched_at=None):
+        """取得した前処理済みのデータのうち、記録済みの最新値から変わった値のみを追記（追記件数を返す）
+
+        値が欠損（未発表など）の項目は記録しない。同じキーの行が複数ある場合は最初の行を使う。
+        fetched_at はUNIX秒（省略時は現在時刻）、行ごとの配列も指定可能。
+        """
+        if frame.empty:
+            return 0
+        fetched = np.broadcast_to(np.asarray(int(time.time()) if fetched_at is None else fetched_at, dtype=np.int64), (len(frame),))
+        event_ids, currencies, released = frame_keys(frame)
+        first_rows = ~pd.Index(_pack_keys(0, event_ids, currencies, released, np.unique(currencies))).duplicated()
+
+        batches = []
+        for field_code, field in enumerate(REVISION_FIELDS):
+            if field not in frame.columns:
+                continue
+            values = pd.to_numeric(frame[field], errors='coerce').to_numpy(dtype=float)
+            mask = first_rows & ~np.isnan(values)
+            batch = np.zeros(int(mask.sum()), dtype=RECORD_DTYPE)
+            batch['event_id'] = event_ids[mask]
+            batch['currency'] = currencies[mask]
+            batch['field'] = field_code
+            batch['released'] = released[mask]
+            batch['fetched'] = fetched[mask]
+            batch['value'] = values[mask]
+            batches.append(batch)
+        if not batches:
+            return 0
+        batch = np.concatenate(batches)
+
+        with FileLock(f"{self.path}.lock"), self._lock:
+            # 他プロセスの追記分を取り込んでから、最新値と比較する
+            self._refresh()
+            batch = batch[self._changed(batch)]
+            if len(batch):
+                self._append(batch)
+        return len(batch)
+
+    def _changed(self, batch):
+        """記録済みの最新値と異なる（または未記録の）レコードのマスク"""
+        ordered, starts = self._sorted_index()
+        if len(ordered) == 0:
+            return np.ones(len(batch), dtype=bool)
+        latest = ordered[np.append(starts[1:], len(ordered)) - 1]
+        currency_table = np.unique(np.concatenate([latest['currency'], batch['currency']]))
+        known = _pack_keys(latest['field'], latest['event_id'], latest['currency'], latest['released'], currency_table)
+        matches = pd.Index(known).get_indexer(
+            _pack_keys(batch['field'], batch['event_id'], batch['currency'], batch['released'], currency_table)
+        )
+        changed = matches < 0
+        changed[~changed] = latest['value'][matches[~changed]] != batch['value'][~changed]
+        return changed
+
+    def _append(self, batch):
+        """レコードをファイル末尾に追記（ファイルロック内で呼ぶ）"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'ab') as f:
+            if f.tell() == 0:
+                f.write(LOG_MAGIC)
+            # 中断された追記の不完全なレコードを切り詰める
+            complete = len(LOG_MAGIC) + (f.tell() - len(LOG_MAGIC)) // RECORD_DTYPE.itemsize * RECORD_DTYPE.itemsize
+            if f.tell() != complete:
+                f.truncate(complete)
+            f.write(batch.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self._refresh()
+
+
+def partition_fetch_times(dates, data_dir="./data"):
+    """各行の月ごとのファイル（economic_data_YYYY-MM.csv）の更新時刻（UNIX秒、ファイルがなければ現在時刻）
+
+    既存データをログに初めて記録する際の取得時刻として使う。
+    """
+    months, uniques = pd.factorize(pd.Series(dates).dt.strftime('%Y-%m'))
+    now = int(time.time())
+    mtimes = []
+    for month in uniques:
+        try:
+            mtimes.append(int(os.path.getmtime(os.path.join(data_dir, f"economic_data_{month}.csv"))))
+        except OSError:
+            mtimes.append(now)
+    return np.append(np.asarray(mtimes, dtype=np.int64), now)[months]
+
+
+def revision_series(df, log, registry):
+    """前処理済みのデータ（日付昇順）の各行の速報値と最新改定値（dfと同じインデックスのDataFrame）
+
+    速報値はログに最初に記録された実績値。最新改定値は同じ指標（通貨・月情報を除いたイベント名）の
+    次回発表の前回値、次回発表がまだなければ最新の実績値。
+    """
+    result = pd.DataFrame(index=df.index, columns=list(REVISION_SERIES), dtype=float)
+    if df.empty:
+        return result
+    result['first_print'] = log.lookup(df, 'actual', first=True)
+
+    actual = pd.to_numeric(df['actual'], errors='coerce').to_numpy(dtype=float)
+    previous = pd.to_numeric(df['previous'], errors='coerce').to_numpy(dtype=float)
+    cleaned_ids = pd.factorize(np.asarray(registry.cleaned_events, dtype=object)[df['event_id'].to_numpy()])[0]
+    series = pd.MultiIndex.from_arrays([df['currency'].astype(str), cleaned_ids]).factorize()[0]
+
+    # 系列・発表日時順に並べ、同じ系列の次の行の前回値を取得（値のない行も前回値は持つ）
+    _, _, released = frame_keys(df)
+    order = np.lexsort((released, series))
+    same_series = series[order][1:] == series[order][:-1]
+    next_previous = np.full(len(df), np.nan)
+    next_previous[order[:-1][same_series]] = previous[order][1:][same_series]
+    result['latest_revision'] = np.where(np.isnan(next_previous), actual, next_previous)
+    return result
+
+
+def parse_args(argv=None):
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="改定履歴ログの記録件数・照会時間の確認")
+    parser.add_argument('--log-file', default=REVISION_LOG_PATH, help="改定履歴ログのパス")
+    parser.add_argument('--as-of', default=None, help="この日時点の値を照会（YYYY-MM-DD、省略時は最新）")
+    parser.add_argument('--field', default='actual', choices=REVISION_FIELDS, help="照会する項目")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.path.exists(args.log_file):
+        print(f"❌ 改定履歴ログがありません: {args.log_file}")
+        return 1
+
+    log = RevisionLog(args.log_file)
+    started = time.perf_counter()
+    count = len(log)
+    load_seconds = time.perf_counter() - started
+    as_of = int(pd.Timestamp(args.as_of).timestamp()) if args.as_of else None
+
+    started = time.perf_counter()
+    latest = log.snapshot(args.field, as_of)
+    query_seconds = time.perf_counter() - started
+    first = log.snapshot(args.field, as_of, first=True)
+    revised = int((first['value'].to_numpy() != latest['value'].to_numpy()).sum()) if len(first) == len(latest) else 0
+
+    print(f"📜 記録件数: {count:,}件（{log.version() / 1e6:.2f}MB、読み込み {load_seconds * 1000:.1f}ms）")
+    print(f"{args.field} {'最新' if as_of is None else args.as_of + '時点'}: {len(latest):,}キー"
+          f"（照会 {query_seconds * 1000:.1f}ms、速報値から改定されたキー {revised:,}件）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
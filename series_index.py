@@ -0,0 +1,86 @@
+"""
+系列インデックス（日付ソート済みスライスと二分探索による期間検索）
+"""
+
+import numpy as np
+
+
+def date_range_bounds(dates, start_date, end_date):
+    """日付昇順のdatetime64配列から期間 [start_date, end_date] の位置範囲を二分探索で取得"""
+    # 終了日はその日の終わりまで含める（翌日0時の手前まで）
+    start = np.datetime64(start_date, 'D')
+    stop = np.datetime64(end_date, 'D') + np.timedelta64(1, 'D')
+    lo = int(dates.searchsorted(start, side='left'))
+    hi = int(dates.searchsorted(stop, side='left'))
+    return lo, max(lo, hi)
+
+
+def slice_date_range(frame, start_date, end_date):
+    """日付昇順のDataFrameから期間内の行を連続スライスとして取得"""
+    lo, hi = date_range_bounds(frame['date'].to_numpy(), start_date, end_date)
+    return frame.iloc[lo:hi]
+
+
+class SeriesIndex:
+    """(currency, data_tag) ごとの行位置を保持する系列インデックス
+
+    元データは日付昇順にソート済みであることを前提とする。行位置も昇順で
+    保持しているため、複数系列を結合しても日付順は崩れない。
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self._positions = {}
+        self._keys_by_currency = {}
+        self._keys_by_tag = {}
+
+        if df.empty:
+            return
+
+        groups = df.groupby(['currency', 'data_tag'], sort=False, observed=True).indices
+        for key, positions in groups.items():
+            currency, tag = key
+            self._positions[key] = np.asarray(positions, dtype=np.int64)
+            self._keys_by_currency.setdefault(currency, []).append(key)
+            self._keys_by_tag.setdefault(tag, []).append(key)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def keys(self, currencies=None, tags=None):
+        """条件に一致する (currency, data_tag) キーを取得"""
+        if currencies is None and tags is None:
+            return list(self._positions)
+
+        if currencies is not None:
+            keys = [key for c in currencies for key in self._keys_by_currency.get(c, [])]
+            if tags is not None:
+                tag_set = set(tags)
+                keys = [key for key in keys if key[1] in tag_set]
+            return keys
+
+        return [key for t in tags for key in self._keys_by_tag.get(t, [])]
+
+    def positions(self, currencies=None, tags=None):
+        """条件に一致する行位置を日付昇順で取得"""
+        arrays = [self._positions[key] for key in self.keys(currencies, tags)]
+        if not arrays:
+            return np.empty(0, dtype=np.int64)
+        if len(arrays) == 1:
+            return arrays[0]
+        # 各系列の行位置は昇順なので、結合後にソートすれば日付順になる
+        return np.sort(np.concatenate(arrays), kind='mergesort')
+
+    def series(self, currency, tag):
+        """単一系列を日付昇順で取得"""
+        positions = self._positions.get((currency, tag))
+        if positions is None:
+            return self.df.iloc[0:0]
+        return self.df.iloc[positions]
+
+    def table(self, currencies=None, tags=None, importance=None):
+        """複数系列を結合したテーブルを日付昇順で取得（重要度での絞り込みにも対応）"""
+        table = self.df.iloc[self.positions(currencies, tags)]
+        if importance is not None and 'importance' in table.columns:
+            table = table[table['importance'].isin(importance)]
+        return table
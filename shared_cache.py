@@ -0,0 +1,683 @@
+"""
+ノード間の共有キャッシュ（複数のホストで同じデータバージョンの処理結果を再利用し、データ更新は1ノードのみが実行）
+
+ロードバランサー配下の各ホストがそれぞれ取得・タグ付け・図の作成を行わないよう、データバージョン
+（スナップショットの版のID）をキーに次のものを共有する:
+- snapshot: スナップショットの統合CSV・月ごとのファイル（ZIP）と、最新の版のID（current）
+- dataset / series_index: 前処理済みのデータと系列インデックス
+- figure: 作成済みの図のJSON
+
+実装は Redis プロトコル（RESP）を話す RedisCache と、共有マウント上のディレクトリを使う FileSystemCache。
+Redis のクライアントライブラリには依存せず、使うコマンド（GET・SET・DEL・PEXPIRE・WATCH/MULTI/EXEC）のみを送る。
+動作確認用に同じコマンドを実装したスタンドインサーバー（RespStandInServer）を含む。
+
+リーダー選出（LeaderLease）は期限付きのリースで、保持しているノードのみがデータを更新する。
+保持ノードが停止するなどして延長されなくなると、期限切れ後に他のノードが引き継ぐ。
+
+値は pickle で保存するため、信頼できるノードのみが書き込めるキャッシュを使うこと。
+
+コマンドラインから:
+    python shared_cache.py serve --port 6390                    # スタンドインサーバーを起動
+    python shared_cache.py check redis://localhost:6390/0       # 読み書き・リースの確認と往復時間の計測
+    python shared_cache.py check /mnt/shared/economic-cache     # 共有マウントのディレクトリ
+"""
+
+import argparse
+import os
+import pickle
+import socket
+import socketserver
+import statistics
+import sys
+import threading
+import time
+import uuid
+import zlib
+from contextlib import contextmanager
+from urllib.parse import quote, unquote, urlparse
+
+from atomic_io import atomic_write_bytes
+from config import SHARED_CACHE_NAMESPACE
+from refresh_coordinator import FileLock
+
+# 接続・応答待ちのタイムアウト（秒）
+SOCKET_TIMEOUT = 5.0
+
+# 保持する接続数の上限（それ以上の同時利用分は使用後に閉じる）
+POOL_SIZE = 8
+
+
+class SharedCacheError(Exception):
+    """共有キャッシュの読み書きの失敗（接続できない・応答がエラーなど）"""
+
+
+class SharedCache:
+    """共有キャッシュの共通部分（キーの名前空間・値の変換・統計）
+
+    各実装は get / set / delete と、リースの acquire_lease / release_lease を提供する。
+    """
+
+    def __init__(self, namespace=SHARED_CACHE_NAMESPACE):
+        self.namespace = namespace
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'errors': 0}
+        self._stats_lock = threading.Lock()
+
+    def key(self, *parts):
+        """名前空間付きのキー（例: economic:series_index:<版>）"""
+        return ":".join([self.namespace, *(str(part) for part in parts)])
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def get(self, key):
+        """値（バイト列）を取得（なければNone）"""
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        """値（バイト列）を保存（ttl 秒後に期限切れ、Noneなら無期限）"""
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def acquire_lease(self, name, owner, ttl):
+        """リースを取得または延長（他の所有者が期限内で保持していればFalse）"""
+        raise NotImplementedError
+
+    def release_lease(self, name, owner):
+        """自分が保持しているリースを解放"""
+        raise NotImplementedError
+
+    def purge(self):
+        """期限切れの値を削除（期限切れを自動で削除する実装では何もしない）"""
+        return 0
+
+    def get_object(self, key):
+        """pickle で保存した値を取得（なければNone）"""
+        try:
+            data = self.get(key)
+        except SharedCacheError:
+            self._count('errors')
+            raise
+        if data is None:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return pickle.loads(zlib.decompress(data))
+
+    def set_object(self, key, value, ttl=None):
+        """値を pickle（圧縮）して保存"""
+        data = zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), 1)
+        try:
+            self.set(key, data, ttl)
+        except SharedCacheError:
+            self._count('errors')
+            raise
+        self._count('writes')
+
+
+class RespConnection:
+    """Redis プロトコル（RESP2）の1本の接続"""
+
+    def __init__(self, host, port, timeout=SOCKET_TIMEOUT):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile('rb')
+
+    def command(self, *args):
+        """コマンドを送って応答を返す（エラー応答は SharedCacheError）"""
+        self.sock.sendall(encode_command(args))
+        reply = read_reply(self.reader)
+        if isinstance(reply, RespError):
+            raise SharedCacheError(str(reply))
+        return reply
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RespError(str):
+    """RESP のエラー応答"""
+
+
+def encode_command(args):
+    """コマンドを RESP の配列（バルク文字列）にエンコード"""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode('utf-8')
+        elif not isinstance(arg, bytes):
+            arg = str(arg).encode('ascii')
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+def read_reply(reader):
+    """RESP の応答を1つ読み込む"""
+    line = reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("接続が閉じられました")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body.decode('utf-8')
+    if kind == b"-":
+        return RespError(body.decode('utf-8'))
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        data = reader.read(length + 2)
+        if len(data) != length + 2:
+            raise ConnectionError("接続が閉じられました")
+        return data[:-2]
+    if kind == b"*":
+        count = int(body)
+        if count < 0:
+            return None
+        return [read_reply(reader) for _ in range(count)]
+    raise SharedCacheError(f"不正な応答です: {line[:40]!r}")
+
+
+class RedisCache(SharedCache):
+    """Redis（または同じプロトコルのサーバー）を使う共有キャッシュ
+
+    url は redis://[:パスワード@]ホスト:ポート/DB番号。接続はスレッド間で使い回す。
+    """
+
+    def __init__(self, url, namespace=SHARED_CACHE_NAMESPACE, timeout=SOCKET_TIMEOUT):
+        super().__init__(namespace)
+        parsed = urlparse(url)
+        if parsed.scheme != 'redis':
+            raise ValueError(f"redis:// のURLを指定してください: {url}")
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self._pool = []
+        self._pool_lock = threading.Lock()
+
+    def _connect(self):
+        conn = RespConnection(self.host, self.port, self.timeout)
+        try:
+            if self.password:
+                conn.command("AUTH", self.password)
+            if self.db:
+                conn.command("SELECT", self.db)
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """プールの接続を借りる（通信エラーの接続は捨てて SharedCacheError に変換）"""
+        with self._pool_lock:
+            conn = self._pool.pop() if self._pool else None
+        try:
+            if conn is None:
+                conn = self._connect()
+            yield conn
+        except (OSError, ValueError) as e:
+            if conn is not None:
+                conn.close()
+            raise SharedCacheError(f"{self.host}:{self.port} との通信に失敗しました: {e}") from e
+        except BaseException:
+            # 応答の途中で中断した可能性があるため、接続は再利用しない
+            if conn is not None:
+                conn.close()
+            raise
+        else:
+            with self._pool_lock:
+                if len(self._pool) < POOL_SIZE:
+                    self._pool.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    def execute(self, *args):
+        with self.connection() as conn:
+            return conn.command(*args)
+
+    def get(self, key):
+        return self.execute("GET", key)
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            self.execute("SET", key, value)
+        else:
+            self.execute("SET", key, value, "PX", int(ttl * 1000))
+
+    def delete(self, key):
+        self.execute("DEL", key)
+
+    def acquire_lease(self, name, owner, ttl):
+        key = self.key("lease", name)
+        ttl_ms = int(ttl * 1000)
+        with self.connection() as conn:
+            if conn.command("SET", key, owner, "NX", "PX", ttl_ms) == "OK":
+                return True
+            # 自分のリースなら延長（確認から延長までの間に他の所有者に移っていれば EXEC が失敗する）
+            conn.command("WATCH", key)
+            if conn.command("GET", key) != owner.encode('utf-8'):
+                conn.command("UNWATCH")
+                return False
+            conn.command("MULTI")
+            conn.command("PEXPIRE", key, ttl_ms)
+            return conn.command("EXEC") is not None
+
+    def release_lease(self, name, owner):
+        key = self.key("lease", name)
+        with self.connection() as conn:
+            conn.command("WATCH", key)
+            if conn.command("GET", key) != owner.encode('utf-8'):
+                conn.command("UNWATCH")
+                return
+            conn.command("MULTI")
+            conn.command("DEL", key)
+            conn.command("EXEC")
+
+    def close(self):
+        with self._pool_lock:
+            pool, self._pool = self._pool, []
+        for conn in pool:
+            conn.close()
+
+
+class FileSystemCache(SharedCache):
+    """共有マウント上のディレクトリを使う共有キャッシュ
+
+    キーごとに1ファイル（先頭8バイトに期限のUNIX秒、0なら無期限）を置き換えで書き込む。
+    リースはファイルロック（flock）で排他して読み書きするため、ロックに対応したマウント（NFSv4など）が必要。
+    """
+
+    def __init__(self, root, namespace=SHARED_CACHE_NAMESPACE):
+        super().__init__(namespace)
+        self.root = root
+
+    def path(self, key):
+        return os.path.join(self.root, quote(key, safe=''))
+
+    def _read(self, path):
+        """ファイルの値（期限切れ・なしならNone）"""
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        expires = int.from_bytes(data[:8], 'big') / 1000
+        if expires and expires < time.time():
+            return None
+        return data[8:]
+
+    def _write(self, path, value, ttl):
+        expires = int((time.time() + ttl) * 1000) if ttl is not None else 0
+        os.makedirs(self.root, exist_ok=True)
+        atomic_write_bytes(path, expires.to_bytes(8, 'big') + value)
+
+    def get(self, key):
+        try:
+            return self._read(self.path(key))
+        except OSError as e:
+            raise SharedCacheError(f"共有キャッシュの読み込みに失敗しました: {e}") from e
+
+    def set(self, key, value, ttl=None):
+        try:
+            self._write(self.path(key), value, ttl)
+        except OSError as e:
+            raise SharedCacheError(f"共有キャッシュへの書き込みに失敗しました: {e}") from e
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            raise SharedCacheError(f"共有キャッシュの削除に失敗しました: {e}") from e
+
+    @contextmanager
+    def _lease_lock(self, name):
+        try:
+            with FileLock(os.path.join(self.root, ".locks", f"{quote(name, safe='')}.lock")):
+                yield self.path(self.key("lease", name))
+        except (OSError, TimeoutError) as e:
+            raise SharedCacheError(f"リースのロックに失敗しました: {e}") from e
+
+    def acquire_lease(self, name, owner, ttl):
+        with self._lease_lock(name) as path:
+            current = self._read(path)
+            if current is not None and current != owner.encode('utf-8'):
+                return False
+            self._write(path, owner.encode('utf-8'), ttl)
+            return True
+
+    def release_lease(self, name, owner):
+        with self._lease_lock(name) as path:
+            if self._read(path) == owner.encode('utf-8'):
+                os.remove(path)
+
+    def purge(self):
+        """期限切れのファイルを削除（削除した件数を返す）"""
+        removed = 0
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return removed
+        for name in names:
+            path = os.path.join(self.root, name)
+            if name.startswith('.') or not os.path.isfile(path):
+                continue
+            try:
+                if self._read(path) is None:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+def open_shared_cache(url, namespace=SHARED_CACHE_NAMESPACE):
+    """URL（redis://…）またはディレクトリ（file://… もしくはパス）から共有キャッシュを作成"""
+    if url.startswith("redis://"):
+        return RedisCache(url, namespace)
+    if url.startswith("file://"):
+        url = unquote(urlparse(url).path)
+    return FileSystemCache(url, namespace)
+
+
+class LeaderLease:
+    """期限付きリースによるリーダー選出（保持しているノードのみが更新を行う）
+
+    acquire を呼ぶたびに、未保持・期限切れなら取得し、保持中なら延長する。共有キャッシュに
+    接続できない場合は、他のノードと調整できないため各ノードがリーダーとして振る舞う。
+    """
+
+    def __init__(self, cache, name, ttl, owner=None):
+        self.cache = cache
+        self.name = name
+        self.ttl = ttl
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.last_error = None
+
+    def acquire(self):
+        """リーダーならTrue"""
+        try:
+            leading = self.cache.acquire_lease(self.name, self.owner, self.ttl)
+        except SharedCacheError as e:
+            self.last_error = e
+            return True
+        self.last_error = None
+        return leading
+
+    def release(self):
+        try:
+            self.cache.release_lease(self.name, self.owner)
+        except SharedCacheError:
+            pass
+
+
+class RespStandInServer(socketserver.ThreadingTCPServer):
+    """動作確認用の Redis 互換サーバー（共有キャッシュが使うコマンドのみ、データはメモリ上）
+
+    WATCH したキーが EXEC までに変更・期限切れになればトランザクションは失敗する（Redis と同じ）。
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=("localhost", 0)):
+        super().__init__(address, _RespHandler)
+        self.databases = {}
+        self.lock = threading.Lock()
+        self._revision = 0
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start(self):
+        """別スレッドで応答を開始（停止は shutdown）"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def touch(self, db, key):
+        """キーの変更を記録（ロック内で呼ぶ）"""
+        self._revision += 1
+        db['revisions'][key] = self._revision
+
+    def entry(self, db, key):
+        """有効な値（期限切れは削除して変更として記録、ロック内で呼ぶ）"""
+        item = db['values'].get(key)
+        if item is not None and item[1] is not None and item[1] <= time.monotonic():
+            del db['values'][key]
+            self.touch(db, key)
+            item = None
+        return item
+
+    def database(self, number):
+        return self.databases.setdefault(number, {'values': {}, 'revisions': {}})
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        self.db = server.database(0)
+        self.watched = None
+        self.queued = None
+        while True:
+            try:
+                args = read_reply(self.rfile)
+            except (ConnectionError, OSError, ValueError):
+                return
+            if not isinstance(args, list) or not args:
+                self.reply(RespError("ERR Protocol error"))
+                return
+            name = args[0].decode('ascii', 'replace').upper()
+            if name == "QUIT":
+                self.reply("OK")
+                return
+            if self.queued is not None and name not in ("EXEC", "DISCARD", "MULTI", "WATCH"):
+                self.queued.append(args)
+                self.reply("QUEUED")
+                continue
+            with server.lock:
+                reply = self.dispatch(name, args[1:])
+            self.reply(reply)
+
+    def dispatch(self, name, args):
+        """コマンドを実行して応答を返す（サーバーのロック内）"""
+        server = self.server
+        if name == "MULTI":
+            if self.queued is not None:
+                return RespError("ERR MULTI calls can not be nested")
+            self.queued = []
+            return "OK"
+        if name == "EXEC":
+            if self.queued is None:
+                return RespError("ERR EXEC without MULTI")
+            queued, self.queued = self.queued, None
+            watched, self.watched = self.watched, None
+            if watched:
+                for key, revision in watched.items():
+                    server.entry(self.db, key)
+                    if self.db['revisions'].get(key, 0) != revision:
+                        return None
+            return [self.dispatch(args[0].decode('ascii', 'replace').upper(), args[1:]) for args in queued]
+        if name == "DISCARD":
+            self.queued = None
+            self.watched = None
+            return "OK"
+        if name == "WATCH":
+            if self.queued is not None:
+                return RespError("ERR WATCH inside MULTI is not allowed")
+            self.watched = self.watched or {}
+            for key in args:
+                server.entry(self.db, key)
+                self.watched[key] = self.db['revisions'].get(key, 0)
+            return "OK"
+        if name == "UNWATCH":
+            self.watched = None
+            return "OK"
+        if name == "PING":
+            return args[0] if args else "PONG"
+        if name == "AUTH":
+            return "OK"
+        if name == "SELECT":
+            self.db = server.database(int(args[0]))
+            return "OK"
+        if name == "GET":
+            item = server.entry(self.db, args[0])
+            return None if item is None else item[0]
+        if name == "SET":
+            return self.set(args)
+        if name == "DEL":
+            removed = 0
+            for key in args:
+                if server.entry(self.db, key) is not None:
+                    del self.db['values'][key]
+                    server.touch(self.db, key)
+                    removed += 1
+            return removed
+        if name in ("PEXPIRE", "EXPIRE"):
+            item = server.entry(self.db, args[0])
+            if item is None:
+                return 0
+            ttl = int(args[1]) / (1000 if name == "PEXPIRE" else 1)
+            self.db['values'][args[0]] = (item[0], time.monotonic() + ttl)
+            server.touch(self.db, args[0])
+            return 1
+        if name == "PTTL":
+            item = server.entry(self.db, args[0])
+            if item is None:
+                return -2
+            return -1 if item[1] is None else int((item[1] - time.monotonic()) * 1000)
+        if name == "DBSIZE":
+            return sum(server.entry(self.db, key) is not None for key in list(self.db['values']))
+        if name == "FLUSHDB":
+            for key in list(self.db['values']):
+                server.touch(self.db, key)
+            self.db['values'].clear()
+            return "OK"
+        return RespError(f"ERR unknown command '{name}'")
+
+    def set(self, args):
+        server = self.server
+        key, value = args[0], args[1]
+        options = [arg.decode('ascii').upper() for arg in args[2:]]
+        expires = None
+        if "PX" in options:
+            expires = time.monotonic() + int(options[options.index("PX") + 1]) / 1000
+        elif "EX" in options:
+            expires = time.monotonic() + int(options[options.index("EX") + 1])
+        exists = server.entry(self.db, key) is not None
+        if ("NX" in options and exists) or ("XX" in options and not exists):
+            return None
+        self.db['values'][key] = (value, expires)
+        server.touch(self.db, key)
+        return "OK"
+
+    def reply(self, value):
+        self.wfile.write(encode_reply(value))
+        self.wfile.flush()
+
+
+def encode_reply(value):
+    """応答を RESP にエンコード"""
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, RespError):
+        return b"-%s\r\n" % value.encode('utf-8')
+    if isinstance(value, str):
+        return b"+%s\r\n" % value.encode('utf-8')
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    return b"*%d\r\n" % len(value) + b"".join(encode_reply(item) for item in value)
+
+
+def check(url, size, repeat):
+    """読み書き・期限・リースを確認し、値の大きさごとの往復時間を表示"""
+    cache = open_shared_cache(url, namespace=f"check-{uuid.uuid4().hex[:8]}")
+    key = cache.key("value")
+    payload = os.urandom(size)
+    cache.set(key, payload, ttl=60)
+    if cache.get(key) != payload:
+        raise SharedCacheError("書き込んだ値を読み込めませんでした")
+    writes, reads = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        cache.set(key, payload, ttl=60)
+        writes.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        cache.get(key)
+        reads.append(time.perf_counter() - started)
+    cache.delete(key)
+    print(f"✅ 読み書き: {size / 1024:.0f}KB 書き込み {statistics.median(writes) * 1000:.2f}ms"
+          f" / 読み込み {statistics.median(reads) * 1000:.2f}ms（中央値）")
+
+    cache.set(key, b"x", ttl=0.2)
+    time.sleep(0.3)
+    if cache.get(key) is not None:
+        raise SharedCacheError("期限切れの値が残っています")
+    print("✅ 期限切れ")
+
+    first = LeaderLease(cache, "check", ttl=0.5, owner="node-a")
+    second = LeaderLease(cache, "check", ttl=0.5, owner="node-b")
+    results = [first.acquire(), second.acquire(), first.acquire()]
+    time.sleep(0.6)
+    results += [second.acquire(), first.acquire()]
+    second.release()
+    results.append(first.acquire())
+    first.release()
+    if results != [True, False, True, True, False, True]:
+        raise SharedCacheError(f"リースの取得結果が想定と異なります: {results}")
+    print("✅ リーダー選出（取得・延長・期限切れ後の引き継ぎ・解放）")
+
+
+def parse_args(argv=None):
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="ノード間の共有キャッシュ（スタンドインサーバー / 動作確認）")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve = subparsers.add_parser('serve', help="Redis 互換のスタンドインサーバーを起動")
+    serve.add_argument('--host', default="localhost")
+    serve.add_argument('--port', type=int, default=6390)
+    checker = subparsers.add_parser('check', help="共有キャッシュの読み書き・リースを確認")
+    checker.add_argument('url', help="redis://ホスト:ポート/DB番号 または共有ディレクトリ")
+    checker.add_argument('--size', type=int, default=1024 * 1024, help="往復時間を計測する値の大きさ（バイト）")
+    checker.add_argument('--repeat', type=int, default=20)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'serve':
+        server = RespStandInServer((args.host, args.port))
+        print(f"🧪 スタンドインサーバーを起動しました: {server.url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return 0
+
+    try:
+        check(args.url, args.size, args.repeat)
+    except SharedCacheError as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
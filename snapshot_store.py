@@ -0,0 +1,285 @@
+"""
+データのスナップショット（更新ごとに不変のディレクトリとして公開し、読み込み側は公開済みの版を固定して参照）
+
+更新処理は新しいディレクトリに統合CSVを書き、月ごとのファイルをハードリンクで加えてから
+ディレクトリ名の変更で公開し、最後に CURRENT（現在の版を指すファイル）を置き換える。
+読み込み側は実行の開始時に CURRENT の版を固定（ピン留め）するため、更新中の不完全なファイルや、
+実行の途中で別の版に切り替わったデータを見ることはない。
+
+ピン留めはプロセスごとのリースファイルで他のプロセスにも見えるようにし、ピン留めのない古い版は
+猶予時間の経過後に削除する。最大保持時間を過ぎた版は、ピン留めが残っていても削除する。
+
+版はZIPにまとめて他のノードに渡せる（pack / adopt）。取り込んだ版は同じ版のIDで公開される。
+"""
+
+import io
+import json
+import os
+import shutil
+import threading
+import time
+import zipfile
+
+from atomic_io import atomic_write_bytes
+from config import SNAPSHOT_DIR, SNAPSHOT_GRACE, SNAPSHOT_KEEP, SNAPSHOT_MAX_AGE
+from refresh_coordinator import FileLock
+
+# スナップショット内の統合CSVのファイル名
+COMBINED_FILE = "economic_data.csv"
+
+# 現在の版を指すファイル名とメタ情報のファイル名
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+
+
+def link_or_copy(source, target):
+    """ハードリンクを作成（ファイルシステムが対応していなければコピー）"""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def _process_alive(pid):
+    """プロセスが存在するか（確認できない環境では存在するものとみなす）"""
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError, ValueError):
+        return True
+    return True
+
+
+class SnapshotStore:
+    """不変のスナップショットの公開・ピン留め・削除
+
+    版のIDは公開時刻（ナノ秒）の20桁の文字列で、文字列の順序が公開順になる。
+    """
+
+    def __init__(self, root=SNAPSHOT_DIR, keep=SNAPSHOT_KEEP, grace=SNAPSHOT_GRACE, max_age=SNAPSHOT_MAX_AGE):
+        self.root = root
+        self.keep = keep
+        self.grace = grace
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._session_pins = {}
+        self._pin_counts = {}
+
+    def _lease_dir(self):
+        return os.path.join(self.root, ".leases")
+
+    def _lease_path(self, version, pid=None):
+        return os.path.join(self._lease_dir(), f"{version}.{os.getpid() if pid is None else pid}")
+
+    def directory(self, version):
+        """版のディレクトリ"""
+        return os.path.join(self.root, version)
+
+    def path(self, version, filename=COMBINED_FILE):
+        """版に含まれるファイルのパス"""
+        return os.path.join(self.directory(version), filename)
+
+    def current(self):
+        """現在公開中の版（未公開ならNone）"""
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE), 'r', encoding='utf-8') as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def versions(self):
+        """公開済みの版（公開順）"""
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return []
+        return sorted(name for name in names if name.isdigit() and os.path.isdir(os.path.join(self.root, name)))
+
+    def manifest(self, version):
+        """版のメタ情報（公開時刻・ファイル一覧）"""
+        with open(self.path(version, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    @staticmethod
+    def published_at(version):
+        """版の公開時刻（UNIX秒）"""
+        return int(version) / 1e9
+
+    def publish(self, write_combined, partitions=(), version=None):
+        """新しい版を公開して現在の版にする（版のIDを返す）
+
+        partitions の月ごとのファイルはハードリンクで版に含める（元のファイルは置き換えで更新されるため
+        内容は変わらない）。write_combined は統合CSVの書き込み先パスと、版に含めた月ごとのファイルの
+        パスを受け取って書き込む関数で、月ごとのファイルから統合する場合は後者を読めば版の内容と一致する。
+        version を指定すると、その版のIDで公開する（他のノードの版の取り込み用）。
+        """
+        os.makedirs(self.root, exist_ok=True)
+        version = version or f"{time.time_ns():020d}"
+        staging = os.path.join(self.root, f".{version}.tmp")
+        os.makedirs(staging)
+        try:
+            names = []
+            for source in partitions:
+                name = os.path.basename(source)
+                link_or_copy(source, os.path.join(staging, name))
+                names.append(name)
+            write_combined(os.path.join(staging, COMBINED_FILE), [os.path.join(staging, name) for name in names])
+            manifest = {'version': version, 'published_at': self.published_at(version), 'partitions': names}
+            atomic_write_bytes(os.path.join(staging, MANIFEST_FILE), json.dumps(manifest).encode('utf-8'))
+            # 書き終えたディレクトリを名前の変更で公開し、現在の版を指すファイルを置き換える
+            os.rename(staging, self.directory(version))
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        with FileLock(os.path.join(self.root, ".lock")):
+            atomic_write_bytes(os.path.join(self.root, CURRENT_FILE), version.encode('utf-8'))
+        return version
+
+    def pack(self, version):
+        """版の統合CSV・月ごとのファイルと、月ごとのファイルの更新時刻をZIPにまとめる"""
+        manifest = self.manifest(version)
+        names = manifest['partitions']
+        mtimes = {name: os.path.getmtime(self.path(version, name)) for name in names}
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+            for name in [COMBINED_FILE] + names:
+                archive.write(self.path(version, name), name)
+            archive.writestr(MANIFEST_FILE, json.dumps(dict(manifest, mtimes=mtimes)))
+        return buffer.getvalue()
+
+    def adopt(self, data, partition_dir, on_partition=None):
+        """pack でまとめた版を同じ版のIDで公開して現在の版にする（版のIDを返す）
+
+        月ごとのファイルは partition_dir に元の更新時刻で置き換えてから版に含めるため、
+        取り込んだノードでも取得済みの月は古くない扱いになる。on_partition は置き換える前の
+        月ごとのファイルのパス・新しい内容（バイト列）・更新時刻を受け取る関数（改定履歴の記録用）。
+        """
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            manifest = json.loads(archive.read(MANIFEST_FILE))
+            version = manifest['version']
+            if version in self.versions():
+                with FileLock(os.path.join(self.root, ".lock")):
+                    atomic_write_bytes(os.path.join(self.root, CURRENT_FILE), version.encode('utf-8'))
+                return version
+
+            os.makedirs(partition_dir, exist_ok=True)
+            partitions = []
+            for name in manifest['partitions']:
+                path = os.path.join(partition_dir, os.path.basename(name))
+                content = archive.read(name)
+                mtime = manifest['mtimes'][name]
+                if on_partition is not None:
+                    on_partition(path, content, mtime)
+                atomic_write_bytes(path, content)
+                os.utime(path, (mtime, mtime))
+                partitions.append(path)
+            combined = archive.read(COMBINED_FILE)
+
+        def write_combined(path, _partitions):
+            atomic_write_bytes(path, combined)
+
+        return self.publish(write_combined, partitions, version=version)
+
+    def mirror(self, version, target):
+        """版の統合CSVを従来の統合ファイルのパスにも置く（ハードリンクを置き換えで作成、コマンドラインツール用）"""
+        directory, filename = os.path.split(target)
+        staging = os.path.join(directory, f".{filename}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            link_or_copy(self.path(version), staging)
+            os.replace(staging, target)
+        except BaseException:
+            try:
+                os.remove(staging)
+            except OSError:
+                pass
+            raise
+
+    def pin(self, session_id, version):
+        """セッションが参照する版を固定（同じセッションの以前のピン留めは解除）"""
+        with self._lock:
+            previous = self._session_pins.get(session_id)
+            if previous == version:
+                return
+            if version is not None:
+                self._session_pins[session_id] = version
+                self._add_pin(version, 1)
+            else:
+                self._session_pins.pop(session_id, None)
+            if previous is not None:
+                self._add_pin(previous, -1)
+
+    def unpin(self, session_id):
+        """セッションのピン留めを解除"""
+        self.pin(session_id, None)
+
+    def _add_pin(self, version, delta):
+        """版のプロセス内の参照数を更新し、参照の有無をリースファイルに反映（ロック内で呼ぶ）"""
+        count = self._pin_counts.get(version, 0) + delta
+        lease = self._lease_path(version)
+        if count > 0:
+            self._pin_counts[version] = count
+            if count == delta:
+                os.makedirs(self._lease_dir(), exist_ok=True)
+                open(lease, 'a').close()
+        else:
+            self._pin_counts.pop(version, None)
+            try:
+                os.remove(lease)
+            except OSError:
+                pass
+
+    def pinned_versions(self):
+        """プロセス内でピン留めされている版と参照数"""
+        with self._lock:
+            return dict(self._pin_counts)
+
+    def _leased_versions(self):
+        """いずれかの生存中のプロセスがピン留めしている版（終了したプロセスのリースは削除）"""
+        leased = set()
+        try:
+            names = os.listdir(self._lease_dir())
+        except OSError:
+            return leased
+        for name in names:
+            version, _, pid = name.partition('.')
+            if pid.isdigit() and _process_alive(int(pid)):
+                leased.add(version)
+            else:
+                try:
+                    os.remove(os.path.join(self._lease_dir(), name))
+                except OSError:
+                    pass
+        return leased
+
+    def collect(self, is_active=None, now=None):
+        """不要になった版を削除（削除した版のリストを返す）
+
+        is_active にセッションIDを渡すと有効かを返す関数を指定すると、終了したセッションのピン留めを先に解除する。
+        現在の版と新しい順に keep 個（最低1個）の版は残す。それ以外の版は、後続の版の公開から grace 秒が過ぎて
+        ピン留めがなければ削除し、max_age 秒が過ぎていればピン留めがあっても削除する。
+        """
+        if is_active is not None:
+            with self._lock:
+                ended = [session_id for session_id in self._session_pins if not is_active(session_id)]
+            for session_id in ended:
+                self.unpin(session_id)
+
+        now = time.time() if now is None else now
+        current = self.current()
+        versions = self.versions()
+        removed = []
+        with FileLock(os.path.join(self.root, ".lock")):
+            leased = self._leased_versions()
+            for position, version in enumerate(versions[:-max(self.keep, 1)]):
+                if version == current:
+                    continue
+                # 後続の版が公開されてからの経過時間（それまではこの版が現在の版だった）
+                superseded_for = now - self.published_at(versions[position + 1])
+                if superseded_for > self.max_age or (superseded_for > self.grace and version not in leased):
+                    shutil.rmtree(self.directory(version), ignore_errors=True)
+                    removed.append(version)
+        return removed
@@ -0,0 +1,345 @@
+"""
+SQLiteによる経済指標データの保存（設定 STORAGE_ENGINE = "sqlite" のとき使用）
+
+発表1件を1行として自然キー (date, time, currency, event) で保持し、月ごとの取得結果は
+自然キーでの upsert と、その月に存在しなくなった行の削除で反映する。
+サプライズ列は変更のあった系列のみ再計算して保存するため、テーブル表示の絞り込み・
+並べ替え・ページ分割はそのままクエリとして発行できる。
+
+インデックス:
+- (currency, data_tag, date, ...) の被覆インデックス: 通貨・指標ごとのテーブル表示
+- (date, importance, ...) の被覆インデックス: 期間・重要度での絞り込み、月ごとの置き換え
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from analytics import add_surprise_columns
+
+# 保存する列（date は YYYY-MM-DD の文字列、time・currency・event は自然キーのため欠損を空文字で保持）
+VALUE_COLUMNS = ['actual', 'forecast', 'previous']
+SURPRISE_COLUMNS = ['surprise', 'surprise_pct', 'surprise_z']
+RELEASE_COLUMNS = ['date', 'time', 'currency', 'importance', 'event', 'data_tag'] + VALUE_COLUMNS + SURPRISE_COLUMNS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS releases (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL DEFAULT '',
+    currency TEXT NOT NULL DEFAULT '',
+    importance TEXT,
+    event TEXT NOT NULL DEFAULT '',
+    data_tag TEXT,
+    actual REAL,
+    forecast REAL,
+    previous REAL,
+    surprise REAL,
+    surprise_pct REAL,
+    surprise_z REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS releases_natural_key ON releases (date, time, currency, event);
+CREATE INDEX IF NOT EXISTS releases_series ON releases (
+    currency, data_tag, date, importance, event, actual, forecast, previous, surprise, surprise_pct, surprise_z
+);
+CREATE INDEX IF NOT EXISTS releases_date_importance ON releases (date, importance, currency, data_tag);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+UPSERT_SQL = """
+INSERT INTO releases (date, time, currency, importance, event, data_tag, actual, forecast, previous)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (date, time, currency, event) DO UPDATE SET
+    importance = excluded.importance,
+    data_tag = excluded.data_tag,
+    actual = excluded.actual,
+    forecast = excluded.forecast,
+    previous = excluded.previous
+"""
+
+
+def _sql_value(value):
+    """NaN・NaT をNULLに変換"""
+    return None if pd.isna(value) else value
+
+
+def _month_window(year_month):
+    """年月 (YYYY-MM) をその月の初日・末日の文字列に変換"""
+    period = pd.Period(year_month, freq='M')
+    return period.start_time.strftime('%Y-%m-%d'), period.end_time.strftime('%Y-%m-%d')
+
+
+class ReleaseStore:
+    """経済指標の発表データを保持するSQLiteデータベース
+
+    接続は呼び出しごとに開く（Streamlitのスレッド間で接続を共有しない）。書き込みは
+    1トランザクションで行い、データバージョンを進める。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._write_lock = threading.Lock()
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def initialize(self):
+        """テーブル・インデックスを作成（既存の場合は何もしない）"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            # 書き込み中も読み込みを止めないようWALモードにする
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                connection.executescript(SCHEMA)
+                # データベースを作り直した場合に古いデータバージョンと衝突しないよう作成時刻を含める
+                connection.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('created', ?)", (str(time.time_ns()),))
+                connection.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', '0')")
+
+    def version(self):
+        """データバージョン（作成時刻と書き込み回数）"""
+        with self._connect() as connection:
+            meta = dict(connection.execute("SELECT key, value FROM meta WHERE key IN ('created', 'revision')"))
+        if not meta:
+            return None
+        return f"sqlite-{meta['created']}-{meta['revision']}"
+
+    def __len__(self):
+        with self._connect() as connection:
+            return connection.execute("SELECT COUNT(*) FROM releases").fetchone()[0]
+
+    def replace_months(self, partitions):
+        """月ごとの前処理済みデータを反映（自然キーで upsert し、その月に無くなった行を削除）
+
+        partitions は {年月 (YYYY-MM): 前処理済みDataFrame}。変更のあった系列のサプライズ列を再計算する。
+        反映した行数を返す。
+        """
+        with self._write_lock, self._connect() as connection:
+            with connection:
+                connection.execute("CREATE TEMP TABLE IF NOT EXISTS batch_keys (date TEXT, time TEXT, currency TEXT, event TEXT)")
+                connection.execute("CREATE TEMP TABLE IF NOT EXISTS affected_series (currency TEXT, data_tag TEXT)")
+                connection.execute("DELETE FROM affected_series")
+
+                total_rows = 0
+                for year_month, frame in partitions.items():
+                    rows = self._release_rows(frame)
+                    first_day, last_day = _month_window(year_month)
+
+                    connection.execute("DELETE FROM batch_keys")
+                    connection.executemany(
+                        "INSERT INTO batch_keys (date, time, currency, event) VALUES (?, ?, ?, ?)",
+                        [(row[0], row[1], row[2], row[4]) for row in rows]
+                    )
+                    # その月の取得結果に含まれなくなった行を削除
+                    stale = """
+                        FROM releases WHERE date BETWEEN ? AND ? AND NOT EXISTS (
+                            SELECT 1 FROM batch_keys b WHERE b.date = releases.date AND b.time = releases.time
+                            AND b.currency = releases.currency AND b.event = releases.event
+                        )
+                    """
+                    connection.execute(f"INSERT INTO affected_series SELECT DISTINCT currency, data_tag {stale}", (first_day, last_day))
+                    connection.execute(f"DELETE {stale}", (first_day, last_day))
+
+                    connection.executemany(UPSERT_SQL, rows)
+                    connection.executemany(
+                        "INSERT INTO affected_series (currency, data_tag) VALUES (?, ?)",
+                        {(row[2], row[5]) for row in rows}
+                    )
+                    total_rows += len(rows)
+
+                self._refresh_surprise(connection)
+                self._bump_revision(connection)
+        return total_rows
+
+    def sync_tags(self, registry):
+        """保存済みの指標タグをレジストリ（タグ付けルール）に合わせる（変更があればTrue）"""
+        with self._write_lock, self._connect() as connection:
+            stored = pd.read_sql_query("SELECT DISTINCT event, data_tag FROM releases", connection)
+            if stored.empty:
+                return False
+            event_ids = registry.intern(stored['event'])
+            current = np.asarray(registry.tags, dtype=object)[registry.tag_ids_for(event_ids)]
+            changed = stored[stored['data_tag'].to_numpy(dtype=object) != current]
+            if changed.empty:
+                return False
+
+            new_tags = dict(zip(stored['event'], current))
+            with connection:
+                connection.execute("CREATE TEMP TABLE IF NOT EXISTS affected_series (currency TEXT, data_tag TEXT)")
+                connection.execute("DELETE FROM affected_series")
+                for event in changed['event'].unique():
+                    connection.execute(
+                        "INSERT INTO affected_series SELECT DISTINCT currency, data_tag FROM releases WHERE event = ?", (event,)
+                    )
+                    connection.execute("UPDATE releases SET data_tag = ? WHERE event = ?", (new_tags[event], event))
+                    connection.execute(
+                        "INSERT INTO affected_series SELECT DISTINCT currency, data_tag FROM releases WHERE event = ?", (event,)
+                    )
+                self._refresh_surprise(connection)
+                self._bump_revision(connection)
+        return True
+
+    @staticmethod
+    def _release_rows(frame):
+        """前処理済みDataFrameを保存用の行タプルに変換"""
+        if frame.empty:
+            return []
+        columns = {
+            'date': frame['date'].dt.strftime('%Y-%m-%d'),
+            'time': frame['time'].fillna('').astype(str) if 'time' in frame.columns else '',
+            'currency': frame['currency'].fillna('').astype(str),
+            'importance': frame['importance'].astype(object) if 'importance' in frame.columns else None,
+            'event': frame['event'].astype(str),
+            'data_tag': frame['data_tag'].astype(str),
+        }
+        for col in VALUE_COLUMNS:
+            columns[col] = pd.to_numeric(frame[col], errors='coerce') if col in frame.columns else np.nan
+        rows = pd.DataFrame(columns, index=frame.index)
+        return [tuple(_sql_value(v) for v in row) for row in rows.itertuples(index=False, name=None)]
+
+    @staticmethod
+    def _refresh_surprise(connection):
+        """affected_series に記録した系列のサプライズ列を再計算"""
+        series = pd.read_sql_query(
+            """
+            SELECT r.id, r.date, r.currency, r.data_tag, r.actual, r.forecast FROM releases r
+            JOIN (SELECT DISTINCT currency, data_tag FROM affected_series) a
+              ON r.currency = a.currency AND r.data_tag IS a.data_tag
+            ORDER BY r.date, r.id
+            """,
+            connection
+        )
+        if series.empty:
+            return
+        series = add_surprise_columns(series)
+        connection.executemany(
+            "UPDATE releases SET surprise = ?, surprise_pct = ?, surprise_z = ? WHERE id = ?",
+            [tuple(_sql_value(v) for v in row)
+             for row in series[SURPRISE_COLUMNS + ['id']].itertuples(index=False, name=None)]
+        )
+
+    @staticmethod
+    def _bump_revision(connection):
+        connection.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'revision'")
+
+    def load_frame(self, registry):
+        """全データを前処理済みDataFrame（read_economic_data と同じ形式、日付昇順）として読み込み
+
+        文字列の数値変換・日付の解釈・タグ付けは保存時に済んでいるため行わない。
+        """
+        with self._connect() as connection:
+            df = pd.read_sql_query(
+                "SELECT id, date, time, currency, importance, event, actual, forecast, previous "
+                "FROM releases ORDER BY date, id",
+                connection
+            )
+        df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d')
+        event_ids = registry.intern(df['event'])
+        df['event_id'] = event_ids
+        df['event'] = registry.event_categorical(event_ids)
+        df['data_tag'] = registry.tag_categorical(event_ids)
+        for col in VALUE_COLUMNS:
+            df[col] = df[col].astype(float)
+        return df
+
+    def query(self, currencies=None, tags=None, importance=None):
+        """条件に一致する発表データのクエリを作成（条件はSQLで評価する）"""
+        return ReleaseQuery(self, currencies=currencies, tags=tags, importance=importance)
+
+
+class ReleaseQuery:
+    """絞り込み条件付きの発表データ（paged_table.FrameRows と同じ操作をSQLで行う）"""
+
+    columns = RELEASE_COLUMNS
+    sortable_columns = set(RELEASE_COLUMNS)
+
+    def __init__(self, store, currencies=None, tags=None, importance=None, start_date=None, end_date=None):
+        self.store = store
+        self.currencies = currencies
+        self.tags = tags
+        self.importance = importance
+        self.start_date = start_date
+        self.end_date = end_date
+        self._count = None
+
+    def _where(self):
+        """WHERE句とパラメータ"""
+        clauses, params = [], []
+        for column, values in (('currency', self.currencies), ('data_tag', self.tags), ('importance', self.importance)):
+            if values is None:
+                continue
+            values = list(values)
+            if not values:
+                clauses.append("0")
+                continue
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(str(v) for v in values)
+        if self.start_date is not None:
+            clauses.append("date >= ?")
+            params.append(pd.Timestamp(self.start_date).strftime('%Y-%m-%d'))
+        if self.end_date is not None:
+            clauses.append("date <= ?")
+            params.append(pd.Timestamp(self.end_date).strftime('%Y-%m-%d'))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def _select(self, columns, order_by, limit=None, offset=0):
+        columns = [col for col in columns if col in self.sortable_columns]
+        where, params = self._where()
+        sql = f"SELECT {', '.join(columns)} FROM releases{where} ORDER BY {order_by}"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [int(limit), int(offset)]
+        with self.store._connect() as connection:
+            frame = pd.read_sql_query(sql, connection, params=params)
+        if 'date' in frame.columns:
+            frame['date'] = pd.to_datetime(frame['date'], format='%Y-%m-%d')
+        for col in VALUE_COLUMNS + SURPRISE_COLUMNS:
+            if col in frame.columns:
+                frame[col] = frame[col].astype(float)
+        return frame
+
+    def __len__(self):
+        if self._count is None:
+            where, params = self._where()
+            with self.store._connect() as connection:
+                self._count = connection.execute(f"SELECT COUNT(*) FROM releases{where}", params).fetchone()[0]
+        return self._count
+
+    def recent(self, limit=50):
+        """新しい順に最大limit件"""
+        return self._select(self.columns, "date DESC, id DESC", limit=limit)
+
+    def date_bounds(self):
+        """最初と最後の日付（該当なしは (None, None)）"""
+        where, params = self._where()
+        with self.store._connect() as connection:
+            first, last = connection.execute(f"SELECT MIN(date), MAX(date) FROM releases{where}", params).fetchone()
+        if first is None:
+            return None, None
+        return pd.Timestamp(first), pd.Timestamp(last)
+
+    def between(self, start_date, end_date):
+        """期間 [start_date, end_date] に絞り込んだクエリ"""
+        return ReleaseQuery(self.store, self.currencies, self.tags, self.importance, start_date, end_date)
+
+    def rows(self, columns, sort_column='date', ascending=False, offset=0, limit=None):
+        """並べ替えた行の一部を取得（欠損値は常に末尾、同じ値の行は日付順）"""
+        direction = "ASC" if ascending else "DESC"
+        if sort_column == 'date' or sort_column not in self.sortable_columns:
+            order_by = f"date {direction}, id {direction}"
+        else:
+            order_by = f"{sort_column} IS NULL, {sort_column} {direction}, date {direction}, id {direction}"
+        return self._select(columns, order_by, limit=limit, offset=offset)
@@ -20,7 +20,13 @@ echo "📱 Access URL: http://localhost:8501"
 echo "🛑 Press Ctrl+C to stop"
 echo ""
 
-# Start the dashboard
-python3 -m streamlit run dashboard.py
+# Start the dashboard (the script health check endpoint is used for the warm-up run)
+python3 -m streamlit run dashboard.py --server.scriptHealthCheckEnabled true &
+SERVER_PID=$!
+
+# Run the default view once inside the server so the first visitor gets warm caches
+python3 warmup.py --url http://localhost:8501 || echo "⚠️ Warm-up failed (the dashboard is still available)"
+
+wait $SERVER_PID
 
 echo "👋 Dashboard stopped."
\ No newline at end of file
@@ -0,0 +1,209 @@
+"""
+チャートのトレース一括作成（複数系列の抽出・前処理・トレース作成を1回の走査で行う）
+
+各チャートは系列キー（指標タグまたは通貨）と軸の割り当てを渡すだけでトレースを得られる。
+系列の抽出・日付順の並べ替え・0値の除外と前方補完は全系列まとめてNumPy配列で行い、
+トレースは fast_figure の検証なしのdictとして作成する。共通のレイアウト（テンプレート・
+背景・フォント・日付軸・凡例）は初回のみ検証し、以降のチャートで使い回す。
+"""
+
+import numpy as np
+import pandas as pd
+from plotly.colors import qualitative
+
+from analytics import SERIES_TRANSFORMS, SURPRISE_VALUE_TYPES
+from fast_figure import assemble_figure, figure_layout, scatter
+from revision_log import REVISION_SERIES
+
+# 系列の配色（指標別・通貨別）
+TAG_COLORS = qualitative.Set3 + qualitative.Pastel1
+CURRENCY_COLORS = qualitative.Set2 + qualitative.Dark2
+
+# オーバーレイとして重ねられる系列（派生系列と改定履歴の系列）
+OVERLAY_SERIES = dict(SERIES_TRANSFORMS, **REVISION_SERIES)
+
+IMPORTANCE_EMOJI = {'high': '🔴', 'medium': '🟡', 'low': '🟢'}
+
+# 右軸に割り当てた系列の名前の接尾辞
+SECONDARY_AXIS_SUFFIX = " (右軸)"
+
+_GRID = dict(showgrid=True, gridwidth=1, gridcolor='#333')
+
+# チャート共通のレイアウト（凡例の位置別）
+BASE_LAYOUTS = {
+    # 凡例をグラフの上に横並び
+    'legend_top': dict(
+        xaxis=dict(title=dict(text="📅 Date"), **_GRID),
+        template="plotly_dark",
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white', family='Arial'),
+        hovermode='x unified',
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    ),
+    # 凡例をグラフの下に移動（上下のマージンを調整）
+    'legend_below': dict(
+        xaxis=dict(title=dict(text="📅 Date"), **_GRID),
+        template="plotly_dark",
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white', family='Arial'),
+        hovermode='x unified',
+        legend=dict(orientation="h", yanchor="top", y=-0.15, xanchor="center", x=0.5),
+        margin=dict(t=80, b=120)
+    )
+}
+
+_base_layouts = {}
+
+
+def base_layout(name):
+    """共通レイアウトを検証済みのdictで取得（検証は初回のみ）"""
+    layout = _base_layouts.get(name)
+    if layout is None:
+        layout = figure_layout(BASE_LAYOUTS[name])
+        _base_layouts[name] = layout
+    return layout
+
+
+def chart_figure(traces, base='legend_top', **layout):
+    """共通レイアウトにチャート固有の設定（タイトル・Y軸・高さなど）を重ねて図を作成"""
+    return assemble_figure(traces, layout, base=base_layout(base))
+
+
+def grid_yaxis(**props):
+    """グリッド付きのY軸設定"""
+    return dict(props, **_GRID)
+
+
+def clean_series_values(values, starts, zero_as_missing=True):
+    """連続して並んだ複数系列の値をまとめて前処理（startsは各系列の先頭位置、各系列は日付昇順）
+
+    前後の有効な値がどちらも0以外の孤立した0は欠損とみなし（zero_as_missing=False では行わない）、
+    欠損は系列内で直前の値で埋める。系列の先頭の欠損はNaNのまま残る。
+    """
+    values = np.array(values, dtype=float)
+    n = len(values)
+    if n == 0:
+        return values
+    lengths = np.diff(np.append(starts, n))
+    row_starts = np.repeat(starts, lengths)
+
+    if zero_as_missing:
+        present = np.flatnonzero(~np.isnan(values))
+        present_values = values[present]
+        same_series = row_starts[present[1:]] == row_starts[present[:-1]]
+        prev_nonzero = np.append(False, same_series & (present_values[:-1] != 0))
+        next_nonzero = np.append(same_series & (present_values[1:] != 0), False)
+        values[present[(present_values == 0) & prev_nonzero & next_nonzero]] = np.nan
+
+    # 直前の有効な値の位置（系列の先頭より前は使わない）
+    last_valid = np.where(np.isnan(values), -1, np.arange(n))
+    np.maximum.accumulate(last_valid, out=last_valid)
+    return np.where(last_valid >= row_starts, values[np.maximum(last_valid, 0)], np.nan)
+
+
+def _key_codes(column, keys):
+    """列の値を keys 内の位置に変換（含まれない値は-1）"""
+    key_index = pd.Index(keys)
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # カテゴリ列はカテゴリ単位で変換してからコードで引く
+        category_codes = np.append(key_index.get_indexer(column.cat.categories.astype(str)), -1)
+        return category_codes[column.cat.codes.to_numpy()]
+    return key_index.get_indexer(column.astype(str))
+
+
+def series_traces(data, key_column, keys, value_type, colors=TAG_COLORS, fixed_colors=False, axes=None, line_width=2,
+                  marker_size=4, hover_details=None, overlays=None):
+    """系列キーごとのトレースを一括作成
+
+    data:          日付列・値列を持つDataFrame（key_column の値が keys に含まれる行を使う）
+    keys:          系列キーの並び（トレースはこの順、有効な値のない系列は作成しない）
+    fixed_colors:  Trueなら配色を keys の位置で固定（Falseなら作成したトレースの順に割り当て）
+    axes:          系列キー → 'y' / 'y2' の割り当て（指定時は全トレースに軸を設定し、右軸は破線・菱形マーカー）
+    hover_details: 系列キー → ホバーに追加する行（HTML）
+    overlays:      派生系列・改定履歴の系列の事前計算済み列（dataと同じ行インデックス、各トレースの直後に追加）
+
+    トレースのリストと、右軸を使ったかどうかを返す。
+    """
+    traces = []
+    uses_secondary_axis = False
+    keys = list(keys)
+    if data.empty or not keys:
+        return traces, uses_secondary_axis
+
+    # 対象の行を系列キー順・日付順に並べる（安定ソートのため、同じ日付の行は読み込み順のまま）
+    codes = _key_codes(data[key_column], keys)
+    rows = np.flatnonzero(codes >= 0)
+    dates = data['date'].to_numpy()[rows]
+    order = np.lexsort((dates, codes[rows]))
+    rows, dates, codes = rows[order], dates[order], codes[rows][order]
+    bounds = np.searchsorted(codes, np.arange(len(keys) + 1))
+
+    values = np.asarray(pd.to_numeric(data[value_type].to_numpy()[rows], errors='coerce'), dtype=float)
+    cleaned = clean_series_values(values, bounds[:-1], zero_as_missing=value_type not in SURPRISE_VALUE_TYPES)
+    importance = data['importance'].to_numpy()[rows] if 'importance' in data.columns else None
+
+    # 全ての派生系列を1回の取得でまとめて取り出す
+    overlay_values = {}
+    if overlays is not None and not overlays.empty:
+        aligned = overlays.reindex(data.index[rows])
+        overlay_values = {transform: aligned[transform].to_numpy() for transform in aligned.columns}
+
+    color_idx = 0
+    for position, key in enumerate(keys):
+        lo, hi = bounds[position], bounds[position + 1]
+        valid = ~np.isnan(cleaned[lo:hi])
+        if not valid.any():
+            continue
+        x = dates[lo:hi][valid]
+        color = colors[(position if fixed_colors else color_idx) % len(colors)]
+        color_idx += 1
+
+        # 重要度情報を追加
+        importance_info = importance[lo:hi][valid][0] if importance is not None else 'unknown'
+        importance_emoji = IMPORTANCE_EMOJI.get(importance_info, '⚪')
+        details = hover_details.get(key, '') if hover_details else ''
+
+        axis = axes.get(key, 'y') if axes is not None else None
+        line = dict(color=color, width=line_width, shape='linear')
+        marker = dict(size=marker_size)
+        props = {}
+        name = f"{importance_emoji} {key}"
+        if axis is not None:
+            props['yaxis'] = axis
+        if axis == 'y2':
+            uses_secondary_axis = True
+            name += SECONDARY_AXIS_SUFFIX
+            line['dash'] = 'dash'
+            marker['symbol'] = 'diamond'
+
+        traces.append(scatter(
+            x,
+            cleaned[lo:hi][valid],
+            mode='lines+markers',
+            name=name,
+            line=line,
+            marker=marker,
+            connectgaps=True,
+            hovertemplate=f'<b>{key}</b><br>重要度: {importance_info}{details}<br>Date: %{{x}}<br>Value: %{{y:.2f}}<br><extra></extra>',
+            **props
+        ))
+
+        # 派生系列のオーバーレイ（系列と同じ色で、同じスケールなら点線・異なるスケールなら右軸に破線）
+        for transform, transform_values in overlay_values.items():
+            spec = OVERLAY_SERIES[transform]
+            same_scale = spec['same_scale']
+            uses_secondary_axis = uses_secondary_axis or not same_scale
+            traces.append(scatter(
+                x,
+                transform_values[lo:hi][valid],
+                mode='lines',
+                name=f"{key} · {spec['label']}",
+                line=dict(color=color, width=1.5, dash='dot' if same_scale else 'dash'),
+                connectgaps=True,
+                yaxis='y' if same_scale else 'y2',
+                hovertemplate=f'<b>{key}</b><br>{spec["label"]}<br>Date: %{{x}}<br>Value: %{{y:.2f}}<br><extra></extra>'
+            ))
+
+    return traces, uses_secondary_axis
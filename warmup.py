@@ -0,0 +1,208 @@
+"""
+起動直後のウォームアップと起動時間の計測
+
+Streamlit のサーバーはブラウザが接続するまでスクリプトを実行しないため、最初の利用者がデータの更新確認・
+読み込み・系列インデックスの構築・既定の表示（通貨別分析のチャート）の作成をまとめて待つことになる。
+サーバーをスクリプトのヘルスチェック（server.scriptHealthCheckEnabled）付きで起動しておき、起動直後に
+そのエンドポイントを呼ぶと、サーバーのプロセス内でスクリプトが1回ヘッドレスで実行され、
+st.cache_data / st.cache_resource のキャッシュが最初の利用者の接続前に作成される。
+
+コマンドラインから実行:
+    python warmup.py --url http://localhost:8501        # 起動済みのサーバーをウォームアップ
+    python warmup.py --benchmark --repeat 3             # インポート時間・最初の表示までの時間を計測
+    python warmup.py --benchmark --baseline startup.json --save   # 前回の結果と比較（悪化時は終了コード1）して保存
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+HEALTH_PATH = "/_stcore/health"
+SCRIPT_HEALTH_PATH = "/_stcore/script-health-check"
+
+# ウォームアップの実行に必要なサーバーの設定
+SERVER_FLAGS = ["--server.headless", "true", "--server.scriptHealthCheckEnabled", "true"]
+
+# 起動時（データ取得なし）には読み込まれないはずの取得用モジュール
+FETCH_MODULES = ("requests", "investpy", "http_cache", "data_sources")
+
+# 比較する計測項目（秒）
+METRICS = ("import", "ready", "first_run", "first_paint", "warm_run")
+
+
+def wait_until_ready(url, timeout=60.0):
+    """サーバーが応答するまで待つ（待った秒数を返す）"""
+    started = time.perf_counter()
+    while True:
+        try:
+            with urllib.request.urlopen(url + HEALTH_PATH, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter() - started
+        except (urllib.error.URLError, OSError):
+            pass
+        if time.perf_counter() - started > timeout:
+            raise TimeoutError(f"サーバーが{timeout:.0f}秒以内に起動しませんでした: {url}")
+        time.sleep(0.1)
+
+
+def run_script(url, timeout=120.0):
+    """サーバー内でスクリプトを1回ヘッドレスで実行（成功したかどうかと所要時間を返す）
+
+    Streamlit 側のスクリプト実行の待ち時間は60秒のため、初回のデータ取得がそれより長い場合は
+    失敗扱いになるが、実行自体はサーバー内で続きキャッシュは作成される。
+    """
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url + SCRIPT_HEALTH_PATH, timeout=timeout) as response:
+            ok = response.status == 200
+    except urllib.error.HTTPError as e:
+        if e.code == 404:
+            raise RuntimeError("スクリプトのヘルスチェックが無効です（--server.scriptHealthCheckEnabled true で起動してください）")
+        ok = False
+    return ok, time.perf_counter() - started
+
+
+def warm_up(url, timeout=120.0):
+    """起動済みのサーバーをウォームアップ"""
+    wait_until_ready(url, timeout)
+    return run_script(url, timeout)
+
+
+def measure_imports(app_dir):
+    """ダッシュボードのインポート時間と、読み込まれた取得用モジュールを別プロセスで計測
+
+    Streamlit・pandas などの共通の依存関係は除き、アプリのモジュールを読み込む時間のみを測る。
+    """
+    code = (
+        "import json, sys, time\n"
+        "import streamlit, pandas, numpy, plotly.graph_objs\n"
+        "started = time.perf_counter()\n"
+        "import dashboard\n"
+        "elapsed = time.perf_counter() - started\n"
+        f"loaded = [m for m in {FETCH_MODULES!r} if m in sys.modules]\n"
+        "print(json.dumps({'seconds': elapsed, 'fetch_modules': loaded}))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=app_dir, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def free_port():
+    """空いているローカルのポート番号"""
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def measure_startup(app_dir, timeout=120.0):
+    """サーバーを起動して、応答まで・最初のスクリプト実行（最初の表示）・2回目の実行の時間を計測"""
+    port = free_port()
+    url = f"http://localhost:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", "dashboard.py", "--server.port", str(port), *SERVER_FLAGS],
+        cwd=app_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_until_ready(url, timeout)
+        ready = time.perf_counter() - started
+        first_ok, first_run = run_script(url, timeout)
+        warm_ok, warm_run = run_script(url, timeout)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+    return {
+        'ready': ready,
+        'first_run': first_run,
+        'first_paint': ready + first_run,
+        'warm_run': warm_run,
+        'ok': first_ok and warm_ok
+    }
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """前回の計測結果より tolerance（比率）を超えて遅くなった項目を返す"""
+    regressions = []
+    for metric in METRICS:
+        if metric in baseline and metric in results and results[metric] > baseline[metric] * (1 + tolerance):
+            regressions.append((metric, baseline[metric], results[metric]))
+    return regressions
+
+
+def parse_args(argv=None):
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="起動直後のウォームアップ / インポート時間・最初の表示までの時間の計測")
+    parser.add_argument('--url', default="http://localhost:8501", help="ウォームアップするサーバーのURL")
+    parser.add_argument('--timeout', type=float, default=120.0, help="サーバーの起動・スクリプト実行の待ち時間（秒）")
+    parser.add_argument('--benchmark', action='store_true', help="サーバーを起動して起動時間を計測")
+    parser.add_argument('--app-dir', default=os.path.dirname(os.path.abspath(__file__)), help="ダッシュボードのディレクトリ")
+    parser.add_argument('--repeat', type=int, default=3, help="計測回数（中央値を表示）")
+    parser.add_argument('--baseline', help="比較する前回の計測結果（JSON）")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="悪化とみなす比率（0.2 = 20%%遅い）")
+    parser.add_argument('--save', action='store_true', help="計測結果を --baseline のファイルに保存")
+    return parser.parse_args(argv)
+
+
+def run_benchmark(args):
+    imports = [measure_imports(args.app_dir) for _ in range(args.repeat)]
+    startups = [measure_startup(args.app_dir, args.timeout) for _ in range(args.repeat)]
+
+    results = {'import': statistics.median(item['seconds'] for item in imports)}
+    for metric in METRICS[1:]:
+        results[metric] = statistics.median(item[metric] for item in startups)
+
+    fetch_modules = sorted({name for item in imports for name in item['fetch_modules']})
+    print(f"📦 アプリのインポート: {results['import'] * 1000:.0f}ms"
+          f"（取得用モジュール: {', '.join(fetch_modules) if fetch_modules else 'なし'}）")
+    print(f"🚀 サーバー応答まで: {results['ready']:.2f}秒")
+    print(f"🎨 最初のスクリプト実行: {results['first_run']:.2f}秒（起動から最初の表示まで {results['first_paint']:.2f}秒）")
+    print(f"♻️ 2回目のスクリプト実行（ウォームアップ後）: {results['warm_run']:.2f}秒")
+    if not all(item['ok'] for item in startups):
+        print("⚠️ スクリプトの実行に失敗した回があります")
+
+    status = 0
+    if fetch_modules:
+        print("⚠️ 起動時に取得用モジュールが読み込まれています")
+        status = 1
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        for metric, before, after in regressions:
+            print(f"❌ {metric}: {before:.3f}秒 → {after:.3f}秒（{after / before - 1:+.0%}）")
+        if not regressions:
+            print(f"✅ 前回の計測結果から{args.tolerance:.0%}を超える悪化はありません")
+        status = status or (1 if regressions else 0)
+    if args.save and args.baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 計測結果を保存しました: {args.baseline}")
+    return status
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.benchmark:
+        return run_benchmark(args)
+
+    ok, seconds = warm_up(args.url, args.timeout)
+    if ok:
+        print(f"🔥 ウォームアップ完了: {seconds:.2f}秒")
+        return 0
+    print(f"⚠️ ウォームアップのスクリプト実行に失敗しました（{seconds:.2f}秒）")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())